@@ -255,6 +255,17 @@ const getModelEnvs = (
               USE_CASE_CONFIGS[useCase]?.starterQuestions ?? [],
             ),
           },
+          {
+            name: "EMBEDDING_CACHE_DIR",
+            description:
+              "The directory to cache embeddings in. Set it to an empty value to disable the cache.",
+            value: ".cache/embeddings",
+          },
+          {
+            name: "PARSE_WORKERS",
+            description:
+              "The number of processes parsing the documents when generating the index. Default is the number of CPUs.",
+          },
         ]
       : [
           {
@@ -1,14 +1,20 @@
 import logging
-from typing import Any, Dict, List
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import yaml  # type: ignore
-from app.engine.loaders.db import DBLoaderConfig, get_db_documents
-from app.engine.loaders.file import FileLoaderConfig, get_file_documents
+from app.engine.loaders.db import DBLoaderConfig, iter_db_documents
+from app.engine.loaders.file import FileLoaderConfig, iter_file_documents
 from app.engine.loaders.web import WebLoaderConfig, get_web_documents
 from llama_index.core import Document
 
 logger = logging.getLogger(__name__)
 
+# Documents loaded ahead of the ingestion, bounds the memory used by fast loaders
+MAX_QUEUED_DOCUMENTS = 256
+
 
 def load_configs() -> Dict[str, Any]:
     with open("config/loaders.yaml") as f:
@@ -16,24 +22,119 @@ def load_configs() -> Dict[str, Any]:
     return configs
 
 
-def get_documents() -> List[Document]:
-    documents = []
-    config = load_configs()
-    for loader_type, loader_config in config.items():
-        logger.info(
-            f"Loading documents from loader: {loader_type}, config: {loader_config}"
+def get_loader_documents(
+    loader_type: str, loader_config: Any, input_files: Optional[List[str]] = None
+) -> Iterable[Document]:
+    """
+    Load the documents of a loader, the file loader yields them while parsing the files.
+
+    Args:
+        loader_type: The type of the loader: file, web or db.
+        loader_config: The config of the loader in config/loaders.yaml.
+        input_files: Only load these files with the file loader, default is all files.
+    """
+    logger.info(
+        f"Loading documents from loader: {loader_type}, config: {loader_config}"
+    )
+    match loader_type:
+        case "file":
+            return iter_file_documents(
+                FileLoaderConfig(**loader_config), input_files=input_files
+            )
+        case "web":
+            return get_web_documents(WebLoaderConfig(**loader_config))
+        case "db":
+            return iter_db_documents(
+                configs=[DBLoaderConfig(**cfg) for cfg in loader_config]
+            )
+        case _:
+            raise ValueError(f"Invalid loader type: {loader_type}")
+
+
+def is_incremental(loader_type: str, loader_config: Any) -> bool:
+    """
+    Whether the loader only returns the documents changed since its last run.
+    """
+    return loader_type == "db" and any(
+        DBLoaderConfig(**cfg).watermark_column for cfg in loader_config
+    )
+
+
+def _put(output: "queue.Queue", item: Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            output.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _run_loader(
+    loader_type: str,
+    loader_config: Any,
+    input_files: Optional[List[str]],
+    output: "queue.Queue",
+    stop: threading.Event,
+) -> None:
+    start = time.perf_counter()
+    count = 0
+    try:
+        for doc in get_loader_documents(loader_type, loader_config, input_files):
+            if not _put(output, (loader_type, doc), stop):
+                return
+            count += 1
+    except Exception as e:
+        _put(output, (loader_type, e), stop)
+        return
+    logger.info(
+        f"Loader {loader_type}: {count} documents in {time.perf_counter() - start:.1f}s"
+    )
+    _put(output, (loader_type, None), stop)
+
+
+def iter_documents(
+    configs: Optional[Dict[str, Any]] = None,
+    input_files: Optional[List[str]] = None,
+) -> Iterator[Tuple[str, Document]]:
+    """
+    Run the configured loaders concurrently, one thread per loader, and yield the
+    (loader type, document) pairs as they are loaded. At most MAX_QUEUED_DOCUMENTS
+    documents are loaded ahead of the consumer, the loaders wait for it otherwise.
+
+    Args:
+        configs: The loader configs, default is config/loaders.yaml.
+        input_files: Only load these files with the file loader, default is all files.
+    """
+    configs = load_configs() if configs is None else configs
+    output: "queue.Queue" = queue.Queue(maxsize=MAX_QUEUED_DOCUMENTS)
+    stop = threading.Event()
+    threads = [
+        threading.Thread(
+            target=_run_loader,
+            args=(loader_type, loader_config, input_files, output, stop),
+            name=f"loader-{loader_type}",
+            daemon=True,
         )
-        match loader_type:
-            case "file":
-                document = get_file_documents(FileLoaderConfig(**loader_config))
-            case "web":
-                document = get_web_documents(WebLoaderConfig(**loader_config))
-            case "db":
-                document = get_db_documents(
-                    configs=[DBLoaderConfig(**cfg) for cfg in loader_config]
-                )
-            case _:
-                raise ValueError(f"Invalid loader type: {loader_type}")
-        documents.extend(document)
-
-    return documents
+        for loader_type, loader_config in configs.items()
+    ]
+    for thread in threads:
+        thread.start()
+    running = len(threads)
+    try:
+        while running:
+            loader_type, item = output.get()
+            if item is None:
+                running -= 1
+            elif isinstance(item, Exception):
+                logger.error(f"Loader {loader_type} failed")
+                raise item
+            else:
+                yield loader_type, item
+    finally:
+        # Unblock the loaders if the consumer stopped early or a loader failed
+        stop.set()
+
+
+def get_documents() -> List[Document]:
+    return [doc for _, doc in iter_documents()]
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urldefrag, urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from llama_index.core import Document
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "create-llama-crawler"
+# Tags whose text isn't part of the page content
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head", "iframe"}
+# Tags that start a new line in the extracted text
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article",
+    "header", "footer", "nav", "aside", "main", "pre", "blockquote", "dd", "dt",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "form", "figure", "figcaption",
+}  # fmt: skip
+
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    Extract the visible text and the links of an HTML page.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.links: List[str] = []
+        self.scripts = 0
+        self._skipped_depth = 0
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag in SKIPPED_TAGS:
+            self._skipped_depth += 1
+            self.scripts += tag == "script"
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        # Void elements like <br/> don't have an end tag
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIPPED_TAGS and self._skipped_depth > 0:
+            self._skipped_depth -= 1
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if self._skipped_depth == 0:
+            self.parts.append(data)
+
+    @property
+    def text(self) -> str:
+        lines = (
+            re.sub(r"[ \t\r\f\v]+", " ", line).strip()
+            for line in "".join(self.parts).split("\n")
+        )
+        return "\n".join(line for line in lines if line)
+
+
+def extract_text(html: str) -> Tuple[str, List[str], int]:
+    """
+    The text, the links and the number of scripts of an HTML page.
+    """
+    parser = HTMLTextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text, parser.links, parser.scripts
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    url = urldefrag(urljoin(base, url) if base else url)[0]
+    if urlsplit(url).scheme not in ("http", "https"):
+        return None
+    return url
+
+
+class CrawlCache:
+    """
+    The ETag, Last-Modified header, text and links of the crawled pages, for
+    conditional requests on re-crawls: unchanged pages are not downloaded again.
+    """
+
+    def __init__(self, cache_dir: Optional[str]):
+        self.path = os.path.join(cache_dir, "pages.json") if cache_dir else None
+        self.pages: Dict[str, Dict] = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.pages = json.load(f)
+            except ValueError:
+                logger.warning(f"Ignoring invalid crawl cache {self.path}")
+
+    def validators(self, url: str) -> Dict[str, str]:
+        page = self.pages.get(url)
+        headers = {}
+        if page and page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page and page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+        return headers
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.pages, f)
+        os.replace(tmp_path, self.path)
+
+
+class WebCrawler:
+    """
+    Crawl websites over HTTP with a pool of connections, without a browser.
+
+    Starting from `base_url`, the links starting with `prefix` are followed up to
+    `max_depth` (like `WholeSiteReader`); the pages of a depth are fetched concurrently,
+    with at most `max_connections_per_host` concurrent requests per host. The pages
+    disallowed by robots.txt are skipped.
+
+    Pages that look rendered by JavaScript (almost no text but scripts) are passed to
+    `render`, e.g. to load them with a browser.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 16,
+        max_connections_per_host: int = 4,
+        timeout: float = 30,
+        respect_robots_txt: bool = True,
+        cache_dir: Optional[str] = None,
+        min_text_length: int = 50,
+        render: Optional[Callable[[str], Optional[Tuple[str, List[str]]]]] = None,
+    ):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.respect_robots_txt = respect_robots_txt
+        self.min_text_length = min_text_length
+        self.render = render
+        self.cache = CrawlCache(cache_dir)
+        self._host_limits: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.max_connections_per_host)
+        )
+        self._robots: Dict[str, asyncio.Future] = {}
+        self.stats = {"fetched": 0, "not_modified": 0, "rendered": 0, "failed": 0}
+
+    async def crawl(self, urls: List[Tuple[str, str, int]]) -> List[Document]:
+        """
+        Crawl the (base url, prefix, max depth) entries concurrently.
+        """
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+        async with httpx.AsyncClient(
+            limits=limits,
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+        ) as client:
+            results = await asyncio.gather(
+                *(
+                    self._crawl_site(client, base_url, prefix, max_depth)
+                    for base_url, prefix, max_depth in urls
+                )
+            )
+        self.cache.save()
+        logger.info(f"Crawled {sum(len(docs) for docs in results)} pages: {self.stats}")
+        return [doc for docs in results for doc in docs]
+
+    async def _crawl_site(
+        self, client: httpx.AsyncClient, base_url: str, prefix: str, max_depth: int
+    ) -> List[Document]:
+        documents: List[Document] = []
+        start = normalize_url(base_url)
+        visited: Set[str] = {start} if start else set()
+        frontier = [start] if start else []
+        for depth in range(max_depth + 1):
+            pages = await asyncio.gather(
+                *(self._fetch_page(client, url) for url in frontier)
+            )
+            next_frontier = []
+            for url, page in zip(frontier, pages):
+                if page is None:
+                    continue
+                text, links = page
+                if text:
+                    documents.append(
+                        Document(text=text, id_=url, metadata={"URL": url})
+                    )
+                if depth == max_depth:
+                    continue
+                for link in links:
+                    link = normalize_url(link, url)
+                    if link and link.startswith(prefix) and link not in visited:
+                        visited.add(link)
+                        next_frontier.append(link)
+            frontier = next_frontier
+            if not frontier:
+                break
+        return documents
+
+    async def _fetch_page(
+        self, client: httpx.AsyncClient, url: str
+    ) -> Optional[Tuple[str, List[str]]]:
+        if not await self._allowed(client, url):
+            logger.info(f"Skipping {url}, disallowed by robots.txt")
+            return None
+        try:
+            async with self._host_limits[urlsplit(url).netloc]:
+                response = await client.get(url, headers=self.cache.validators(url))
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            self.stats["failed"] += 1
+            return None
+        if response.status_code == 304 and url in self.cache.pages:
+            self.stats["not_modified"] += 1
+            page = self.cache.pages[url]
+            return page["text"], page["links"]
+        if response.status_code >= 400:
+            logger.warning(f"Failed to fetch {url}: HTTP {response.status_code}")
+            self.stats["failed"] += 1
+            return None
+        self.stats["fetched"] += 1
+        content_type = response.headers.get("content-type", "")
+        if "html" in content_type:
+            text, links, scripts = extract_text(response.text)
+            if self.render and scripts and len(text) < self.min_text_length:
+                rendered = await asyncio.to_thread(self.render, url)
+                if rendered is not None:
+                    self.stats["rendered"] += 1
+                    text, links = rendered
+        elif content_type.startswith("text/"):
+            text, links = response.text, []
+        else:
+            logger.info(f"Skipping {url} with content type {content_type}")
+            return None
+        self.cache.pages[url] = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "text": text,
+            "links": links,
+        }
+        return text, links
+
+    async def _allowed(self, client: httpx.AsyncClient, url: str) -> bool:
+        if not self.respect_robots_txt:
+            return True
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin not in self._robots:
+            # Shared by the concurrent requests to the origin
+            self._robots[origin] = asyncio.ensure_future(
+                self._fetch_robots(client, origin)
+            )
+        parser = await self._robots[origin]
+        return parser.can_fetch(USER_AGENT, url)
+
+    @staticmethod
+    async def _fetch_robots(client: httpx.AsyncClient, origin: str) -> RobotFileParser:
+        parser = RobotFileParser()
+        try:
+            response = await client.get(f"{origin}/robots.txt")
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code < 400:
+                parser.parse(response.text.splitlines())
+            else:
+                parser.allow_all = True
+        except httpx.HTTPError:
+            parser.allow_all = True
+        return parser
@@ -1,31 +1,207 @@
+import hashlib
+import json
 import logging
-from typing import List
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from pydantic import BaseModel
+from llama_index.core import Document
+from pydantic import BaseModel, Field
 
 logger = logging.getLogger(__name__)
 
+# Last loaded value of the watermark column by query
+WATERMARKS_PATH = os.path.join(".cache", "db_watermarks.json")
+# Batches loaded ahead of the ingestion, bounds the memory used
+MAX_QUEUED_BATCHES = 8
+MAX_CONCURRENT_QUERIES = 4
+
+# Watermarks of the loaded rows, saved by commit_watermarks once they are stored
+_pending_watermarks: Dict[str, Any] = {}
+_pending_lock = threading.Lock()
+
 
 class DBLoaderConfig(BaseModel):
     uri: str
     queries: List[str]
+    batch_size: int = Field(default=1000, ge=1)
+    id_column: Optional[str] = Field(
+        default=None,
+        description="Column with a unique id of the rows, used for the document ids.",
+    )
+    watermark_column: Optional[str] = Field(
+        default=None,
+        description="Column increasing on each change of a row, e.g. updated_at. "
+        "On re-runs, only the rows changed since the last run are loaded.",
+    )
+
 
+def _query_key(uri: str, query: str) -> str:
+    return hashlib.sha256(f"{uri}\0{query}".encode()).hexdigest()[:16]
 
-def get_db_documents(configs: list[DBLoaderConfig]):
+
+def _load_watermarks() -> Dict[str, Any]:
     try:
-        from llama_index.readers.database import DatabaseReader
-    except ImportError:
-        logger.error(
-            "Failed to import DatabaseReader. Make sure llama_index is installed."
-        )
-        raise
-
-    docs = []
-    for entry in configs:
-        loader = DatabaseReader(uri=entry.uri)
-        for query in entry.queries:
-            logger.info(f"Loading data from database with query: {query}")
-            documents = loader.load_data(query=query)
-            docs.extend(documents)
-
-    return documents
+        with open(WATERMARKS_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_watermarks(watermarks: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(WATERMARKS_PATH), exist_ok=True)
+    tmp_path = f"{WATERMARKS_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(watermarks, f, indent=2, default=str)
+    os.replace(tmp_path, WATERMARKS_PATH)
+
+
+def reset_watermarks() -> None:
+    """
+    Load all rows again on the next run, e.g. when the index is re-created.
+    """
+    with _pending_lock:
+        _pending_watermarks.clear()
+    if os.path.exists(WATERMARKS_PATH):
+        os.remove(WATERMARKS_PATH)
+
+
+def commit_watermarks() -> None:
+    """
+    Save the watermarks of the rows loaded so far. Call it once their documents are
+    stored, the next run loads the rows that are not committed again.
+    """
+    with _pending_lock:
+        if not _pending_watermarks:
+            return
+        watermarks = _load_watermarks()
+        watermarks.update(_pending_watermarks)
+        _save_watermarks(watermarks)
+        _pending_watermarks.clear()
+
+
+def _build_query(query: str, watermark_column: Optional[str], watermark: Any):
+    from sqlalchemy import text
+
+    query = query.strip().rstrip(";")
+    if not watermark_column:
+        return text(query), {}
+    sql = f"SELECT * FROM ({query}) AS q"
+    params = {}
+    if watermark is not None:
+        sql += f" WHERE q.{watermark_column} > :watermark"
+        params["watermark"] = watermark
+    return text(f"{sql} ORDER BY q.{watermark_column}"), params
+
+
+def _stream_query(
+    config: DBLoaderConfig,
+    query: str,
+    watermark: Any,
+    output: "queue.Queue",
+    stop: threading.Event,
+) -> Any:
+    """
+    Run the query with a server-side cursor and put the documents into the queue by
+    batches of `batch_size` rows. Returns the new watermark.
+    """
+    from sqlalchemy import create_engine
+
+    key = _query_key(config.uri, query)
+    statement, params = _build_query(query, config.watermark_column, watermark)
+    engine = create_engine(config.uri)
+    rows = 0
+    try:
+        with engine.connect() as connection:
+            result = connection.execution_options(
+                stream_results=True, max_row_buffer=config.batch_size
+            ).execute(statement, params)
+            for partition in result.partitions(config.batch_size):
+                documents = []
+                for row in partition:
+                    values = row._mapping
+                    text = ", ".join(f"{col}: {value}" for col, value in values.items())
+                    if config.id_column:
+                        doc_id = f"{key}:{values[config.id_column]}"
+                    else:
+                        doc_id = hashlib.sha256(f"{key}\0{text}".encode()).hexdigest()
+                    documents.append(Document(text=text, id_=doc_id))
+                    if config.watermark_column:
+                        watermark = values[config.watermark_column]
+                rows += len(documents)
+                while not stop.is_set():
+                    try:
+                        output.put(documents, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return None
+    finally:
+        engine.dispose()
+    logger.info(f"Loaded {rows} rows from database with query: {query}")
+    if hasattr(watermark, "isoformat"):
+        watermark = watermark.isoformat()
+    return watermark
+
+
+def iter_db_document_batches(
+    configs: List[DBLoaderConfig],
+) -> Iterator[List[Document]]:
+    """
+    Run the configured queries concurrently and yield their documents by batches as
+    they are loaded. Once all batches have been consumed, the new watermarks are
+    pending until `commit_watermarks` is called.
+    """
+    watermarks = _load_watermarks()
+    output: "queue.Queue" = queue.Queue(maxsize=MAX_QUEUED_BATCHES)
+    stop = threading.Event()
+    jobs: List[Tuple[DBLoaderConfig, str]] = [
+        (config, query) for config in configs for query in config.queries
+    ]
+    if not jobs:
+        return
+    with ThreadPoolExecutor(
+        max_workers=min(MAX_CONCURRENT_QUERIES, len(jobs))
+    ) as executor:
+        futures = {
+            executor.submit(
+                _stream_query,
+                config,
+                query,
+                watermarks.get(_query_key(config.uri, query))
+                if config.watermark_column
+                else None,
+                output,
+                stop,
+            ): (config, query)
+            for config, query in jobs
+        }
+        try:
+            while True:
+                try:
+                    yield output.get(timeout=0.1)
+                except queue.Empty:
+                    for future in futures:
+                        if future.done() and future.exception() is not None:
+                            raise future.exception()  # type: ignore
+                    if all(future.done() for future in futures) and output.empty():
+                        break
+        finally:
+            stop.set()
+        for future, (config, query) in futures.items():
+            watermark = future.result()
+            if config.watermark_column and watermark is not None:
+                with _pending_lock:
+                    _pending_watermarks[_query_key(config.uri, query)] = watermark
+
+
+def iter_db_documents(configs: List[DBLoaderConfig]) -> Iterator[Document]:
+    for batch in iter_db_document_batches(configs):
+        yield from batch
+
+
+def get_db_documents(configs: List[DBLoaderConfig]) -> List[Document]:
+    return list(iter_db_documents(configs))
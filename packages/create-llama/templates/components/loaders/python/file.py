@@ -1,10 +1,12 @@
 import os
 import logging
-from typing import Dict
+from typing import Dict, Iterator, List, Optional
+from llama_index.core import Document
 from llama_parse import LlamaParse
 from pydantic import BaseModel
 
 from app.config import DATA_DIR
+from app.engine.loaders.parsing import list_files, parse_files
 
 logger = logging.getLogger(__name__)
 
@@ -35,40 +37,40 @@ def llama_parse_extractor() -> Dict[str, LlamaParse]:
     return {file_type: parser for file_type in SUPPORTED_FILE_TYPES}
 
 
-def get_file_documents(config: FileLoaderConfig):
-    from llama_index.core.readers import SimpleDirectoryReader
+def iter_file_documents(
+    config: FileLoaderConfig, input_files: Optional[List[str]] = None
+) -> Iterator[Document]:
+    """
+    Parse the files of the data directory, or only the given `input_files`, in a pool of
+    processes (PARSE_WORKERS) and yield the documents of each file as soon as it's parsed.
+    """
+    files = list_files(DATA_DIR) if input_files is None else input_files
+    if len(files) == 0:
+        logger.warning(f"No files to load in {DATA_DIR}")
+        return
+    file_extractor = None
+    num_workers = None
+    if config.use_llama_parse:
+        # LlamaParse is async first,
+        # so we need to use nest_asyncio to run it in sync mode
+        import nest_asyncio
 
-    try:
-        file_extractor = None
-        if config.use_llama_parse:
-            # LlamaParse is async first,
-            # so we need to use nest_asyncio to run it in sync mode
-            import nest_asyncio
+        nest_asyncio.apply()
 
-            nest_asyncio.apply()
+        file_extractor = llama_parse_extractor()
+        # Parsing runs on LlamaCloud, no need for local processes
+        num_workers = 1
+    for _, documents in parse_files(
+        files,
+        num_workers=num_workers,
+        filename_as_id=True,
+        raise_on_error=True,
+        file_extractor=file_extractor,
+    ):
+        yield from documents
 
-            file_extractor = llama_parse_extractor()
-        reader = SimpleDirectoryReader(
-            DATA_DIR,
-            recursive=True,
-            filename_as_id=True,
-            raise_on_error=True,
-            file_extractor=file_extractor,
-        )
-        return reader.load_data()
-    except Exception as e:
-        import sys
-        import traceback
 
-        # Catch the error if the data dir is empty
-        # and return as empty document list
-        _, _, exc_traceback = sys.exc_info()
-        function_name = traceback.extract_tb(exc_traceback)[-1].name
-        if function_name == "_add_files":
-            logger.warning(
-                f"Failed to load file documents, error message: {e} . Return as empty document list."
-            )
-            return []
-        else:
-            # Raise the error if it is not the case of empty data dir
-            raise e
+def get_file_documents(
+    config: FileLoaderConfig, input_files: Optional[List[str]] = None
+) -> List[Document]:
+    return list(iter_file_documents(config, input_files))
@@ -0,0 +1,133 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from llama_index.core import Document
+
+logger = logging.getLogger("uvicorn")
+
+
+def get_num_workers() -> int:
+    """
+    The number of processes parsing the files, from the PARSE_WORKERS environment
+    variable, default is the number of CPUs.
+    """
+    value = os.getenv("PARSE_WORKERS")
+    if value:
+        return max(1, int(value))
+    return os.cpu_count() or 1
+
+
+class ParseStats:
+    """
+    Parse time and size of the files by file type.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.by_type: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"files": 0, "bytes": 0, "documents": 0, "seconds": 0.0}
+        )
+
+    def add(self, path: str, documents: int, seconds: float) -> None:
+        stats = self.by_type[os.path.splitext(path)[1].lower() or "(none)"]
+        stats["files"] += 1
+        stats["bytes"] += os.path.getsize(path)
+        stats["documents"] += documents
+        stats["seconds"] += seconds
+
+    def log(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        files = sum(int(stats["files"]) for stats in self.by_type.values())
+        logger.info(f"Parsed {files} files in {elapsed:.1f}s")
+        for file_type, stats in sorted(self.by_type.items()):
+            seconds = max(stats["seconds"], 1e-9)
+            logger.info(
+                f"  {file_type}: {int(stats['files'])} files, "
+                f"{stats['bytes'] / 2**20:.1f} MiB, {int(stats['documents'])} documents "
+                f"in {stats['seconds']:.1f}s parse time "
+                f"({stats['files'] / seconds:.1f} files/s, "
+                f"{stats['bytes'] / 2**20 / seconds:.1f} MiB/s per worker)"
+            )
+
+
+def _parse_file(
+    path: str, reader_kwargs: Dict[str, Any]
+) -> Tuple[List[Document], float]:
+    from llama_index.core.readers import SimpleDirectoryReader
+
+    start = time.perf_counter()
+    documents = SimpleDirectoryReader(input_files=[path], **reader_kwargs).load_data()
+    return documents, time.perf_counter() - start
+
+
+def parse_files(
+    input_files: List[str],
+    num_workers: Optional[int] = None,
+    stats: Optional[ParseStats] = None,
+    **reader_kwargs: Any,
+) -> Iterator[Tuple[str, List[Document]]]:
+    """
+    Parse the files with `SimpleDirectoryReader` in a pool of processes.
+
+    The (file, documents) pairs are yielded as soon as each file is parsed, in completion
+    order, so they can be indexed while the other files are still being parsed. At most
+    two files per worker are parsed ahead of the consumer, which bounds the memory used.
+
+    Args:
+        input_files: The files to parse.
+        num_workers: The number of processes, default is `get_num_workers()`.
+        stats: Collects the parse time by file type, logged at the end if not given.
+        reader_kwargs: The arguments of `SimpleDirectoryReader`, e.g. `filename_as_id`.
+    """
+    own_stats = stats is None
+    stats = stats or ParseStats()
+    num_workers = min(num_workers or get_num_workers(), len(input_files))
+    if num_workers <= 1:
+        for path in input_files:
+            documents, seconds = _parse_file(path, reader_kwargs)
+            stats.add(path, len(documents), seconds)
+            yield path, documents
+    else:
+        logger.info(f"Parsing {len(input_files)} files with {num_workers} processes")
+        pending_files = iter(input_files)
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            running: Dict[Future, str] = {}
+
+            def submit_next() -> None:
+                path = next(pending_files, None)
+                if path is not None:
+                    running[executor.submit(_parse_file, path, reader_kwargs)] = path
+
+            for _ in range(2 * num_workers):
+                submit_next()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = running.pop(future)
+                    documents, seconds = future.result()
+                    stats.add(path, len(documents), seconds)
+                    submit_next()
+                    yield path, documents
+    if own_stats:
+        stats.log()
+
+
+def list_files(data_dir: str) -> List[str]:
+    """
+    The files of the data directory, as listed by `SimpleDirectoryReader`.
+    """
+    from llama_index.core.readers import SimpleDirectoryReader
+
+    if not os.path.isdir(data_dir):
+        return []
+    try:
+        reader = SimpleDirectoryReader(data_dir, recursive=True)
+    except ValueError:
+        # No files in the data directory
+        return []
+    return sorted(str(Path(path)) for path in reader.input_files)
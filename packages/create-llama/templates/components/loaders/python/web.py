@@ -1,7 +1,11 @@
-from typing import List, Optional
+import logging
+import threading
+from typing import List, Optional, Tuple
 
 from pydantic import BaseModel, Field
 
+logger = logging.getLogger(__name__)
+
 
 class CrawlUrl(BaseModel):
     base_url: str
@@ -12,25 +16,120 @@ class CrawlUrl(BaseModel):
 class WebLoaderConfig(BaseModel):
     driver_arguments: Optional[List[str]] = Field(default=None)
     urls: List[CrawlUrl]
+    use_browser: bool = Field(
+        default=False,
+        description="Crawl all pages with Chrome instead of HTTP requests.",
+    )
+    browser_fallback: bool = Field(
+        default=True,
+        description="Load the pages that are rendered by JavaScript with Chrome.",
+    )
+    max_connections: int = Field(default=16, ge=1)
+    max_connections_per_host: int = Field(default=4, ge=1)
+    timeout: float = Field(default=30, description="Timeout of a request in seconds.")
+    respect_robots_txt: bool = True
+    cache_dir: Optional[str] = Field(
+        default=".cache/web",
+        description="Where to keep the crawled pages for conditional requests on re-crawls.",
+    )
 
 
 def get_web_documents(config: WebLoaderConfig):
+    if config.use_browser:
+        return get_browser_documents(config)
+
+    from app.engine.loaders.crawler import WebCrawler
+    from llama_index.core.async_utils import asyncio_run
+
+    renderer = BrowserRenderer(config) if config.browser_fallback else None
+    crawler = WebCrawler(
+        max_connections=config.max_connections,
+        max_connections_per_host=config.max_connections_per_host,
+        timeout=config.timeout,
+        respect_robots_txt=config.respect_robots_txt,
+        cache_dir=config.cache_dir,
+        render=renderer.render if renderer else None,
+    )
+    try:
+        return asyncio_run(
+            crawler.crawl(
+                [(url.base_url, url.prefix, url.max_depth) for url in config.urls]
+            )
+        )
+    finally:
+        if renderer:
+            renderer.close()
+
+
+def get_browser_documents(config: WebLoaderConfig):
     from llama_index.readers.web import WholeSiteReader
     from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-
-    options = Options()
-    driver_arguments = config.driver_arguments or []
-    for arg in driver_arguments:
-        options.add_argument(arg)
 
     docs = []
     for url in config.urls:
         scraper = WholeSiteReader(
             prefix=url.prefix,
             max_depth=url.max_depth,
-            driver=webdriver.Chrome(options=options),
+            driver=webdriver.Chrome(options=_chrome_options(config)),
         )
         docs.extend(scraper.load_data(url.base_url))
 
     return docs
+
+
+def _chrome_options(config: WebLoaderConfig):
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    driver_arguments = config.driver_arguments or []
+    for arg in driver_arguments:
+        options.add_argument(arg)
+    return options
+
+
+class BrowserRenderer:
+    """
+    Load pages with a single Chrome instance, started on the first page.
+    """
+
+    def __init__(self, config: WebLoaderConfig):
+        self.config = config
+        self._driver = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+
+    def render(self, url: str) -> Optional[Tuple[str, List[str]]]:
+        with self._lock:
+            if self._unavailable:
+                return None
+            if self._driver is None:
+                try:
+                    from selenium import webdriver
+
+                    self._driver = webdriver.Chrome(
+                        options=_chrome_options(self.config)
+                    )
+                except Exception as e:
+                    logger.warning(
+                        f"Failed to start Chrome ({e}), pages rendered by JavaScript "
+                        "are indexed without their dynamic content"
+                    )
+                    self._unavailable = True
+                    return None
+            try:
+                from selenium.webdriver.common.by import By
+
+                self._driver.get(url)
+                text = self._driver.find_element(By.TAG_NAME, "body").text
+                links = [
+                    element.get_attribute("href")
+                    for element in self._driver.find_elements(By.TAG_NAME, "a")
+                ]
+                return text, [link for link in links if link]
+            except Exception as e:
+                logger.warning(f"Failed to load {url} with Chrome: {e}")
+                return None
+
+    def close(self) -> None:
+        if self._driver is not None:
+            self._driver.quit()
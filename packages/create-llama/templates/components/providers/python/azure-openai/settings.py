@@ -4,6 +4,8 @@ from llama_index.core import Settings
 from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 from llama_index.llms.azure_openai import AzureOpenAI
 
+from src.embedding_cache import cache_embed_model
+
 
 def init_settings():
     api_key = os.getenv("AZURE_OPENAI_API_KEY")
@@ -38,3 +40,5 @@ def init_settings():
         deployment_name=embedding_deployment,
         **azure_config,
     )
+    # Cache the embeddings of repeated queries and texts on disk
+    Settings.embed_model = cache_embed_model(Settings.embed_model)
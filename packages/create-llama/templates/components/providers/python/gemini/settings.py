@@ -4,6 +4,8 @@ from llama_index.core import Settings
 from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
 from llama_index.llms.google_genai import GoogleGenAI
 
+from src.embedding_cache import cache_embed_model
+
 
 def init_settings():
     if os.getenv("GOOGLE_API_KEY") is None:
@@ -12,3 +14,5 @@ def init_settings():
     Settings.embed_model = GoogleGenAIEmbedding(
         model=os.getenv("EMBEDDING_MODEL") or "text-embedding-004"
     )
+    # Cache the embeddings of repeated queries and texts on disk
+    Settings.embed_model = cache_embed_model(Settings.embed_model)
@@ -4,6 +4,8 @@ from llama_index.core import Settings
 from llama_index.embeddings.fastembed import FastEmbedEmbedding
 from llama_index.llms.groq import Groq
 
+from src.embedding_cache import cache_embed_model
+
 EMBEDDING_MODEL_MAP = {
     "all-MiniLM-L6-v2": "sentence-transformers/all-MiniLM-L6-v2",
     "all-mpnet-base-v2": "sentence-transformers/all-mpnet-base-v2",
@@ -19,3 +21,5 @@ def init_settings():
         os.getenv("EMBEDDING_MODEL") or "all-MiniLM-L6-v2"
     ]
     Settings.embed_model = FastEmbedEmbedding(model_name=embed_model_name)
+    # Cache the embeddings of repeated queries and texts on disk
+    Settings.embed_model = cache_embed_model(Settings.embed_model)
@@ -4,7 +4,11 @@ from llama_index.core import Settings
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.huggingface import HuggingFaceLLM
 
+from src.embedding_cache import cache_embed_model
+
 
 def init_settings():
     Settings.llm = HuggingFaceLLM(model_name=os.getenv("MODEL"))
     Settings.embed_model = HuggingFaceEmbedding(model_name=os.getenv("EMBEDDING_MODEL"))
+    # Cache the embeddings of repeated queries and texts on disk
+    Settings.embed_model = cache_embed_model(Settings.embed_model)
@@ -4,6 +4,8 @@ from llama_index.core import Settings
 from llama_index.embeddings.ollama import OllamaEmbedding
 from llama_index.llms.ollama import Ollama
 
+from src.embedding_cache import cache_embed_model
+
 
 def init_settings():
     if os.getenv("OLLAMA_BASE_URL") is None:
@@ -14,3 +16,5 @@ def init_settings():
 
     Settings.llm = Ollama(model=llm_model, base_url=base_url)
     Settings.embed_model = OllamaEmbedding(model=embed_model, base_url=base_url)
+    # Cache the embeddings of repeated queries and texts on disk
+    Settings.embed_model = cache_embed_model(Settings.embed_model)
@@ -4,6 +4,8 @@ from llama_index.core import Settings
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms.openai import OpenAI
 
+from src.embedding_cache import cache_embed_model
+
 
 def init_settings():
     if os.getenv("OPENAI_API_KEY") is None:
@@ -12,3 +14,5 @@ def init_settings():
     Settings.embed_model = OpenAIEmbedding(
         model=os.getenv("EMBEDDING_MODEL") or "text-embedding-3-large"
     )
+    # Cache the embeddings of repeated queries and texts on disk
+    Settings.embed_model = cache_embed_model(Settings.embed_model)
@@ -5,6 +5,8 @@ from typing import Dict
 from llama_index.core.settings import Settings
 from llama_index.embeddings.openai import OpenAIEmbedding
 
+from src.embedding_cache import cache_embed_model
+
 logger = logging.getLogger(__name__)
 
 DEFAULT_MODEL = "gpt-3.5-turbo"
@@ -70,3 +72,5 @@ def init_settings():
         is_function_calling_model=False,
         context_window=4096,
     )
+    # Cache the embeddings of repeated queries and texts on disk
+    Settings.embed_model = cache_embed_model(Settings.embed_model)
@@ -12,12 +12,14 @@ from app.config import (
     CONTRACT_MATCH_PROMPT,
 )
 from app.engine.index import get_index
+from app.engine.retrieval import aretrieve_batch
 from app.models import (
     ClauseComplianceCheck,
     ComplianceReport,
     ContractClause,
     ContractExtraction,
 )
+from app.services.concurrency import AdaptiveConcurrency, get_concurrency_controller
 from llama_index.core import SimpleDirectoryReader
 from llama_index.core.llms import LLM
 from llama_index.core.prompts import ChatPromptTemplate
@@ -34,6 +36,10 @@ from llama_index.core.workflow import (
 
 logger = logging.getLogger(__name__)
 
+# Number of clauses checked at the same time by a review, their LLM calls also wait for
+# the concurrency controller shared by all reviews
+CLAUSE_CHECK_CONCURRENCY = int(os.getenv("CLAUSE_CHECK_CONCURRENCY", 16))
+
 
 def get_workflow():
     index = get_index()
@@ -64,6 +70,7 @@ class MatchGuidelineEvent(Event):
     request_id: str
     clause: ContractClause
     vendor_name: str
+    guideline_text: str
 
 
 class MatchGuidelineResultEvent(Event):
@@ -89,6 +96,7 @@ class ContractReviewWorkflow(Workflow):
         guideline_retriever: BaseRetriever,
         llm: LLM | None = None,
         similarity_top_k: int = 20,
+        concurrency: AdaptiveConcurrency | None = None,
         **kwargs,
     ) -> None:
         """Init params."""
@@ -98,6 +106,8 @@ class ContractReviewWorkflow(Workflow):
 
         self.llm = llm or Settings.llm
         self.similarity_top_k = similarity_top_k
+        # Shared with the other reviews of the process, LLM_CONCURRENCY sets the maximum
+        self.concurrency = concurrency or get_concurrency_controller()
 
         # if not exists, create
         out_path = Path("output") / "workflow_output"
@@ -179,18 +189,34 @@ class ContractReviewWorkflow(Workflow):
     ) -> MatchGuidelineEvent:
         """For each clause in the contract, find relevant guidelines.
 
-        Use a map-reduce pattern, send each parsed clause as a MatchGuidelineEvent.
+        The guidelines of all clauses are retrieved in one batch (the clauses are embedded
+        off the event loop with a bounded concurrency, then searched at once), then each
+        clause is sent with its guidelines as a MatchGuidelineEvent (map-reduce pattern).
         """
-        await ctx.set("num_clauses", len(ev.contract_extraction.clauses))
+        clauses = ev.contract_extraction.clauses
+        vendor_name = ev.contract_extraction.vendor_name or "Not identified"
+        await ctx.set("num_clauses", len(clauses))
         await ctx.set("vendor_name", ev.contract_extraction.vendor_name)
 
-        for clause in ev.contract_extraction.clauses:
+        # retrieve the matching guidelines of all clauses
+        queries = [
+            f"""\
+Find the relevant guideline from {vendor_name} that aligns with the following contract clause:
+
+{clause.clause_text}
+"""
+            for clause in clauses
+        ]
+        guideline_docs = await aretrieve_batch(self.guideline_retriever, queries)
+
+        for clause, docs in zip(clauses, guideline_docs):
             request_id = str(uuid.uuid4())
             ctx.send_event(
                 MatchGuidelineEvent(
                     request_id=request_id,
                     clause=clause,
-                    vendor_name=ev.contract_extraction.vendor_name or "Not identified",
+                    vendor_name=vendor_name,
+                    guideline_text="\n\n".join([g.get_content() for g in docs]),
                 )
             )
         ctx.write_event_to_stream(
@@ -200,7 +226,7 @@ class ContractReviewWorkflow(Workflow):
             )
         )
 
-    @step
+    @step(num_workers=CLAUSE_CHECK_CONCURRENCY)
     async def handle_guideline_match(
         self, ctx: Context, ev: MatchGuidelineEvent
     ) -> MatchGuidelineResultEvent:
@@ -213,28 +239,21 @@ class ContractReviewWorkflow(Workflow):
                     "request_id": ev.request_id,
                     "clause_text": ev.clause.clause_text,
                     "is_compliant": None,
+                    "concurrency": self.concurrency.concurrency,
                 },
             )
         )
 
-        # retrieve matching guideline
-        query = f"""\
-Find the relevant guideline from {ev.vendor_name} that aligns with the following contract clause:
-
-{ev.clause.clause_text}
-"""
-        guideline_docs = self.guideline_retriever.retrieve(query)
-        guideline_text = "\n\n".join([g.get_content() for g in guideline_docs])
-
         # extract compliance from contract into a structured model
         # see ClauseComplianceCheck model for the schema
         prompt = ChatPromptTemplate.from_messages([("user", CONTRACT_MATCH_PROMPT)])
-        compliance_output = await self.llm.astructured_predict(
-            ClauseComplianceCheck,
-            prompt,
-            clause_text=ev.clause.model_dump_json(),
-            guideline_text=guideline_text,
-        )
+        async with self.concurrency.slot():
+            compliance_output = await self.llm.astructured_predict(
+                ClauseComplianceCheck,
+                prompt,
+                clause_text=ev.clause.model_dump_json(),
+                guideline_text=ev.guideline_text,
+            )
 
         if not isinstance(compliance_output, ClauseComplianceCheck):
             raise ValueError(f"Invalid compliance check: {compliance_output}")
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger("uvicorn")
+
+# Maximum number of concurrent LLM calls, set with LLM_CONCURRENCY
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class AdaptiveConcurrency:
+    """
+    Limit the number of concurrent LLM calls and adapt the limit to the provider with
+    AIMD (additive increase, multiplicative decrease):
+    - After a successful call, the limit grows by 1 / limit, so by one per round of calls.
+    - After a rate limit error (429) or a call slower than `latency_tolerance` times the
+      average latency, the limit is multiplied by `backoff`, once per round of calls.
+
+    The limit stays between `min_concurrency` and `max_concurrency`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        min_concurrency: int = 1,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.5,
+    ):
+        self.max_concurrency = max(min_concurrency, max_concurrency)
+        self.min_concurrency = min_concurrency
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        # Start in the middle, the first rounds find the limit of the provider
+        self.limit = float(max(min_concurrency, (self.max_concurrency + 1) // 2))
+        self.in_flight = 0
+        self._average_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def concurrency(self) -> int:
+        """
+        The current number of calls that can run at the same time.
+        """
+        return max(self.min_concurrency, int(self.limit))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Wait until a call can start, e.g. `async with controller.slot(): await llm.acomplete(...)`.
+        """
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if _is_rate_limit_error(e):
+                self._decrease(start, "rate limited")
+            raise
+        else:
+            self._on_success(start, time.monotonic() - start)
+        finally:
+            async with condition:
+                self.in_flight -= 1
+                condition.notify_all()
+
+    def _get_condition(self) -> asyncio.Condition:
+        # The controller is shared by the requests, a condition belongs to one event loop
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._loop = loop
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _on_success(self, start: float, latency: float) -> None:
+        average = self._average_latency
+        self._average_latency = (
+            latency if average is None else 0.8 * average + 0.2 * latency
+        )
+        if average is not None and latency > self.latency_tolerance * average:
+            self._decrease(start, f"slow call ({latency:.1f}s)")
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _decrease(self, start: float, reason: str) -> None:
+        # The calls started before the last decrease ran at the previous limit
+        if start < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        previous = self.concurrency
+        self.limit = max(self.min_concurrency, self.limit * self.backoff)
+        logger.info(
+            f"Reduced the LLM concurrency from {previous} to {self.concurrency}: {reason}"
+        )
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    status_code = getattr(error, "status_code", None) or getattr(
+        getattr(error, "response", None), "status_code", None
+    )
+    return status_code == 429 or "RateLimit" in type(error).__name__
+
+
+_controller: Optional[AdaptiveConcurrency] = None
+
+
+def get_concurrency_controller() -> AdaptiveConcurrency:
+    """
+    The controller shared by all workflow steps of the process.
+    """
+    global _controller
+    if _controller is None:
+        _controller = AdaptiveConcurrency(
+            max_concurrency=int(os.getenv("LLM_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        )
+    return _controller
@@ -2,7 +2,7 @@ import logging
 import os
 import uuid
 import time
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
@@ -14,7 +14,7 @@ from llama_index.core.indices.base import BaseIndex
 from llama_index.core.memory import ChatMemoryBuffer
 from llama_index.core.memory.simple_composable_memory import SimpleComposableMemory
 from llama_index.core.prompts import PromptTemplate
-from llama_index.core.schema import MetadataMode, Node, NodeWithScore
+from llama_index.core.schema import MetadataMode, NodeWithScore
 from llama_index.core.settings import Settings
 from llama_index.core.types import ChatMessage, MessageRole
 from llama_index.core.workflow import (
@@ -37,13 +37,20 @@ from llama_index.core.chat_ui.events import (
     SourceNodesEvent,
 )
 
+from src.concurrency import AdaptiveConcurrency, get_concurrency_controller
 from src.index import get_index
+from src.retrieval import aretrieve
 from src.settings import init_settings
 from src.utils import write_response_to_stream
 
 logger = logging.getLogger("uvicorn")
 logger.setLevel(logging.INFO)
 
+# Maximum number of tokens of the retrieved context sent with a question or a research plan
+DEFAULT_CONTEXT_TOKENS = 4000
+# Questions are picked up right away, their LLM calls wait for the concurrency controller
+MAX_ANSWER_WORKERS = 16
+
 
 def create_workflow() -> Workflow:
     load_dotenv()
@@ -69,7 +76,6 @@ class PlanResearchEvent(Event):
 class ResearchEvent(Event):
     question_id: str
     question: str
-    context_nodes: List[NodeWithScore]
 
 
 class CollectAnswersEvent(Event):
@@ -106,6 +112,10 @@ class UIEventData(BaseModel):
         default=None,
         description="Used by answer event to display the answer of the question",
     )
+    concurrency: Optional[int] = Field(
+        default=None,
+        description="Used by answer event: the number of questions answered concurrently",
+    )
 
 
 class DeepResearchWorkflow(Workflow):
@@ -123,7 +133,9 @@ class DeepResearchWorkflow(Workflow):
     """
 
     memory: SimpleComposableMemory
-    context_nodes: List[Node]
+    context_nodes: List[NodeWithScore]
+    context_pool: "ContextPool"
+    concurrency: AdaptiveConcurrency
     index: BaseIndex
     user_request: str
     stream: bool = True
@@ -131,11 +143,17 @@ class DeepResearchWorkflow(Workflow):
     def __init__(
         self,
         index: BaseIndex,
+        concurrency: Optional[AdaptiveConcurrency] = None,
         **kwargs,
     ):
         super().__init__(**kwargs)
         self.index = index
+        # Shared with the other workflows of the process, LLM_CONCURRENCY sets the maximum
+        self.concurrency = concurrency or get_concurrency_controller()
         self.context_nodes = []
+        self.context_pool = ContextPool(
+            max_tokens=int(os.getenv("CONTEXT_TOKENS", DEFAULT_CONTEXT_TOKENS))
+        )
         self.memory = SimpleComposableMemory.from_defaults(
             primary_memory=ChatMemoryBuffer.from_defaults(),
         )
@@ -176,8 +194,8 @@ class DeepResearchWorkflow(Workflow):
         retriever = self.index.as_retriever(
             similarity_top_k=int(os.getenv("TOP_K", 10)),
         )
-        nodes = retriever.retrieve(self.user_request)
-        self.context_nodes.extend(nodes)  # type: ignore
+        nodes = await aretrieve(retriever, self.user_request)
+        self.context_nodes.extend(self.context_pool.add(nodes))
         ctx.write_event_to_stream(
             UIEvent(
                 type="ui_event",
@@ -216,7 +234,7 @@ class DeepResearchWorkflow(Workflow):
         total_questions = await ctx.get("total_questions")
         res = await plan_research(
             memory=self.memory,
-            context_nodes=self.context_nodes,
+            context_str=self.context_pool.pack(self.context_nodes),
             user_request=self.user_request,
             total_questions=total_questions,
         )
@@ -288,7 +306,6 @@ class DeepResearchWorkflow(Workflow):
                     ResearchEvent(
                         question_id=question_id,
                         question=question,
-                        context_nodes=self.context_nodes,
                     )
                 )
         ctx.write_event_to_stream(
@@ -302,27 +319,38 @@ class DeepResearchWorkflow(Workflow):
         )
         return None
 
-    @step(num_workers=2)
+    @step(num_workers=MAX_ANSWER_WORKERS)
     async def answer(self, ctx: Context, ev: ResearchEvent) -> CollectAnswersEvent:
         """
         Answer the question
         """
-        ctx.write_event_to_stream(
-            UIEvent(
-                type="ui_event",
-                data=UIEventData(
-                    event="answer",
-                    state="inprogress",
-                    id=ev.question_id,
-                    question=ev.question,
-                ),
-            )
-        )
         try:
-            answer = await research(
-                context_nodes=ev.context_nodes,
-                question=ev.question,
+            # Retrieve the context of the question instead of sending all collected nodes
+            retriever = self.index.as_retriever(
+                similarity_top_k=int(os.getenv("TOP_K", 10)),
             )
+            nodes = await aretrieve(retriever, ev.question)
+            new_nodes = self.context_pool.add(nodes)
+            if new_nodes:
+                self.context_nodes.extend(new_nodes)
+                ctx.write_event_to_stream(SourceNodesEvent(nodes=new_nodes))
+            async with self.concurrency.slot():
+                ctx.write_event_to_stream(
+                    UIEvent(
+                        type="ui_event",
+                        data=UIEventData(
+                            event="answer",
+                            state="inprogress",
+                            id=ev.question_id,
+                            question=ev.question,
+                            concurrency=self.concurrency.concurrency,
+                        ),
+                    )
+                )
+                answer = await research(
+                    context_str=self.context_pool.pack(nodes),
+                    question=ev.question,
+                )
         except Exception as e:
             logger.error(f"Error answering question {ev.question}: {e}")
             answer = f"Got error when answering the question: {ev.question}"
@@ -432,7 +460,7 @@ class AnalysisDecision(BaseModel):
 
 async def plan_research(
     memory: SimpleComposableMemory,
-    context_nodes: List[Node],
+    context_str: str,
     user_request: str,
     total_questions: int,
 ) -> AnalysisDecision:
@@ -484,9 +512,6 @@ async def plan_research(
     conversation_context = "\n".join(
         [f"{message.role}: {message.content}" for message in memory.get_all()]
     )
-    context_str = "\n".join(
-        [node.get_content(metadata_mode=MetadataMode.LLM) for node in context_nodes]
-    )
     res = await Settings.llm.astructured_predict(
         output_cls=AnalysisDecision,
         prompt=PromptTemplate(template=analyze_prompt),
@@ -500,7 +525,7 @@ async def plan_research(
 
 async def research(
     question: str,
-    context_nodes: List[NodeWithScore],
+    context_str: str,
 ) -> str:
     prompt = """
     You are a researcher who is in the process of answering the question.
@@ -524,9 +549,6 @@ async def research(
 
     No prior knowledge, just use the provided context to answer the question: {question}
     """
-    context_str = "\n".join(
-        [_get_text_node_content_for_citation(node) for node in context_nodes]
-    )
     res = await Settings.llm.acomplete(
         prompt=prompt.format(question=question, context_str=context_str),
     )
@@ -576,6 +598,60 @@ async def write_report(
     return res
 
 
+class ContextPool:
+    """
+    The nodes retrieved during a research, deduplicated by node id.
+
+    Each node is rendered for citation (and its tokens counted) once, `pack` then selects
+    the most relevant of the given nodes that fit in `max_tokens`, so the prompt of a
+    question only contains its own context instead of all the collected nodes.
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_CONTEXT_TOKENS):
+        self.max_tokens = max_tokens
+        self.nodes: Dict[str, NodeWithScore] = {}
+        self._rendered: Dict[str, str] = {}
+        self._num_tokens: Dict[str, int] = {}
+
+    def add(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        """
+        Add the retrieved nodes to the pool and return the ones that weren't in it yet.
+        """
+        new_nodes = []
+        for node in nodes:
+            if node.node.node_id not in self.nodes:
+                self.nodes[node.node.node_id] = node
+                new_nodes.append(node)
+        return new_nodes
+
+    def render(self, node: NodeWithScore) -> str:
+        node_id = node.node.node_id
+        if node_id not in self._rendered:
+            self._rendered[node_id] = _get_text_node_content_for_citation(node)
+            self._num_tokens[node_id] = len(Settings.tokenizer(self._rendered[node_id]))
+        return self._rendered[node_id]
+
+    def pack(self, nodes: List[NodeWithScore]) -> str:
+        """
+        The rendered context of the nodes with the highest scores within the token budget.
+        """
+        selected: List[str] = []
+        num_tokens = 0
+        seen = set()
+        for node in sorted(nodes, key=lambda n: n.score or 0.0, reverse=True):
+            node_id = node.node.node_id
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            content = self.render(node)
+            if num_tokens + self._num_tokens[node_id] > self.max_tokens and selected:
+                # The most relevant node is always sent, skip the others that don't fit
+                continue
+            selected.append(content)
+            num_tokens += self._num_tokens[node_id]
+        return "\n".join(selected)
+
+
 def _get_text_node_content_for_citation(node: NodeWithScore) -> str:
     """
     Construct node content for LLM with citation flag.
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import uuid
 from abc import ABC, abstractmethod
@@ -16,6 +17,7 @@ from llama_index.core.tools import (
 from llama_index.core.workflow import Context
 from llama_index.core.agent.workflow.workflow_events import ToolCall, ToolCallResult
 
+from src.concurrency import AdaptiveConcurrency
 from src.events import AgentRunEvent, AgentRunEventType
 
 logger = logging.getLogger("uvicorn")
@@ -71,12 +73,15 @@ async def chat_with_tools(  # type: ignore
     llm: FunctionCallingLLM,
     tools: list[BaseTool],
     chat_history: list[ChatMessage],
+    allow_parallel_tool_calls: bool = False,
 ) -> ChatWithToolsResponse:
     """
     Request LLM to call tools or not.
     This function doesn't change the memory.
     """
-    generator = _tool_call_generator(llm, tools, chat_history)
+    generator = _tool_call_generator(
+        llm, tools, chat_history, allow_parallel_tool_calls
+    )
     is_tool_call = await generator.__anext__()
     if is_tool_call:
         # Last chunk is the full response
@@ -104,9 +109,11 @@ async def call_tools(
     tools: list[BaseTool],
     tool_calls: list[ToolSelection],
     emit_agent_events: bool = True,
+    concurrency: Optional[AdaptiveConcurrency] = None,
 ) -> list[ToolCallOutput]:
     """
     Call tools and return the tool call responses.
+    With a concurrency controller, multiple tool calls run concurrently within its limit.
     """
     if len(tool_calls) == 0:
         return []
@@ -119,14 +126,15 @@ async def call_tools(
                     msg=f"{tool_calls[0].tool_name}: {tool_calls[0].tool_kwargs}",
                 )
             )
-        return [
-            await call_tool(ctx, tools_by_name[tool_calls[0].tool_name], tool_calls[0])
-        ]
+        tool = tools_by_name[tool_calls[0].tool_name]
+        if concurrency is None:
+            return [await call_tool(ctx, tool, tool_calls[0])]
+        async with concurrency.slot():
+            return [await call_tool(ctx, tool, tool_calls[0])]
     # Multiple tool calls, show progress
-    tool_call_outputs: list[ToolCallOutput] = []
-
     progress_id = str(uuid.uuid4())
     total_steps = len(tool_calls)
+    completed = 0
     if emit_agent_events:
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -134,45 +142,52 @@ async def call_tools(
                 msg=f"Making {total_steps} tool calls",
             )
         )
-    for i, tool_call in enumerate(tool_calls):
+
+    async def _call(tool_call: ToolSelection) -> ToolCallOutput:
+        nonlocal completed
         tool = tools_by_name.get(tool_call.tool_name)
         if not tool:
-            tool_call_outputs.append(
-                ToolCallOutput(
-                    tool_call_id=tool_call.tool_id,
-                    tool_output=ToolOutput(
-                        is_error=True,
-                        content=f"Tool {tool_call.tool_name} does not exist",
-                        tool_name=tool_call.tool_name,
-                        raw_input=tool_call.tool_kwargs,
-                        raw_output={
-                            "error": f"Tool {tool_call.tool_name} does not exist",
-                        },
-                    ),
-                )
+            return ToolCallOutput(
+                tool_call_id=tool_call.tool_id,
+                tool_output=ToolOutput(
+                    is_error=True,
+                    content=f"Tool {tool_call.tool_name} does not exist",
+                    tool_name=tool_call.tool_name,
+                    raw_input=tool_call.tool_kwargs,
+                    raw_output={
+                        "error": f"Tool {tool_call.tool_name} does not exist",
+                    },
+                ),
             )
-            continue
 
-        tool_call_output = await call_tool(
-            ctx,
-            tool,
-            tool_call,
-        )
+        if concurrency is None:
+            tool_call_output = await call_tool(ctx, tool, tool_call)
+        else:
+            async with concurrency.slot():
+                tool_call_output = await call_tool(ctx, tool, tool_call)
         if emit_agent_events:
+            data = {
+                "id": progress_id,
+                "total": total_steps,
+                "current": completed,
+            }
+            if concurrency is not None:
+                data["concurrency"] = concurrency.concurrency
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name=agent_name,
                     msg=f"{tool_call.tool_name}: {tool_call.tool_kwargs}",
                     event_type=AgentRunEventType.PROGRESS,
-                    data={
-                        "id": progress_id,
-                        "total": total_steps,
-                        "current": i,
-                    },
+                    data=data,
                 )
             )
-        tool_call_outputs.append(tool_call_output)
-    return tool_call_outputs
+        completed += 1
+        return tool_call_output
+
+    if concurrency is None:
+        return [await _call(tool_call) for tool_call in tool_calls]
+    # The outputs are returned in the order of the tool calls
+    return list(await asyncio.gather(*[_call(tool_call) for tool_call in tool_calls]))
 
 
 async def call_tool(
@@ -225,11 +240,12 @@ async def _tool_call_generator(
     llm: FunctionCallingLLM,
     tools: list[BaseTool],
     chat_history: list[ChatMessage],
+    allow_parallel_tool_calls: bool = False,
 ) -> AsyncGenerator[ChatResponse | bool, None]:
     response_stream = await llm.astream_chat_with_tools(
         tools,
         chat_history=chat_history,
-        allow_parallel_tool_calls=False,
+        allow_parallel_tool_calls=allow_parallel_tool_calls,
     )
 
     full_response = None
@@ -16,6 +16,7 @@ from llama_index.core.workflow import (
     step,
 )
 
+from src.concurrency import get_concurrency_controller
 from src.index import get_index
 from src.settings import init_settings
 from src.query import get_query_engine_tool
@@ -149,11 +150,12 @@ class FinancialReportWorkflow(Workflow):
         """
         # Always use the latest chat history from the input
         chat_history: list[ChatMessage] = ev.input
-        # Get tool calls
+        # Get tool calls, the researcher runs several queries concurrently
         response = await chat_with_tools(
             self.llm,
             self.tools,  # type: ignore
             chat_history,
+            allow_parallel_tool_calls=True,
         )
         if not response.has_tool_calls():
             if self.stream:
@@ -196,11 +198,13 @@ class FinancialReportWorkflow(Workflow):
         )
         tool_calls = ev.input
 
+        # The queries run concurrently, within the LLM concurrency shared with other requests
         tool_call_outputs = await call_tools(
             ctx=ctx,
             agent_name="Researcher",
             tools=[self.query_engine_tool],
             tool_calls=tool_calls,
+            concurrency=get_concurrency_controller(),
         )
         for tool_call_output in tool_call_outputs:
             self.memory.put(
@@ -121,7 +121,9 @@ def _create_index(
     if len(pipelines) == 0:
         from llama_index.embeddings.openai import OpenAIEmbedding
 
-        if not isinstance(Settings.embed_model, OpenAIEmbedding):
+        # Unwrap the embedding cache to check the actual model
+        embed_model = getattr(Settings.embed_model, "embed_model", Settings.embed_model)
+        if not isinstance(embed_model, OpenAIEmbedding):
             raise ValueError(
                 "Creating a new pipeline with a non-OpenAI embedding model is not supported."
             )
@@ -0,0 +1,115 @@
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn")
+
+# Rows to assign to the centroids at once, bounds the memory used while building
+ASSIGN_CHUNK_SIZE = 65536
+
+
+class IVFIndex:
+    """
+    Inverted file index for approximate nearest neighbor search over normalized vectors.
+
+    The vectors are clustered with spherical k-means, each cluster (list) keeps the rows of its
+    vectors. A query is only compared with the vectors of the `nprobe` lists whose centroids
+    are the most similar to the query: a higher `nprobe` increases the recall and the latency.
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        """
+        Args:
+            centroids: The normalized centroids of the lists, shape (n_lists, dim).
+            order: The rows of the vectors sorted by list.
+            offsets: The start of each list in `order`, shape (n_lists + 1,).
+        """
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def size(self) -> int:
+        return len(self.order)
+
+    @staticmethod
+    def default_n_lists(count: int) -> int:
+        return max(1, int(4 * np.sqrt(count)))
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        iterations: int = 10,
+        sample_size: int = 256,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """
+        Cluster the (normalized) vectors with spherical k-means.
+
+        Args:
+            vectors: The vectors to index, shape (count, dim).
+            n_lists: The number of lists, default is 4 * sqrt(count).
+            iterations: The number of k-means iterations.
+            sample_size: The number of training vectors per list, k-means runs on this sample.
+            seed: The seed of the random generator.
+        """
+        count = len(vectors)
+        n_lists = min(n_lists or cls.default_n_lists(count), count)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(
+            rng.choice(count, min(count, n_lists * sample_size), replace=False)
+        )
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = ~np.bincount(assignments, minlength=n_lists).astype(bool)
+            # Restart empty lists from random training vectors
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms == 0, 1, norms)
+
+        assignments = np.empty(count, dtype=np.int32)
+        for start in range(0, count, ASSIGN_CHUNK_SIZE):
+            block = np.asarray(vectors[start : start + ASSIGN_CHUNK_SIZE], np.float32)
+            assignments[start : start + len(block)] = np.argmax(
+                block @ centroids.T, axis=1
+            )
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=n_lists))
+        logger.info(f"Built IVF index with {n_lists} lists for {count} vectors")
+        return cls(centroids.astype(np.float32), order, offsets)
+
+    def search_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """
+        The rows of the vectors in the `nprobe` lists closest to the (normalized) query.
+        """
+        nprobe = min(nprobe, self.n_lists)
+        scores = self.centroids @ query
+        lists = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        return np.concatenate(
+            [self.order[self.offsets[i] : self.offsets[i + 1]] for i in lists]
+        )
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path, centroids=self.centroids, order=self.order, offsets=self.offsets
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["order"], data["offsets"])
@@ -0,0 +1,132 @@
+"""
+Benchmark the local vector store on synthetic clustered embeddings.
+
+Reports the recall@k against brute force search and the p50/p99 query latency of
+the approximate (IVF) search for different `nprobe` values, and the memory of the first
+pass vectors with int8/binary quantization and truncated dimensions.
+The synthetic embeddings put more variance in the first dimensions, like Matryoshka embeddings.
+
+Usage:
+    python -m app.engine.benchmark --vectors 100000 --dim 768 --queries 200 --nprobe 1 4 8 16 --truncate-dim 256
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from app.engine.vectordb import MemmapVectorStore
+
+
+def _make_data(
+    count: int, dim: int, queries: int, clusters: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Embeddings of real documents are clustered by topic, uniform random vectors are not
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=count)]
+    vectors += 0.5 * rng.normal(size=(count, dim)).astype(np.float32)
+    query_vectors = centers[rng.integers(clusters, size=queries)]
+    query_vectors += 0.5 * rng.normal(size=(queries, dim)).astype(np.float32)
+    decay = np.exp(-2 * np.arange(dim) / dim).astype(np.float32)
+    return vectors * decay, query_vectors * decay
+
+
+def _build_store(
+    directory: str, vectors: np.ndarray, **kwargs: object
+) -> MemmapVectorStore:
+    store = MemmapVectorStore(**kwargs)  # type: ignore
+    store.add(
+        [
+            TextNode(id_=str(i), text="", embedding=vector.tolist())
+            for i, vector in enumerate(vectors)
+        ]
+    )
+    store.persist(f"{directory}/default__vector_store.json")
+    return MemmapVectorStore.from_persist_dir(directory)
+
+
+def _run(
+    store: MemmapVectorStore, queries: np.ndarray, top_k: int, **kwargs: object
+) -> Tuple[List[List[str]], List[float]]:
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = store.query(
+            VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k),
+            **kwargs,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+        results.append(result.ids or [])
+    return results, timings
+
+
+def _report(name: str, timings: List[float], recall: float, nbytes: int) -> None:
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{name:<24} recall={recall:6.3f}  p50={p50:8.2f}ms  p99={p99:8.2f}ms  "
+        f"first pass={nbytes / 2**20:8.1f}MiB"
+    )
+
+
+def _recall(results: List[List[str]], expected: List[List[str]]) -> float:
+    hits = sum(len(set(r) & set(e)) for r, e in zip(results, expected))
+    return hits / max(1, sum(len(e) for e in expected))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--truncate-dim", type=int, nargs="+", default=[])
+    args = parser.parse_args()
+
+    vectors, queries = _make_data(args.vectors, args.dim, args.queries, args.clusters)
+    configs: List[Tuple[str, Dict[str, Any], Dict[str, Any]]] = [
+        (
+            f"ivf nprobe={nprobe}",
+            {"ann": "ivf", "n_lists": args.n_lists},
+            {"nprobe": nprobe},
+        )
+        for nprobe in args.nprobe
+    ]
+    truncate_dims: List[Optional[int]] = [None, *args.truncate_dim]
+    for truncate_dim in truncate_dims:
+        for quantization in ["int8", "binary", None]:
+            if quantization is None and truncate_dim is None:
+                continue
+            configs.append(
+                (
+                    f"{quantization or 'float'} dims={truncate_dim or args.dim}",
+                    {"quantization": quantization, "truncate_dim": truncate_dim},
+                    {},
+                )
+            )
+
+    with tempfile.TemporaryDirectory() as directory:
+        exact = _build_store(f"{directory}/exact", vectors)
+        expected, timings = _run(exact, queries, args.top_k)
+        full_bytes = int(exact._get_vectors().nbytes)
+        _report("brute force", timings, 1.0, full_bytes)
+        for i, (name, store_kwargs, query_kwargs) in enumerate(configs):
+            store = _build_store(f"{directory}/{i}", vectors, **store_kwargs)
+            results, timings = _run(store, queries, args.top_k, **query_kwargs)
+            quantized = store._quantized
+            nbytes = quantized.nbytes if quantized is not None else full_bytes
+            _report(name, timings, _recall(results, expected), nbytes)
+
+
+if __name__ == "__main__":
+    main()
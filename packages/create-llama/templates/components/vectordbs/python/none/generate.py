@@ -3,35 +3,202 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import argparse
 import logging
 import os
+from typing import Dict, List, Optional, Set
 
-from app.engine.loaders import get_documents
+from app.config import DATA_DIR
+from app.engine.loaders import is_incremental, iter_documents, load_configs
+from app.engine.loaders.db import commit_watermarks, reset_watermarks
+from app.engine.loaders.parsing import list_files
+from app.engine.manifest import LOADER_PREFIX, FileManifest
+from app.engine.sqlite_store import (
+    get_storage_stores,
+    remove_storage_stores,
+    storage_stores_exist,
+)
+from app.engine.storage_log import StorageLog
+from app.engine.vectordb import MemmapVectorStore, create_vector_store
 from app.settings import init_settings
+from llama_index.core import Document, Settings
 from llama_index.core.indices import (
     VectorStoreIndex,
+    load_index_from_storage,
 )
+from llama_index.core.indices.base import BaseIndex
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.storage import StorageContext
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
 
+# Number of loaded documents to split, embed and insert at once
+INSERT_BATCH_SIZE = 64
+
+
+def load_existing_index(storage_dir: str):
+    vector_store = (
+        MemmapVectorStore.from_persist_dir(storage_dir)
+        if MemmapVectorStore.exists(storage_dir)
+        else None
+    )
+    index = load_index_from_storage(
+        StorageContext.from_defaults(
+            persist_dir=storage_dir,
+            vector_store=vector_store,
+            **get_storage_stores(storage_dir),
+        )
+    )
+    # Include the files uploaded since the storage was last persisted
+    StorageLog(storage_dir).replay(index)
+    return index
+
+
+def insert_documents(index: BaseIndex, documents: List[Document]) -> None:
+    """
+    Split, embed and insert the documents into the index.
+    """
+    # Documents of an interrupted run may already be stored under the same ids
+    for doc in documents:
+        if index.docstore.get_ref_doc_info(doc.doc_id) is not None:
+            index.delete_ref_doc(doc.doc_id, delete_from_docstore=True)
+    nodes = run_transformations(documents, Settings.transformations)
+    index.insert_nodes(nodes)
+    for doc in documents:
+        index.docstore.set_document_hash(doc.doc_id, doc.hash)
+    logger.info(f"Indexed {len(documents)} documents ({len(nodes)} nodes)")
+
+
+def is_stored(index: BaseIndex, doc: Document, vector_ids: Optional[Set[str]]) -> bool:
+    """
+    Whether the document is already indexed with its current content.
+    """
+    if index.docstore.get_document_hash(doc.doc_id) != doc.hash:
+        return False
+    if vector_ids is None:
+        return True
+    # The SQLite docstore is committed right away but the vectors only when the storage
+    # is persisted, the nodes of an interrupted run are missing from the vector store
+    ref_doc_info = index.docstore.get_ref_doc_info(doc.doc_id)
+    return ref_doc_info is not None and vector_ids.issuperset(ref_doc_info.node_ids)
+
+
+def remove_documents(index: BaseIndex, manifest: FileManifest, keys: List[str]):
+    for key in keys:
+        for doc_id in manifest.doc_ids(key):
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+        manifest.remove(key)
+
 
 def generate_datasource():
+    """
+    Index the documents of the configured loaders.
+
+    If an index was already generated, only the new and changed files are parsed and
+    embedded, the documents of the deleted files are removed from it and only the new
+    and changed documents of the other loaders are embedded.
+    Run with `--full` to re-create the index from scratch.
+    Set DOCSTORE_TYPE=sqlite to keep the docstore in SQLite instead of a JSON file
+    loaded in memory.
+    """
+    parser = argparse.ArgumentParser(description="Index the documents")
+    parser.add_argument(
+        "--full", action="store_true", help="Re-create the index from scratch"
+    )
+    args, _ = parser.parse_known_args()
+
     init_settings()
-    logger.info("Creating new index")
     storage_dir = os.environ.get("STORAGE_DIR", "storage")
-    # load the documents and create the index
-    documents = get_documents()
-    # Set private=false to mark the document as public (required for filtering)
-    for doc in documents:
-        doc.metadata["private"] = "false"
-    index = VectorStoreIndex.from_documents(
-        documents,
-        show_progress=True,
+    manifest = None if args.full else FileManifest.load(storage_dir)
+    if manifest is not None and not storage_stores_exist(storage_dir):
+        logger.info("The docstore type has changed, re-creating the index")
+        manifest = None
+    updating = manifest is not None
+    if manifest is not None:
+        logger.info(f"Updating index in {storage_dir}")
+        index = load_existing_index(storage_dir)
+    else:
+        logger.info("Creating new index")
+        manifest = FileManifest(storage_dir)
+        # Load all rows of the databases again
+        reset_watermarks()
+        # The SQLite docstore is written right away, an interrupted run must start over
+        if os.path.exists(manifest.path):
+            os.remove(manifest.path)
+        remove_storage_stores(storage_dir)
+        # Keep the embeddings in a binary file instead of the JSON vector store
+        index = VectorStoreIndex(
+            nodes=[],
+            storage_context=StorageContext.from_defaults(
+                vector_store=create_vector_store(), **get_storage_stores(storage_dir)
+            ),
+        )
+
+    configs = load_configs()
+    changes = manifest.diff(list_files(DATA_DIR) if "file" in configs else [])
+    logger.info(f"Files: {changes}")
+    removed = changes.to_remove + manifest.stale_loaders(configs)
+    remove_documents(index, manifest, removed)
+    modified = bool(removed)
+
+    # run the loaders concurrently and index their documents as they arrive
+    batch: List[Document] = []
+    file_doc_ids: Dict[str, List[str]] = {path: [] for path in changes.to_load}
+    loaded_ids: Dict[str, List[str]] = {
+        loader_type: [] for loader_type in configs if loader_type != "file"
+    }
+    vector_ids = (
+        index.vector_store.node_ids()
+        if isinstance(index.vector_store, MemmapVectorStore)
+        else None
     )
-    # store it for later
+    for loader_type, doc in iter_documents(configs, input_files=changes.to_load):
+        # Set private=false to mark the document as public (required for filtering)
+        doc.metadata["private"] = "false"
+        if loader_type == "file":
+            file_doc_ids.setdefault(doc.metadata.get("file_path", ""), []).append(
+                doc.doc_id
+            )
+        else:
+            loaded_ids[loader_type].append(doc.doc_id)
+            # Only embed the new and changed documents of the other loaders
+            if is_stored(index, doc, vector_ids):
+                continue
+        batch.append(doc)
+        modified = True
+        if len(batch) >= INSERT_BATCH_SIZE:
+            insert_documents(index, batch)
+            batch = []
+    for loader_type, doc_ids in loaded_ids.items():
+        previous = manifest.doc_ids(f"{LOADER_PREFIX}{loader_type}")
+        if is_incremental(loader_type, configs[loader_type]):
+            # The loader only returned the changed documents, keep the others
+            doc_ids = list(dict.fromkeys(previous + doc_ids))
+        else:
+            removed_ids = set(previous) - set(doc_ids)
+            for doc_id in removed_ids:
+                index.delete_ref_doc(doc_id, delete_from_docstore=True)
+            modified = modified or bool(removed_ids)
+        manifest.set_loader(loader_type, doc_ids)
+    if batch:
+        insert_documents(index, batch)
+    for path in changes.to_load:
+        manifest.update(path, file_doc_ids[path])
+
+    if updating and not modified:
+        manifest.save()
+        commit_watermarks()
+        logger.info("Index is up to date")
+        return
+    # store it for later, the manifest last so an interrupted run is redone
     index.storage_context.persist(storage_dir)
-    logger.info(f"Finished creating new index. Stored in {storage_dir}")
+    # The persisted storage includes the replayed uploads
+    StorageLog(storage_dir).clear()
+    manifest.save()
+    # The loaded rows are stored, the next run only loads the rows changed since
+    commit_watermarks()
+    logger.info(f"Finished indexing. Stored in {storage_dir}")
 
 
 if __name__ == "__main__":
@@ -1,16 +1,33 @@
 import logging
 import os
-from datetime import timedelta
-from typing import Optional
+import threading
+from typing import Dict, Optional, Tuple
 
-from cachetools import TTLCache, cached  # type: ignore
+from app.engine.sqlite_store import DB_FILE_NAME, get_storage_stores
+from app.engine.storage_log import LOG_FILE_NAME, StorageLog
+from app.engine.vectordb import MemmapVectorStore
 from llama_index.core.callbacks import CallbackManager
 from llama_index.core.indices import load_index_from_storage
+from llama_index.core.indices.base import BaseIndex
 from llama_index.core.storage import StorageContext
 from pydantic import BaseModel, Field
 
 logger = logging.getLogger("uvicorn")
 
+# (file name, modification time, size) of the files in a storage directory
+Manifest = Tuple[Tuple[str, int, int], ...]
+
+# The loaded storage context and index, with the offset of the storage log replayed
+# into the index
+Handle = Tuple[Manifest, StorageContext, BaseIndex, int]
+
+# Loaded handles by storage directory, shared by all requests
+_handles: Dict[str, Handle] = {}
+_reloading: Dict[str, threading.Thread] = {}
+_lock = threading.Lock()
+# Serializes the replays of the storage log appended since the index was loaded
+_replay_lock = threading.Lock()
+
 
 class IndexConfig(BaseModel):
     callback_manager: Optional[CallbackManager] = Field(
@@ -25,19 +42,106 @@ def get_index(config: IndexConfig = None):
     # check if storage already exists
     if not os.path.exists(storage_dir):
         return None
-    # load the existing index
-    logger.info(f"Loading index from {storage_dir}...")
-    storage_context = get_storage_context(storage_dir)
-    index = load_index_from_storage(
-        storage_context, callback_manager=config.callback_manager
-    )
-    logger.info(f"Finished loading index from {storage_dir}")
+    storage_context, index = _get_cached(storage_dir)
+    if config.callback_manager is not None:
+        # Create a new index object for the callback manager, reusing the loaded storage
+        return load_index_from_storage(
+            storage_context, callback_manager=config.callback_manager
+        )
     return index
 
 
-@cached(
-    TTLCache(maxsize=10, ttl=timedelta(minutes=5).total_seconds()),
-    key=lambda *args, **kwargs: "global_storage_context",
-)
 def get_storage_context(persist_dir: str) -> StorageContext:
-    return StorageContext.from_defaults(persist_dir=persist_dir)
+    return _get_cached(persist_dir)[0]
+
+
+def _get_manifest(persist_dir: str) -> Manifest:
+    return tuple(
+        sorted(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in os.scandir(persist_dir)
+            # The uploads are appended to the log, which is replayed without reloading,
+            # and committed to the SQLite docstore, which is read from the database
+            if entry.is_file()
+            and entry.name != LOG_FILE_NAME
+            and not entry.name.startswith(DB_FILE_NAME)
+        )
+    )
+
+
+def _load(persist_dir: str, manifest: Manifest) -> Handle:
+    logger.info(f"Loading index from {persist_dir}...")
+    # Indexes generated before the binary vector store use the JSON vector store
+    vector_store = (
+        MemmapVectorStore.from_persist_dir(persist_dir)
+        if MemmapVectorStore.exists(persist_dir)
+        else None
+    )
+    storage_context = StorageContext.from_defaults(
+        persist_dir=persist_dir,
+        vector_store=vector_store,
+        **get_storage_stores(persist_dir),
+    )
+    index = load_index_from_storage(storage_context)
+    # Apply the changes appended since the storage was last persisted
+    log_offset = StorageLog(persist_dir).replay(index)
+    logger.info(f"Finished loading index from {persist_dir}")
+    return manifest, storage_context, index, log_offset
+
+
+def _reload(persist_dir: str, manifest: Manifest):
+    try:
+        handle = _load(persist_dir, manifest)
+        with _lock:
+            _handles[persist_dir] = handle
+    except Exception as e:
+        # E.g. the storage is being written, retry on the next request
+        logger.warning(f"Failed to reload index from {persist_dir}: {e}")
+    finally:
+        with _lock:
+            _reloading.pop(persist_dir, None)
+
+
+def _get_cached(persist_dir: str) -> Tuple[StorageContext, BaseIndex]:
+    """
+    Get the storage context and index of the storage directory, loaded once per process.
+    When the files of the directory change, the index is reloaded in the background
+    and the previously loaded index is used until the reload has finished.
+    The changes appended to the storage log, e.g. by the uploads of another process,
+    are replayed into the loaded index.
+    """
+    key = os.path.abspath(persist_dir)
+    manifest = _get_manifest(key)
+    with _lock:
+        handle = _handles.get(key)
+    if handle is None:
+        handle = _load(key, manifest)
+        with _lock:
+            _handles[key] = handle
+    elif handle[0] != manifest:
+        with _lock:
+            if key not in _reloading:
+                _reloading[key] = threading.Thread(
+                    target=_reload, args=(key, manifest), daemon=True
+                )
+                _reloading[key].start()
+    else:
+        handle = _replay_log(key, handle)
+    return handle[1], handle[2]
+
+
+def _replay_log(persist_dir: str, handle: Handle) -> Handle:
+    log = StorageLog(persist_dir)
+    if log.size == handle[3]:
+        return handle
+    with _replay_lock:
+        with _lock:
+            handle = _handles.get(persist_dir, handle)
+        manifest, storage_context, index, offset = handle
+        # A shorter log was cleared and written again
+        offset = log.replay(index, offset if log.size >= offset else 0)
+        handle = (manifest, storage_context, index, offset)
+        with _lock:
+            if _handles.get(persist_dir, handle)[1] is storage_context:
+                _handles[persist_dir] = handle
+    return handle
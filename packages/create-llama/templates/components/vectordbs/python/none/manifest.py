@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger("uvicorn")
+
+MANIFEST_FILE = "files_manifest.json"
+MANIFEST_VERSION = 1
+# Prefix of the entries of the documents of the other loaders (web, db)
+LOADER_PREFIX = "loader:"
+
+
+@dataclass
+class ManifestEntry:
+    size: int
+    mtime_ns: int
+    hash: str
+    doc_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ManifestChanges:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+    @property
+    def to_load(self) -> List[str]:
+        return self.added + self.changed
+
+    @property
+    def to_remove(self) -> List[str]:
+        return self.changed + self.deleted
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.deleted)
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.deleted)} deleted"
+        )
+
+
+class FileManifest:
+    """
+    The indexed files of a storage directory: the size, modification time and content
+    hash of each file and the ids of the documents it was parsed into.
+
+    Comparing the manifest with the files of the data directory tells which files have
+    to be parsed and embedded again and which documents have to be removed from the index.
+    The ids of the documents of the other loaders are tracked per loader, to remove the
+    documents they no longer return.
+    """
+
+    def __init__(
+        self, persist_dir: str, entries: Optional[Dict[str, ManifestEntry]] = None
+    ):
+        self.persist_dir = persist_dir
+        self.entries = entries or {}
+        # States of the files computed by `diff`, recorded by `update`
+        self._states: Dict[str, ManifestEntry] = {}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.persist_dir, MANIFEST_FILE)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> Optional["FileManifest"]:
+        """
+        Load the manifest of the storage directory, None if there is no (valid) manifest.
+        """
+        try:
+            with open(os.path.join(persist_dir, MANIFEST_FILE)) as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                return None
+            entries = {
+                key: ManifestEntry(**entry) for key, entry in data["files"].items()
+            }
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring invalid manifest in {persist_dir}: {e}")
+            return None
+        return cls(persist_dir, entries)
+
+    def save(self) -> None:
+        os.makedirs(self.persist_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "files": {
+                        key: asdict(entry)
+                        for key, entry in sorted(self.entries.items())
+                    },
+                },
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
+
+    def diff(self, files: List[str]) -> ManifestChanges:
+        """
+        Compare the manifest with the current files.
+
+        A file whose size and modification time are unchanged is not read. Otherwise its
+        content hash is compared, so touching a file doesn't re-index it.
+        """
+        changes = ManifestChanges()
+        for path in files:
+            entry = self.entries.get(path)
+            stat = os.stat(path)
+            if (
+                entry is not None
+                and entry.size == stat.st_size
+                and entry.mtime_ns == stat.st_mtime_ns
+            ):
+                continue
+            state = ManifestEntry(stat.st_size, stat.st_mtime_ns, hash_file(path))
+            if entry is None:
+                self._states[path] = state
+                changes.added.append(path)
+            elif entry.hash != state.hash:
+                self._states[path] = state
+                changes.changed.append(path)
+            else:
+                entry.size, entry.mtime_ns = state.size, state.mtime_ns
+        current = set(files)
+        changes.deleted = [
+            path
+            for path in self.entries
+            if path not in current and not path.startswith(LOADER_PREFIX)
+        ]
+        return changes
+
+    def set_loader(self, loader_type: str, doc_ids: List[str]) -> None:
+        """
+        Record the ids of the indexed documents of the loader.
+        """
+        self.entries[LOADER_PREFIX + loader_type] = ManifestEntry(
+            len(doc_ids), 0, "", list(doc_ids)
+        )
+
+    def stale_loaders(self, loader_types: Iterable[str]) -> List[str]:
+        """
+        The entries of the loaders that are no longer configured.
+        """
+        current = {LOADER_PREFIX + loader_type for loader_type in loader_types}
+        return [
+            key
+            for key in self.entries
+            if key.startswith(LOADER_PREFIX) and key not in current
+        ]
+
+    def doc_ids(self, path: str) -> List[str]:
+        entry = self.entries.get(path)
+        return list(entry.doc_ids) if entry is not None else []
+
+    def update(self, path: str, doc_ids: List[str]) -> None:
+        """
+        Record the documents parsed from the file, in its state seen by `diff`.
+        """
+        state = self._states.pop(path, None)
+        if state is None:
+            stat = os.stat(path)
+            state = ManifestEntry(stat.st_size, stat.st_mtime_ns, hash_file(path))
+        state.doc_ids = list(doc_ids)
+        self.entries[path] = state
+
+    def remove(self, path: str) -> None:
+        self.entries.pop(path, None)
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
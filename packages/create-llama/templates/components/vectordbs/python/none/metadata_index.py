@@ -0,0 +1,141 @@
+from typing import Any, Callable, Dict, Iterable, List, Union
+
+import numpy as np
+from llama_index.core.vector_stores.simple import _build_metadata_filter_fn
+from llama_index.core.vector_stores.types import (
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+)
+
+
+class MetadataIndex:
+    """
+    Posting lists of the rows by value of the metadata columns of the vector store.
+
+    A query filter is turned into a boolean mask of the rows: `==`, `!=`, `in`, `nin` and
+    `is_empty` filters (e.g. the `private` and `doc_id` filters of private documents) only
+    look up the rows of the filtered values, and the filters are combined with vectorized
+    `and`/`or`. The posting lists of a column are built on its first use and then kept up
+    to date as rows are added. The other operators are evaluated row by row with the same
+    semantics as the `SimpleVectorStore` filters.
+    """
+
+    def __init__(self, columns: Dict[str, List[Any]], size: Callable[[], int]):
+        """
+        Args:
+            columns: The metadata columns by key, with one value (or None) per row.
+            size: The current number of rows.
+        """
+        self._columns = columns
+        self._size = size
+        self._postings: Dict[str, Dict[Any, List[int]]] = {}
+        self._arrays: Dict[Any, np.ndarray] = {}
+
+    def postings(self, key: str) -> Dict[Any, List[int]]:
+        postings = self._postings.get(key)
+        if postings is None:
+            postings = {}
+            for row, value in enumerate(self._columns.get(key, [])):
+                if value is not None:
+                    postings.setdefault(value, []).append(row)
+            self._postings[key] = postings
+        return postings
+
+    def add(self, row: int, metadata: Dict[str, Any]) -> None:
+        """
+        Index the values of a row appended to the columns.
+        """
+        for key, postings in self._postings.items():
+            value = metadata.get(key)
+            if value is not None:
+                postings.setdefault(value, []).append(row)
+                self._arrays.pop((key, value), None)
+                self._arrays.pop((key, None), None)
+
+    def clear(self) -> None:
+        self._postings = {}
+        self._arrays = {}
+
+    def rows(self, key: str, value: Any) -> np.ndarray:
+        """
+        The rows whose value of `key` is `value`, or that have a value if it's None.
+        """
+        cache_key = (key, value)
+        rows = self._arrays.get(cache_key)
+        if rows is None:
+            postings = self.postings(key)
+            if value is None:
+                parts = [np.asarray(r, dtype=np.int64) for r in postings.values()]
+                rows = np.concatenate(parts) if parts else np.empty(0, np.int64)
+            else:
+                rows = np.asarray(postings.get(value, []), dtype=np.int64)
+            self._arrays[cache_key] = rows
+        return rows
+
+    def rows_mask(self, key: str, values: Iterable[Any]) -> np.ndarray:
+        mask = np.zeros(self._size(), dtype=bool)
+        for value in values:
+            try:
+                mask[self.rows(key, value)] = True
+            except TypeError:
+                # An unhashable value (e.g. a list) isn't equal to any scalar value
+                pass
+        return mask
+
+    def mask(
+        self,
+        filters: MetadataFilters,
+        row_metadata: Callable[[int], Dict[str, Any]],
+    ) -> np.ndarray:
+        """
+        The mask of the rows matching the filters.
+        """
+        masks = [
+            self._filter_mask(f, row_metadata)
+            if isinstance(f, MetadataFilter)
+            else self.mask(f, row_metadata)
+            for f in filters.filters
+        ]
+        if not masks:
+            return np.ones(self._size(), dtype=bool)
+        if filters.condition == FilterCondition.OR:
+            return np.logical_or.reduce(masks)
+        if filters.condition == FilterCondition.AND:
+            return np.logical_and.reduce(masks)
+        raise ValueError(f"Invalid filter condition: {filters.condition}")
+
+    def _filter_mask(
+        self,
+        metadata_filter: MetadataFilter,
+        row_metadata: Callable[[int], Dict[str, Any]],
+    ) -> np.ndarray:
+        key, operator, value = (
+            metadata_filter.key,
+            metadata_filter.operator,
+            metadata_filter.value,
+        )
+        if operator == FilterOperator.EQ:
+            return self.rows_mask(key, [value])
+        if operator == FilterOperator.IN:
+            return self.rows_mask(key, _as_list(value))
+        if operator in (FilterOperator.NE, FilterOperator.NIN):
+            # Like SimpleVectorStore, rows without a value don't match
+            values = [value] if operator == FilterOperator.NE else _as_list(value)
+            return self.rows_mask(key, [None]) & ~self.rows_mask(key, values)
+        if operator == FilterOperator.IS_EMPTY:
+            return ~self.rows_mask(key, [None]) | self.rows_mask(key, [""])
+        # Evaluate the other operators on the rows with a value
+        filter_fn = _build_metadata_filter_fn(
+            lambda row: row_metadata(int(row)),
+            MetadataFilters(filters=[metadata_filter]),
+        )
+        mask = np.zeros(self._size(), dtype=bool)
+        for row in self.rows(key, None):
+            mask[row] = filter_fn(str(row))
+        return mask
+
+
+def _as_list(value: Union[Any, List[Any]]) -> List[Any]:
+    return value if isinstance(value, list) else [value]
@@ -0,0 +1,143 @@
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn")
+
+# Rows to encode or score at once, bounds the memory used for the conversion to float32
+CHUNK_SIZE = 65536
+# Number of set bits of each byte value, to count the differing bits of binary codes
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+class QuantizedVectors:
+    """
+    Compressed copy of the (normalized) vectors for a fast first search pass.
+
+    - `int8`: each dimension is scaled to [-127, 127] by the largest absolute value of
+      the dimension, 4x smaller than float32.
+    - `binary`: only the sign of each dimension is kept, 32x smaller than float32;
+      the similarity is derived from the number of differing bits.
+    - `none`: the vectors are only truncated.
+
+    With `dim`, only the first `dim` dimensions are kept (re-normalized). This works for
+    models trained with Matryoshka representation learning, e.g. OpenAI `text-embedding-3-*`.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        codes: np.ndarray,
+        dim: int,
+        scale: Optional[np.ndarray] = None,
+    ):
+        if method not in ("int8", "binary", "none"):
+            raise ValueError(
+                f"Unsupported quantization {method}, use int8, binary or none"
+            )
+        self.method = method
+        self.codes = codes
+        self.dim = dim
+        self.scale = scale
+
+    @property
+    def size(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes)
+
+    @classmethod
+    def build(
+        cls, vectors: np.ndarray, method: str, dim: Optional[int] = None
+    ) -> "QuantizedVectors":
+        """
+        Encode the vectors, shape (count, full dim).
+        """
+        dim = min(dim or vectors.shape[1], vectors.shape[1])
+
+        def blocks():  # type: ignore
+            for start in range(0, len(vectors), CHUNK_SIZE):
+                yield _normalize(
+                    np.asarray(vectors[start : start + CHUNK_SIZE, :dim], np.float32)
+                )
+
+        scale = None
+        if method == "int8":
+            scale = np.zeros(dim, dtype=np.float32)
+            for block in blocks():
+                scale = np.maximum(scale, np.abs(block).max(axis=0))
+            scale = np.where(scale == 0, 1, scale).astype(np.float32)
+        codes = [cls._encode(block, method, scale, vectors.dtype) for block in blocks()]
+        result = cls(method, np.concatenate(codes), dim, scale)
+        logger.info(
+            f"Encoded {result.size} vectors with {method} ({dim} dims): "
+            f"{result.nbytes / 2**20:.1f} MiB"
+        )
+        return result
+
+    @staticmethod
+    def _encode(
+        block: np.ndarray, method: str, scale: Optional[np.ndarray], dtype: np.dtype
+    ) -> np.ndarray:
+        if method == "int8":
+            return np.round(block / scale * 127).astype(np.int8)
+        if method == "binary":
+            return np.packbits(block > 0, axis=1)
+        return block.astype(dtype)
+
+    def score(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate similarity of the full (normalized) query with the (selected) rows.
+        """
+        query = _normalize(np.asarray(query[: self.dim], np.float32))
+        if self.method == "int8":
+            assert self.scale is not None
+            query = query * self.scale / 127
+        elif self.method == "binary":
+            query_bits = np.packbits(query > 0)
+        count = self.size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, CHUNK_SIZE):
+            end = min(start + CHUNK_SIZE, count)
+            block = (
+                self.codes[start:end] if rows is None else self.codes[rows[start:end]]
+            )
+            if self.method == "binary":
+                differences = np.bitwise_xor(block, query_bits)
+                if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+                    distances = np.bitwise_count(differences).sum(
+                        axis=1, dtype=np.int32
+                    )
+                else:
+                    distances = POPCOUNT[differences].sum(axis=1, dtype=np.int32)
+                scores[start:end] = 1 - 2 * distances / self.dim
+            else:
+                scores[start:end] = np.asarray(block, np.float32) @ query
+        return scores
+
+    def save(self, base: str) -> None:
+        tmp_path = f"{base}.codes.tmp.npy"
+        np.save(tmp_path, self.codes)
+        os.replace(tmp_path, f"{base}.codes.npy")
+        if self.scale is not None:
+            np.save(f"{base}.scale.npy", self.scale)
+
+    @classmethod
+    def load(cls, base: str, method: str, dim: int) -> "QuantizedVectors":
+        scale = np.load(f"{base}.scale.npy") if method == "int8" else None
+        return cls(method, np.load(f"{base}.codes.npy", mmap_mode="r"), dim, scale)
+
+    @staticmethod
+    def remove(base: str) -> None:
+        for path in (f"{base}.codes.npy", f"{base}.scale.npy"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.index_store.keyval_index_store import KVIndexStore
+from llama_index.core.storage.kvstore.types import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_COLLECTION,
+    BaseKVStore,
+)
+
+# Name of the database in the storage directory, shared by the docstore and index store
+DB_FILE_NAME = "docstore.sqlite"
+
+
+class SQLiteKVStore(BaseKVStore):
+    """
+    Key-value store in a SQLite database, one row per key: a value is read or written
+    without loading the others. Writes are committed right away, or at the end of the
+    outermost `transaction()`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (collection, key)) WITHOUT ROWID"
+        )
+        # Documents by hash, for the upserts of the ingestion pipeline
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS kv_doc_hash "
+            "ON kv (collection, json_extract(value, '$.doc_hash'))"
+        )
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute("BEGIN")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._connection.execute("COMMIT")
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(
+        self, key: str, val: dict, collection: str = DEFAULT_COLLECTION
+    ) -> None:
+        self.put(key, val, collection=collection)
+
+    def put_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        with self.transaction():
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO kv (collection, key, value) VALUES (?, ?, ?)",
+                [(collection, key, json.dumps(val)) for key, val in kv_pairs],
+            )
+
+    async def aput_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        self.put_all(kv_pairs, collection=collection, batch_size=batch_size)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        rows = self.execute(
+            "SELECT value FROM kv WHERE collection = ? AND key = ?", (collection, key)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    async def aget(
+        self, key: str, collection: str = DEFAULT_COLLECTION
+    ) -> Optional[dict]:
+        return self.get(key, collection=collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        rows = self.execute(
+            "SELECT key, value FROM kv WHERE collection = ?", (collection,)
+        )
+        return {key: json.loads(value) for key, value in rows}
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection=collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self.transaction():
+            cursor = self._connection.execute(
+                "DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            )
+        return cursor.rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection=collection)
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class SQLiteDocumentStore(KVDocumentStore):
+    """
+    Document store in a SQLite database.
+
+    Unlike `SimpleDocumentStore`, it isn't loaded in memory: the nodes, hashes and
+    reference documents are read by id when they are needed, and the changes of a call
+    (e.g. adding nodes with their hashes and reference documents) are written in one
+    transaction, so there's nothing to persist.
+    """
+
+    _kvstore: SQLiteKVStore
+
+    def __init__(self, kvstore: SQLiteKVStore, namespace: Optional[str] = None):
+        super().__init__(kvstore, namespace=namespace)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "SQLiteDocumentStore":
+        return cls(SQLiteKVStore(os.path.join(persist_dir, DB_FILE_NAME)))
+
+    def add_documents(
+        self,
+        docs: Sequence[BaseNode],
+        allow_update: bool = True,
+        batch_size: Optional[int] = None,
+        store_text: bool = True,
+    ) -> None:
+        with self._kvstore.transaction():
+            super().add_documents(docs, allow_update, batch_size, store_text)
+
+    def delete_document(self, doc_id: str, raise_error: bool = True) -> None:
+        with self._kvstore.transaction():
+            super().delete_document(doc_id, raise_error)
+
+    def delete_ref_doc(self, ref_doc_id: str, raise_error: bool = True) -> None:
+        with self._kvstore.transaction():
+            super().delete_ref_doc(ref_doc_id, raise_error)
+
+    def get_all_document_hashes(self) -> Dict[str, str]:
+        rows = self._kvstore.execute(
+            "SELECT json_extract(value, '$.doc_hash'), key FROM kv "
+            "WHERE collection = ? AND json_extract(value, '$.doc_hash') IS NOT NULL",
+            (self._metadata_collection,),
+        )
+        return dict(rows)
+
+    async def aget_all_document_hashes(self) -> Dict[str, str]:
+        return self.get_all_document_hashes()
+
+    def persist(self, persist_path: str = "", fs: Optional[Any] = None) -> None:
+        # The changes are already committed to the database
+        pass
+
+
+class SQLiteIndexStore(KVIndexStore):
+    """
+    Index store in the SQLite database of the `SQLiteDocumentStore`.
+    """
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "SQLiteIndexStore":
+        return cls(SQLiteKVStore(os.path.join(persist_dir, DB_FILE_NAME)))
+
+    def persist(self, persist_path: str = "", fs: Optional[Any] = None) -> None:
+        pass
+
+
+def use_sqlite_docstore() -> bool:
+    """
+    Whether to keep the docstore and index store in SQLite (DOCSTORE_TYPE=sqlite)
+    instead of JSON files loaded in memory.
+    """
+    return os.getenv("DOCSTORE_TYPE", "simple").lower() == "sqlite"
+
+
+def get_storage_stores(persist_dir: str) -> Dict[str, Any]:
+    """
+    The docstore and index store arguments of `StorageContext.from_defaults` for the
+    storage directory, empty for the default JSON stores.
+    """
+    if not use_sqlite_docstore():
+        return {}
+    kvstore = SQLiteKVStore(os.path.join(persist_dir, DB_FILE_NAME))
+    return {
+        "docstore": SQLiteDocumentStore(kvstore),
+        "index_store": SQLiteIndexStore(kvstore),
+    }
+
+
+def storage_stores_exist(persist_dir: str) -> bool:
+    """
+    Whether the storage directory has the configured docstore, e.g. not when an index
+    generated with the JSON docstore is used with DOCSTORE_TYPE=sqlite.
+    """
+    if use_sqlite_docstore():
+        return os.path.exists(os.path.join(persist_dir, DB_FILE_NAME))
+    return os.path.exists(os.path.join(persist_dir, "docstore.json"))
+
+
+def remove_storage_stores(persist_dir: str) -> None:
+    """
+    Remove the SQLite database of the storage directory, e.g. to re-create the index.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        path = os.path.join(persist_dir, DB_FILE_NAME + suffix)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+from typing import List, Sequence, Set
+
+from app.engine.vectordb import MemmapVectorStore
+
+from llama_index.core.indices.base import BaseIndex
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+
+logger = logging.getLogger("uvicorn")
+
+# Name of the log in the storage directory
+LOG_FILE_NAME = "storage_log.jsonl"
+# Size of the log above which the storage should be compacted (fully persisted)
+DEFAULT_COMPACT_SIZE = 64 * 2**20
+
+
+class StorageLog:
+    """
+    Append-only log of the nodes added to and the documents deleted from a persisted index.
+
+    Persisting an index rewrites the whole docstore, index store and vector store, so
+    adding a few nodes costs as much as the size of the index. Instead, the changes are
+    appended to the log (with the embeddings of the nodes) and replayed on top of the
+    persisted storage when it's loaded. Once the log exceeds `compact_size` bytes, the
+    index should be fully persisted again and the log cleared, see `compact`.
+
+    Each change is a line written with a single `fsync`, a line cut by a crash is ignored,
+    so a crash loses at most the change being written. Replaying is idempotent: nodes
+    that are already in the vector store are skipped.
+    """
+
+    def __init__(self, persist_dir: str, compact_size: int = DEFAULT_COMPACT_SIZE):
+        self.persist_dir = persist_dir
+        self.path = os.path.join(persist_dir, LOG_FILE_NAME)
+        self.compact_size = compact_size
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def should_compact(self) -> bool:
+        return self.size > self.compact_size
+
+    def append_nodes(self, nodes: Sequence[BaseNode]) -> None:
+        if nodes:
+            self._append({"op": "add", "nodes": [doc_to_json(node) for node in nodes]})
+
+    def append_delete(self, ref_doc_id: str) -> None:
+        self._append({"op": "delete", "ref_doc_id": ref_doc_id})
+
+    def _append(self, record: dict) -> None:
+        os.makedirs(self.persist_dir, exist_ok=True)
+        with open(self.path, "ab+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Drop the line cut by a crash, it would corrupt the appended one
+                    f.seek(0)
+                    f.truncate(f.read().rfind(b"\n") + 1)
+                    f.seek(0, os.SEEK_END)
+            f.write((json.dumps(record) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self, index: BaseIndex, offset: int = 0) -> int:
+        """
+        Apply the logged changes from `offset` to the index loaded from the persisted
+        storage. Returns the offset of the end of the applied changes, to apply the
+        changes appended later.
+        """
+        if self.size <= offset:
+            return offset
+        applied = 0
+        # The docstore may be persisted on each change, the vectors are only persisted
+        # by a compaction
+        stored = _vector_node_ids(index)
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Being appended, or cut by a crash
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring the incomplete end of {self.path}")
+                    break
+                if record["op"] == "add":
+                    # Skip the nodes of a log replayed after an interrupted compaction
+                    nodes: List[BaseNode] = [
+                        node
+                        for node in map(json_to_doc, record["nodes"])
+                        if node.node_id not in stored
+                    ]
+                    index.insert_nodes(nodes)
+                    stored.update(node.node_id for node in nodes)
+                else:
+                    index.delete_ref_doc(
+                        record["ref_doc_id"], delete_from_docstore=True
+                    )
+                applied += 1
+                offset += len(line)
+        if applied:
+            logger.info(f"Replayed {applied} changes from {self.path}")
+        return offset
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def compact(self, index: BaseIndex) -> None:
+        """
+        Persist the whole index, which includes the logged changes, and clear the log.
+        """
+        index.storage_context.persist(persist_dir=self.persist_dir)
+        self.clear()
+        logger.info(f"Compacted the storage in {self.persist_dir}")
+
+
+def _vector_node_ids(index: BaseIndex) -> Set[str]:
+    vector_store = index.vector_store  # type: ignore
+    if isinstance(vector_store, MemmapVectorStore):
+        return vector_store.node_ids()
+    # The JSON vector store of indexes generated before the binary vector store
+    return set(vector_store.data.embedding_dict)
+
+
+def get_storage_log(persist_dir: str) -> StorageLog:
+    """
+    The log of the storage directory, STORAGE_LOG_COMPACT_MB sets its size limit.
+    """
+    compact_mb = os.getenv("STORAGE_LOG_COMPACT_MB")
+    return StorageLog(
+        persist_dir,
+        compact_size=int(compact_mb) * 2**20 if compact_mb else DEFAULT_COMPACT_SIZE,
+    )
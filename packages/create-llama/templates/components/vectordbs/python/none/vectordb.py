@@ -0,0 +1,526 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+from app.engine.ann import IVFIndex
+from app.engine.metadata_index import MetadataIndex
+from app.engine.quantization import QuantizedVectors
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from pydantic import Field, PrivateAttr
+
+logger = logging.getLogger("uvicorn")
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+# Name of the vector store files in the storage directory, without extension
+DEFAULT_PERSIST_NAME = "default__vector_store"
+# Number of rows to score at once, bounds the memory used for float16 vectors
+SCORE_CHUNK_SIZE = 65536
+# Below this number of vectors, brute force search is fast enough and no ANN index is built
+ANN_MIN_VECTORS = 10000
+# Files of the ANN index and the quantized codes, next to the vectors
+SIDECAR_SUFFIXES = ("ivf.npz", "codes.npy", "scale.npy")
+
+
+class MemmapVectorStore(BasePydanticVectorStore):
+    """
+    Local vector store that keeps the embeddings in a binary `.npy` file.
+
+    The persisted file is opened with `np.memmap`, so loading is instant and the operating
+    system shares the pages between worker processes. The node ids, ref doc ids and scalar
+    metadata (for filtering) are kept column-wise in a small JSON sidecar, filters are
+    evaluated with posting lists of the rows by value (see `MetadataIndex`).
+    Embeddings are stored normalized, so the cosine similarity is a dot product.
+    The texts of the nodes are kept in the docstore.
+
+    With `ann="ivf"`, an inverted file index is built when the store is persisted and queries
+    only score the vectors of the `nprobe` closest clusters.
+
+    With `quantization` ("int8" or "binary") and/or `truncate_dim`, a compressed copy of the
+    vectors is searched first, then the best `top_k * rescore_factor` candidates are rescored
+    with the full precision vectors.
+    """
+
+    stores_text: bool = False
+    dtype: str = Field(
+        default="float32", description="Data type of the stored embeddings."
+    )
+    ann: Optional[str] = Field(
+        default=None, description="Approximate nearest neighbor index, 'ivf' or None."
+    )
+    n_lists: Optional[int] = Field(
+        default=None,
+        description="Number of IVF lists, default is 4 * sqrt(number of vectors).",
+    )
+    nprobe: int = Field(
+        default_factory=lambda: int(os.getenv("VECTOR_STORE_NPROBE", "8")),
+        description="Number of IVF lists to search, higher is more accurate but slower.",
+    )
+    quantization: Optional[str] = Field(
+        default=None,
+        description="Quantization of the vectors for the first search pass, 'int8' or 'binary'.",
+    )
+    truncate_dim: Optional[int] = Field(
+        default=None,
+        description="Number of dimensions for the first search pass (Matryoshka embeddings).",
+    )
+    rescore_factor: Optional[int] = Field(
+        default=None,
+        description="Number of candidates per result to rescore, default is 10 for binary and 4 otherwise.",
+    )
+
+    _vectors: Optional[np.ndarray] = PrivateAttr(default=None)
+    _pending: List[np.ndarray] = PrivateAttr(default_factory=list)
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr(default_factory=list)
+    _metadata: Dict[str, List[Any]] = PrivateAttr(default_factory=dict)
+    _alive: List[bool] = PrivateAttr(default_factory=list)
+    _alive_mask: Optional[np.ndarray] = PrivateAttr(default=None)
+    _metadata_index: MetadataIndex = PrivateAttr()
+    _id_index: MetadataIndex = PrivateAttr()
+    _ivf: Optional[IVFIndex] = PrivateAttr(default=None)
+    _quantized: Optional[QuantizedVectors] = PrivateAttr(default=None)
+
+    def __init__(self, dtype: str = "float32", **kwargs: Any):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported dtype {dtype}, use float32 or float16")
+        if kwargs.get("ann") not in (None, "ivf"):
+            raise ValueError(f"Unsupported ANN index {kwargs['ann']}, use ivf or None")
+        if kwargs.get("quantization") not in (None, "int8", "binary"):
+            raise ValueError(
+                f"Unsupported quantization {kwargs['quantization']}, use int8, binary or None"
+            )
+        super().__init__(dtype=dtype, **kwargs)
+        self._reset_indexes()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MemmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, f"{DEFAULT_PERSIST_NAME}.npy"))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "MemmapVectorStore":
+        return cls.from_persist_path(
+            os.path.join(persist_dir, f"{DEFAULT_PERSIST_NAME}.json")
+        )
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str, **kwargs: Any) -> "MemmapVectorStore":
+        base = _base_path(persist_path)
+        with open(f"{base}.meta.json") as f:
+            data = json.load(f)
+        store = cls(
+            dtype=data["dtype"],
+            ann=data.get("ann"),
+            n_lists=data.get("n_lists"),
+            quantization=data.get("quantization"),
+            truncate_dim=data.get("truncate_dim"),
+            **kwargs,
+        )
+        count = len(data["ids"])
+        store._vectors = np.load(f"{base}.npy", mmap_mode="r")
+        if len(store._vectors) != count:
+            raise ValueError(
+                f"{base}.npy has {len(store._vectors)} vectors instead of {count}, "
+                "re-generate the index"
+            )
+        # The ANN index and the codes are optional, only use them if they are complete
+        if os.path.exists(f"{base}.ivf.npz"):
+            store._ivf = IVFIndex.load(f"{base}.ivf.npz")
+            if store._ivf.size != count:
+                logger.warning(f"Ignoring {base}.ivf.npz, it doesn't match the vectors")
+                store._ivf = None
+        if data.get("quantized_dim") and os.path.exists(f"{base}.codes.npy"):
+            store._quantized = QuantizedVectors.load(
+                base, store.quantization or "none", data["quantized_dim"]
+            )
+            if store._quantized.size != count:
+                logger.warning(
+                    f"Ignoring {base}.codes.npy, it doesn't match the vectors"
+                )
+                store._quantized = None
+        store._ids = data["ids"]
+        store._ref_doc_ids = data["ref_doc_ids"]
+        store._metadata = data["metadata"]
+        store._alive = [True] * len(store._ids)
+        store._reset_indexes()
+        return store
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        embeddings = np.asarray([node.get_embedding() for node in nodes], np.float32)
+        self._pending.append(_normalize(embeddings).astype(self.dtype))
+        start = len(self._ids)
+        for i, node in enumerate(nodes):
+            self._ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id)
+            self._alive.append(True)
+            scalars = {}
+            for key, value in node.metadata.items():
+                # Only scalar values are kept for filtering, the full metadata is in the docstore
+                if isinstance(value, (str, int, float, bool)) or value is None:
+                    column = self._metadata.setdefault(key, [])
+                    column.extend([None] * (start + i - len(column)))
+                    column.append(value)
+                    scalars[key] = value
+            self._metadata_index.add(start + i, scalars)
+            self._id_index.add(
+                start + i, {"node_id": node.node_id, "ref_doc_id": node.ref_doc_id}
+            )
+        self._alive_mask = None
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        for row in self._id_index.rows("ref_doc_id", ref_doc_id):
+            self._alive[row] = False
+        self._alive_mask = None
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[Any] = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        for node_id in node_ids or []:
+            for row in self._id_index.rows("node_id", node_id):
+                self._alive[row] = False
+        self._alive_mask = None
+
+    def node_ids(self) -> Set[str]:
+        return {node_id for node_id, alive in zip(self._ids, self._alive) if alive}
+
+    def clear(self) -> None:
+        self._ivf = None
+        self._quantized = None
+        self._vectors = None
+        self._pending = []
+        self._ids = []
+        self._ref_doc_ids = []
+        self._metadata = {}
+        self._alive = []
+        self._reset_indexes()
+
+    def _reset_indexes(self) -> None:
+        self._alive_mask = None
+        self._metadata_index = MetadataIndex(self._metadata, lambda: len(self._ids))
+        self._id_index = MetadataIndex(
+            {"node_id": self._ids, "ref_doc_id": self._ref_doc_ids},
+            lambda: len(self._ids),
+        )
+
+    def _get_alive_mask(self) -> np.ndarray:
+        if self._alive_mask is None:
+            self._alive_mask = np.asarray(self._alive, dtype=bool)
+        return self._alive_mask
+
+    def _get_vectors(self) -> np.ndarray:
+        """
+        All vectors, including the ones added since the store was loaded.
+        """
+        if self._pending:
+            # A store persisted without vectors has no dimension yet
+            parts = (
+                [self._vectors]
+                if self._vectors is not None and len(self._vectors)
+                else []
+            ) + self._pending
+            self._vectors = np.concatenate(parts)
+            self._pending = []
+        if self._vectors is None:
+            return np.empty((0, 0), dtype=self.dtype)
+        return self._vectors
+
+    def _row_metadata(self, row: int) -> Dict[str, Any]:
+        return {
+            key: column[row]
+            for key, column in self._metadata.items()
+            if row < len(column) and column[row] is not None
+        }
+
+    def _candidate_rows(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        """
+        The rows matching the filters of the query, None if all rows match.
+        """
+        alive = self._get_alive_mask()
+        if query.filters is None and query.doc_ids is None and query.node_ids is None:
+            return None if alive.all() else np.flatnonzero(alive)
+        mask = alive.copy()
+        if query.filters is not None:
+            mask &= self._metadata_index.mask(query.filters, self._row_metadata)
+        if query.doc_ids is not None:
+            mask &= self._id_index.rows_mask("ref_doc_id", query.doc_ids)
+        if query.node_ids is not None:
+            mask &= self._id_index.rows_mask("node_id", query.node_ids)
+        return np.flatnonzero(mask)
+
+    def _score(
+        self, vectors: np.ndarray, query: np.ndarray, rows: Optional[np.ndarray]
+    ) -> np.ndarray:
+        """
+        Dot products of the query with the (selected) rows, computed in chunks.
+        """
+        count = len(vectors) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_CHUNK_SIZE):
+            end = min(start + SCORE_CHUNK_SIZE, count)
+            block = vectors[start:end] if rows is None else vectors[rows[start:end]]
+            scores[start:end] = np.asarray(block, dtype=np.float32) @ query
+        return scores
+
+    def _ann_rows(
+        self,
+        query: np.ndarray,
+        rows: Optional[np.ndarray],
+        count: int,
+        nprobe: int,
+    ) -> np.ndarray:
+        """
+        The rows to score for the query with the IVF index, restricted to the filtered rows.
+        """
+        assert self._ivf is not None
+        candidates = self._ivf.search_rows(query, nprobe)
+        if count > self._ivf.size:
+            # Vectors added after the index was built are always scored
+            candidates = np.concatenate([candidates, np.arange(self._ivf.size, count)])
+        if rows is None:
+            return candidates
+        if len(rows) <= len(candidates):
+            # Scoring the filtered rows is exact and not slower
+            return rows
+        return candidates[np.isin(candidates, rows, assume_unique=True)]
+
+    def _first_pass(
+        self,
+        query: np.ndarray,
+        rows: Optional[np.ndarray],
+        count: int,
+        limit: int,
+    ) -> np.ndarray:
+        """
+        The best `limit` rows for the query according to the compressed vectors.
+        """
+        assert self._quantized is not None
+        size = self._quantized.size
+        if rows is None:
+            candidates = np.arange(min(size, count))
+            scores = self._quantized.score(query)[:count]
+            # Vectors added after the compression are always rescored
+            extra = np.arange(size, count)
+        else:
+            candidates = rows[rows < size]
+            scores = self._quantized.score(query, candidates)
+            extra = rows[rows >= size]
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores, limit - 1)[:limit]]
+        return np.concatenate([candidates, extra])
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Query mode {query.mode} is not supported")
+        if query.query_embedding is None:
+            raise ValueError("Query embedding is required")
+        vectors = self._get_vectors()
+        rows = self._candidate_rows(query)
+        if len(vectors) == 0 or (rows is not None and len(rows) == 0):
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        query_vector = _normalize(np.asarray(query.query_embedding, np.float32))
+        if self._ivf is not None:
+            rows = self._ann_rows(
+                query_vector, rows, len(vectors), kwargs.get("nprobe", self.nprobe)
+            )
+            if len(rows) == 0:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        if self._quantized is not None:
+            rescore_factor = self.rescore_factor or (
+                10 if self.quantization == "binary" else 4
+            )
+            rows = self._first_pass(
+                query_vector,
+                rows,
+                len(vectors),
+                query.similarity_top_k * kwargs.get("rescore_factor", rescore_factor),
+            )
+        scores = self._score(vectors, query_vector, rows)
+        top_k = min(query.similarity_top_k, len(scores))
+        # Select the top k without sorting all scores, then sort the selection
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        result_rows = top if rows is None else rows[top]
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=scores[top].tolist(),
+            ids=[self._ids[row] for row in result_rows],
+        )
+
+    def query_batch(
+        self, queries: List[VectorStoreQuery], **kwargs: Any
+    ) -> List[VectorStoreQueryResult]:
+        """
+        Run several queries, e.g. the guideline queries of all clauses of a contract.
+        Without an ANN index or compressed vectors, queries with the same filters are
+        scored with one matrix product per chunk of vectors instead of one pass each.
+        """
+        first = queries[0] if queries else None
+        if (
+            first is None
+            or self._ivf is not None
+            or self._quantized is not None
+            or any(
+                query.mode != VectorStoreQueryMode.DEFAULT
+                or query.query_embedding is None
+                or query.filters != first.filters
+                or query.doc_ids != first.doc_ids
+                or query.node_ids != first.node_ids
+                for query in queries
+            )
+        ):
+            return [self.query(query, **kwargs) for query in queries]
+
+        vectors = self._get_vectors()
+        rows = self._candidate_rows(first)
+        if len(vectors) == 0 or (rows is not None and len(rows) == 0):
+            return [
+                VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+                for _ in queries
+            ]
+        query_matrix = _normalize(
+            np.asarray([query.query_embedding for query in queries], np.float32)
+        )
+        count = len(vectors) if rows is None else len(rows)
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, SCORE_CHUNK_SIZE):
+            end = min(start + SCORE_CHUNK_SIZE, count)
+            block = vectors[start:end] if rows is None else vectors[rows[start:end]]
+            scores[start:end] = np.asarray(block, dtype=np.float32) @ query_matrix.T
+        results = []
+        for i, query in enumerate(queries):
+            column = scores[:, i]
+            top_k = min(query.similarity_top_k, count)
+            top = np.argpartition(-column, top_k - 1)[:top_k]
+            top = top[np.argsort(-column[top])]
+            result_rows = top if rows is None else rows[top]
+            results.append(
+                VectorStoreQueryResult(
+                    nodes=None,
+                    similarities=column[top].tolist(),
+                    ids=[self._ids[row] for row in result_rows],
+                )
+            )
+        return results
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """
+        Write the vectors of the alive rows and the sidecar next to `persist_path`.
+        The files are replaced atomically, so readers keep using the previous version.
+        The ANN index and the codes are removed first and moved in last, an interrupted
+        persist leaves the store without them rather than with outdated ones.
+        """
+        base = _base_path(persist_path)
+        os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+        # Left by an interrupted persist
+        for suffix in SIDECAR_SUFFIXES:
+            if os.path.exists(f"{base}.tmp.{suffix}"):
+                os.remove(f"{base}.tmp.{suffix}")
+        vectors = self._get_vectors()
+        alive = np.asarray(self._alive, dtype=bool)
+        if len(vectors) and not alive.all():
+            vectors = vectors[alive]
+        rows = [row for row, is_alive in enumerate(self._alive) if is_alive]
+        data = {
+            "dtype": self.dtype,
+            "ann": self.ann,
+            "n_lists": self.n_lists,
+            "quantization": self.quantization,
+            "truncate_dim": self.truncate_dim,
+            "quantized_dim": None,
+            "ids": [self._ids[row] for row in rows],
+            "ref_doc_ids": [self._ref_doc_ids[row] for row in rows],
+            "metadata": {
+                key: [column[row] if row < len(column) else None for row in rows]
+                for key, column in self._metadata.items()
+            },
+        }
+        with open(f"{base}.tmp.npy", "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=self.dtype))
+        vectors = np.load(f"{base}.tmp.npy", mmap_mode="r")
+        self._ivf = None
+        if self.ann == "ivf" and len(rows) >= ANN_MIN_VECTORS:
+            self._ivf = IVFIndex.build(vectors, n_lists=self.n_lists)
+            self._ivf.save(f"{base}.tmp.ivf.npz")
+        self._quantized = None
+        if (self.quantization or self.truncate_dim) and len(rows) > 0:
+            self._quantized = QuantizedVectors.build(
+                vectors, self.quantization or "none", self.truncate_dim
+            )
+            self._quantized.save(f"{base}.tmp")
+            data["quantized_dim"] = self._quantized.dim
+        with open(f"{base}.meta.json.tmp", "w") as f:
+            json.dump(data, f)
+        if os.path.exists(f"{base}.ivf.npz"):
+            os.remove(f"{base}.ivf.npz")
+        QuantizedVectors.remove(base)
+        os.replace(f"{base}.tmp.npy", f"{base}.npy")
+        os.replace(f"{base}.meta.json.tmp", f"{base}.meta.json")
+        for suffix in SIDECAR_SUFFIXES:
+            if os.path.exists(f"{base}.tmp.{suffix}"):
+                os.replace(f"{base}.tmp.{suffix}", f"{base}.{suffix}")
+        logger.info(f"Persisted {len(rows)} vectors to {base}.npy")
+        # Continue with the compacted, memory-mapped data
+        self._vectors = np.load(f"{base}.npy", mmap_mode="r")
+        self._ids = data["ids"]
+        self._ref_doc_ids = data["ref_doc_ids"]
+        self._metadata = data["metadata"]
+        self._alive = [True] * len(rows)
+        self._reset_indexes()
+
+
+def _base_path(persist_path: str) -> str:
+    base, ext = os.path.splitext(persist_path)
+    return base if ext == ".json" else persist_path
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def create_vector_store() -> MemmapVectorStore:
+    """
+    Create an empty vector store configured from the environment.
+    Set VECTOR_STORE_DTYPE=float16 to halve the size of the store and
+    VECTOR_STORE_ANN=ivf to build an approximate nearest neighbor index.
+    VECTOR_STORE_QUANTIZATION (int8 or binary) and VECTOR_STORE_TRUNCATE_DIM enable
+    a first search pass over compressed vectors.
+    """
+    truncate_dim = os.getenv("VECTOR_STORE_TRUNCATE_DIM")
+    return MemmapVectorStore(
+        dtype=os.getenv("VECTOR_STORE_DTYPE", "float32"),
+        ann=os.getenv("VECTOR_STORE_ANN") or None,
+        quantization=os.getenv("VECTOR_STORE_QUANTIZATION") or None,
+        truncate_dim=int(truncate_dim) if truncate_dim else None,
+    )
+
+
+def get_vector_store() -> MemmapVectorStore:
+    """
+    Load the vector store from the storage directory or create a new one.
+    """
+    if MemmapVectorStore.exists(STORAGE_DIR):
+        return MemmapVectorStore.from_persist_dir(STORAGE_DIR)
+    return create_vector_store()
@@ -0,0 +1,312 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from pydantic import Field, PrivateAttr
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger("uvicorn")
+
+DEFAULT_CACHE_DIR = ".cache/embeddings"
+# Size of the key of a cached embedding (blake2b digest of the text)
+KEY_SIZE = 16
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """
+    Exclusive lock between processes, held while writing to the store.
+    """
+    with open(path, "a+b") as f:
+        if sys.platform == "win32":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class EmbeddingStore:
+    """
+    Append-only on-disk store of the embeddings of one model.
+
+    The vectors are kept as float32 rows in `vectors.bin`, which is memory-mapped for reading,
+    and the row keys are appended to `keys.bin` after their vectors, so readers never see a key
+    without its vector. Writers from several processes are serialized with a file lock;
+    readers don't need the lock and pick up the rows appended by other processes.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self._keys_path = os.path.join(path, "keys.bin")
+        self._vectors_path = os.path.join(path, "vectors.bin")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._lock_path = os.path.join(path, ".lock")
+        self._rows: Dict[bytes, int] = {}
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def _read_dim(self) -> Optional[int]:
+        if self._dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self._dim = json.load(f)["dim"]
+        return self._dim
+
+    def _refresh(self) -> None:
+        """
+        Load the keys appended since the last refresh (also by other processes).
+        """
+        if not os.path.exists(self._keys_path):
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(len(self._rows) * KEY_SIZE)
+            data = f.read()
+        # Ignore an incomplete key of an interrupted write
+        count = len(data) // KEY_SIZE
+        start = len(self._rows)
+        for i in range(count):
+            self._rows[data[i * KEY_SIZE : (i + 1) * KEY_SIZE]] = start + i
+
+    def _get_vectors(self) -> np.memmap:
+        if self._vectors is None or self._vectors.shape[0] < len(self._rows):
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(len(self._rows), self._read_dim()),
+            )
+        return self._vectors
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[Embedding]]:
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._refresh()
+            rows = [self._rows.get(key) for key in keys]
+            if all(row is None for row in rows):
+                return [None] * len(keys)
+            vectors = self._get_vectors()
+            return [None if row is None else vectors[row].tolist() for row in rows]
+
+    def put_many(self, items: List[Tuple[bytes, Embedding]]) -> None:
+        with self._lock, _file_lock(self._lock_path):
+            self._refresh()
+            new_items: Dict[bytes, Embedding] = {}
+            for key, embedding in items:
+                if key not in self._rows:
+                    new_items[key] = embedding
+            if not new_items:
+                return
+            vectors = np.asarray(list(new_items.values()), dtype=np.float32)
+            if self._read_dim() is None:
+                self._dim = vectors.shape[1]
+                with open(self._meta_path, "w") as f:
+                    json.dump({"dim": self._dim}, f)
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} doesn't match the cache dimension {self._dim}"
+                )
+            # Drop the leftovers of an interrupted write before appending
+            for path, size in [
+                (self._vectors_path, len(self._rows) * self._dim * 4),
+                (self._keys_path, len(self._rows) * KEY_SIZE),
+            ]:
+                with open(path, "ab") as f:
+                    if f.tell() != size:
+                        f.truncate(size)
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(new_items.keys()))
+            self._refresh()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps an embedding model to cache its embeddings in memory (LRU) and on disk.
+    The disk cache is shared by all processes using the same cache directory.
+    Only the texts that are not cached are sent to the model.
+    """
+
+    embed_model: BaseEmbedding = Field(description="The embedding model to cache.")
+    memory_size: int = Field(
+        default=10000, description="Number of embeddings to keep in memory."
+    )
+
+    _store: EmbeddingStore = PrivateAttr()
+    _memory: "OrderedDict[bytes, Embedding]" = PrivateAttr()
+    _memory_lock: threading.Lock = PrivateAttr()
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        memory_size: int = 10000,
+    ):
+        super().__init__(
+            embed_model=embed_model,
+            memory_size=memory_size,
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=embed_model.callback_manager,
+        )
+        # Each model has its own store, so changing the model doesn't return stale embeddings
+        model_id = f"{embed_model.class_name()}:{embed_model.model_name}:{getattr(embed_model, 'dimensions', None)}"
+        namespace = hashlib.sha256(model_id.encode()).hexdigest()[:16]
+        self._store = EmbeddingStore(os.path.join(cache_dir, namespace))
+        self._memory = OrderedDict()
+        self._memory_lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @staticmethod
+    def _key(kind: str, text: str) -> bytes:
+        # Models can embed queries and documents differently, e.g. with an instruction
+        return hashlib.blake2b(
+            f"{kind}\0{text}".encode("utf-8"), digest_size=KEY_SIZE
+        ).digest()
+
+    def _remember(self, key: bytes, embedding: Embedding) -> None:
+        with self._memory_lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _lookup(
+        self, kind: str, texts: List[str]
+    ) -> Tuple[List[bytes], List[Optional[Embedding]], List[str]]:
+        """
+        Look up the embeddings of the texts in memory, then on disk.
+        Returns the keys, the cached embeddings (None for misses) and the distinct missing texts.
+        """
+        keys = [self._key(kind, text) for text in texts]
+        results: List[Optional[Embedding]] = [None] * len(texts)
+        with self._memory_lock:
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+        disk_indexes = [i for i, result in enumerate(results) if result is None]
+        if disk_indexes:
+            stored = self._store.get_many([keys[i] for i in disk_indexes])
+            for i, embedding in zip(disk_indexes, stored):
+                if embedding is not None:
+                    results[i] = embedding
+                    self._remember(keys[i], embedding)
+        missing = list(
+            dict.fromkeys(
+                text for text, result in zip(texts, results) if result is None
+            )
+        )
+        return keys, results, missing
+
+    def _store_missing(
+        self,
+        kind: str,
+        texts: List[str],
+        keys: List[bytes],
+        results: List[Optional[Embedding]],
+        missing: List[str],
+        embeddings: List[Embedding],
+    ) -> List[Embedding]:
+        computed = dict(zip(missing, embeddings))
+        new_items = []
+        for i, text in enumerate(texts):
+            if results[i] is None:
+                results[i] = computed[text]
+                new_items.append((keys[i], computed[text]))
+        for key, embedding in new_items:
+            self._remember(key, embedding)
+        try:
+            self._store.put_many(new_items)
+        except Exception as e:
+            # The cache is an optimization, never fail the embedding because of it
+            logger.warning(f"Failed to write embeddings to the cache: {e}")
+        return results  # type: ignore
+
+    def _get_embeddings(
+        self,
+        kind: str,
+        texts: List[str],
+        embed: Callable[[List[str]], List[Embedding]],
+    ) -> List[Embedding]:
+        keys, results, missing = self._lookup(kind, texts)
+        embeddings = embed(missing) if missing else []
+        return self._store_missing(kind, texts, keys, results, missing, embeddings)
+
+    async def _aget_embeddings(
+        self,
+        kind: str,
+        texts: List[str],
+        embed: Callable[[List[str]], Awaitable[List[Embedding]]],
+    ) -> List[Embedding]:
+        keys, results, missing = self._lookup(kind, texts)
+        embeddings = await embed(missing) if missing else []
+        return self._store_missing(kind, texts, keys, results, missing, embeddings)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._get_embeddings(
+            "query",
+            [query],
+            lambda texts: [self.embed_model._get_query_embedding(t) for t in texts],
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        async def embed(texts: List[str]) -> List[Embedding]:
+            return [await self.embed_model._aget_query_embedding(t) for t in texts]
+
+        return (await self._aget_embeddings("query", [query], embed))[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._get_embeddings(
+            "text", texts, self.embed_model._get_text_embeddings
+        )
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._aget_embeddings(
+            "text", texts, self.embed_model._aget_text_embeddings
+        )
+
+
+def cache_embed_model(embed_model: BaseEmbedding) -> BaseEmbedding:
+    """
+    Wrap the embedding model with a persistent cache in EMBEDDING_CACHE_DIR.
+    Set EMBEDDING_CACHE_DIR to an empty value to disable the cache.
+    """
+    cache_dir = os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+    if not cache_dir:
+        return embed_model
+    return CachedEmbedding(embed_model, cache_dir=cache_dir)
@@ -1,37 +1,100 @@
+import argparse
 import logging
 import os
+from typing import List
 
 from dotenv import load_dotenv
+from llama_index.core import Document, Settings
+from llama_index.core.indices.base import BaseIndex
+from llama_index.core.ingestion import run_transformations
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
 
+# Number of parsed documents to split, embed and insert at once
+INSERT_BATCH_SIZE = 64
+
+
+def insert_documents(index: BaseIndex, documents: List[Document]) -> None:
+    """
+    Split, embed and insert the documents into the index.
+    """
+    # Documents of an interrupted run may already be stored under the same ids
+    for doc in documents:
+        if index.docstore.get_ref_doc_info(doc.doc_id) is not None:
+            index.delete_ref_doc(doc.doc_id, delete_from_docstore=True)
+    nodes = run_transformations(documents, Settings.transformations)
+    index.insert_nodes(nodes)
+    for doc in documents:
+        index.docstore.set_document_hash(doc.doc_id, doc.hash)
+    logger.info(f"Indexed {len(documents)} documents ({len(nodes)} nodes)")
+
 
 def generate_index():
     """
     Index the documents in the data directory.
+
+    If an index was already generated, only the new and changed files are parsed and
+    embedded and the documents of the deleted files are removed from it.
+    Run with `--full` to re-create the index from scratch.
     """
     from src.index import STORAGE_DIR
+    from src.manifest import FileManifest, list_files
+    from src.parsing import parse_files
     from src.settings import init_settings
     from llama_index.core.indices import (
         VectorStoreIndex,
+        load_index_from_storage,
     )
-    from llama_index.core.readers import SimpleDirectoryReader
+    from llama_index.core.storage import StorageContext
+
+    parser = argparse.ArgumentParser(description="Index the documents")
+    parser.add_argument(
+        "--full", action="store_true", help="Re-create the index from scratch"
+    )
+    args, _ = parser.parse_known_args()
 
     load_dotenv()
     init_settings()
 
-    logger.info("Creating new index")
-    # load the documents and create the index
-    reader = SimpleDirectoryReader(
-        os.environ.get("DATA_DIR", "ui/data"),
-        recursive=True,
-    )
-    documents = reader.load_data()
-    index = VectorStoreIndex.from_documents(
-        documents,
-        show_progress=True,
-    )
-    # store it for later
+    files = list_files(os.environ.get("DATA_DIR", "ui/data"))
+    manifest = None if args.full else FileManifest.load(STORAGE_DIR)
+    index = None
+    if manifest is not None:
+        logger.info(f"Updating index in {STORAGE_DIR}")
+        index = load_index_from_storage(
+            StorageContext.from_defaults(persist_dir=STORAGE_DIR)
+        )
+    else:
+        logger.info("Creating new index")
+        manifest = FileManifest(STORAGE_DIR)
+
+    changes = manifest.diff(files)
+    logger.info(f"Files: {changes}")
+    if index is not None and not changes:
+        manifest.save()
+        logger.info("Index is up to date")
+        return
+
+    if index is not None:
+        for path in changes.to_remove:
+            for doc_id in manifest.doc_ids(path):
+                index.delete_ref_doc(doc_id, delete_from_docstore=True)
+            manifest.remove(path)
+
+    if index is None:
+        index = VectorStoreIndex(nodes=[])
+    # index the documents while the other files are still being parsed
+    batch: List[Document] = []
+    for path, documents in parse_files(changes.to_load, filename_as_id=True):
+        manifest.update(path, [doc.doc_id for doc in documents])
+        batch.extend(documents)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            insert_documents(index, batch)
+            batch = []
+    if batch:
+        insert_documents(index, batch)
+    # store it for later, the manifest last so an interrupted run is redone
     index.storage_context.persist(STORAGE_DIR)
-    logger.info(f"Finished creating new index. Stored in {STORAGE_DIR}")
+    manifest.save()
+    logger.info(f"Finished indexing. Stored in {STORAGE_DIR}")
@@ -1,21 +1,75 @@
 import logging
 import os
+import threading
+from typing import Dict, Optional, Tuple
 
 from llama_index.core.indices import load_index_from_storage
+from llama_index.core.indices.base import BaseIndex
 from llama_index.core.storage import StorageContext
 
 logger = logging.getLogger("uvicorn")
 
 STORAGE_DIR = "src/storage"
 
+# (file name, modification time, size) of the files in the storage directory
+Manifest = Tuple[Tuple[str, int, int], ...]
 
-def get_index():
+# Loaded index by storage directory, shared by the workflows of all requests
+_indexes: Dict[str, Tuple[Manifest, BaseIndex]] = {}
+_reloading: Dict[str, threading.Thread] = {}
+_lock = threading.Lock()
+
+
+def get_index() -> Optional[BaseIndex]:
     # check if storage already exists
     if not os.path.exists(STORAGE_DIR):
         return None
-    # load the existing index
-    logger.info(f"Loading index from {STORAGE_DIR}...")
-    storage_context = StorageContext.from_defaults(persist_dir=STORAGE_DIR)
+    key = os.path.abspath(STORAGE_DIR)
+    manifest = _get_manifest(key)
+    with _lock:
+        cached = _indexes.get(key)
+    if cached is None:
+        cached = _load(key, manifest)
+        with _lock:
+            _indexes[key] = cached
+    elif cached[0] != manifest:
+        # The index was regenerated: reload it in the background and use
+        # the previously loaded index until the reload has finished
+        with _lock:
+            if key not in _reloading:
+                _reloading[key] = threading.Thread(
+                    target=_reload, args=(key, manifest), daemon=True
+                )
+                _reloading[key].start()
+    return cached[1]
+
+
+def _get_manifest(persist_dir: str) -> Manifest:
+    return tuple(
+        sorted(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in os.scandir(persist_dir)
+            if entry.is_file()
+        )
+    )
+
+
+def _load(persist_dir: str, manifest: Manifest) -> Tuple[Manifest, BaseIndex]:
+    logger.info(f"Loading index from {persist_dir}...")
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
     index = load_index_from_storage(storage_context)
-    logger.info(f"Finished loading index from {STORAGE_DIR}")
-    return index
+    logger.info(f"Finished loading index from {persist_dir}")
+    return manifest, index
+
+
+def _reload(persist_dir: str, manifest: Manifest) -> None:
+    try:
+        loaded = _load(persist_dir, manifest)
+        with _lock:
+            _indexes[persist_dir] = loaded
+    except Exception as e:
+        # E.g. the storage is being written, retry on the next request
+        logger.warning(f"Failed to reload index from {persist_dir}: {e}")
+    finally:
+        with _lock:
+            _reloading.pop(persist_dir, None)
@@ -0,0 +1,27 @@
+import asyncio
+from typing import List
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryType
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+
+
+async def aretrieve(retriever: BaseRetriever, query: QueryType) -> List[NodeWithScore]:
+    """
+    Retrieve the nodes of the query without blocking the event loop.
+
+    `aretrieve` of a retriever is only non-blocking if its store supports async queries,
+    otherwise the query runs in the event loop (e.g. the default `aquery` of a vector store
+    calls `query`). In that case, the retrieval runs in a worker thread instead.
+    """
+    if has_async_retrieval(retriever):
+        return await retriever.aretrieve(query)
+    return await asyncio.to_thread(retriever.retrieve, query)
+
+
+def has_async_retrieval(retriever: BaseRetriever) -> bool:
+    vector_store = getattr(retriever, "_vector_store", None)
+    if isinstance(vector_store, BasePydanticVectorStore):
+        return type(vector_store).aquery is not BasePydanticVectorStore.aquery
+    # Other retrievers (e.g. LlamaCloud) are async if they implement `_aretrieve`
+    return type(retriever)._aretrieve is not BaseRetriever._aretrieve
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Any, List
+
+import pytest
+from llama_index.core import Settings, StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.workflow import (
+    Context,
+    Event,
+    StartEvent,
+    StopEvent,
+    Workflow,
+    step,
+)
+
+from src.retrieval import aretrieve, has_async_retrieval
+
+# Longest time the event loop may be blocked while the workflows run
+MAX_BLOCKING_SECONDS = 0.1
+QUERY_SECONDS = 0.3
+
+
+class SlowVectorStore(SimpleVectorStore):
+    """
+    A vector store without async queries, e.g. a local or network store.
+    """
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        time.sleep(QUERY_SECONDS)
+        return super().query(query, **kwargs)
+
+
+class QuestionEvent(Event):
+    question: str
+
+
+class AnswerEvent(Event):
+    nodes: List[NodeWithScore]
+
+
+class RetrievalWorkflow(Workflow):
+    def __init__(self, index: VectorStoreIndex, use_fallback: bool, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.retriever = index.as_retriever(similarity_top_k=2)
+        self.use_fallback = use_fallback
+
+    @step
+    async def start(self, ctx: Context, ev: StartEvent) -> QuestionEvent:
+        await ctx.set("num_questions", len(ev.questions))
+        for question in ev.questions:
+            ctx.send_event(QuestionEvent(question=question))
+        return None
+
+    @step(num_workers=4)
+    async def retrieve(self, ev: QuestionEvent) -> AnswerEvent:
+        if self.use_fallback:
+            nodes = await aretrieve(self.retriever, ev.question)
+        else:
+            nodes = await self.retriever.aretrieve(ev.question)
+        return AnswerEvent(nodes=nodes)
+
+    @step
+    async def collect(self, ctx: Context, ev: AnswerEvent) -> StopEvent:
+        num_questions = await ctx.get("num_questions")
+        events = ctx.collect_events(ev, [AnswerEvent] * num_questions)
+        if events is None:
+            return None
+        return StopEvent(result=[e.nodes for e in events])
+
+
+@pytest.fixture
+def index() -> VectorStoreIndex:
+    Settings.embed_model = MockEmbedding(embed_dim=8)
+    nodes = [TextNode(text=f"llama fact {i}") for i in range(10)]
+    return VectorStoreIndex(
+        nodes,
+        storage_context=StorageContext.from_defaults(vector_store=SlowVectorStore()),
+    )
+
+
+async def _run_with_monitor(workflow: Workflow, **kwargs: Any) -> tuple[Any, float]:
+    """
+    Run the workflow and return its result and the longest time the event loop was blocked.
+    """
+    max_blocked = 0.0
+    done = asyncio.Event()
+
+    async def monitor() -> None:
+        nonlocal max_blocked
+        interval = 0.01
+        while not done.is_set():
+            start = time.monotonic()
+            await asyncio.sleep(interval)
+            max_blocked = max(max_blocked, time.monotonic() - start - interval)
+
+    monitor_task = asyncio.create_task(monitor())
+    try:
+        result = await workflow.run(**kwargs)
+    finally:
+        done.set()
+        await monitor_task
+    return result, max_blocked
+
+
+@pytest.mark.asyncio
+async def test_retrieval_does_not_block_the_event_loop(index: VectorStoreIndex):
+    assert not has_async_retrieval(index.as_retriever())
+    workflow = RetrievalWorkflow(index=index, use_fallback=True, timeout=10)
+    start = time.monotonic()
+    result, max_blocked = await _run_with_monitor(
+        workflow, questions=["a", "b", "c", "d"]
+    )
+    assert all(len(nodes) == 2 for nodes in result)
+    assert max_blocked < MAX_BLOCKING_SECONDS
+    # The retrievals ran concurrently
+    assert time.monotonic() - start < 4 * QUERY_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_monitor_detects_blocking_retrieval(index: VectorStoreIndex):
+    workflow = RetrievalWorkflow(index=index, use_fallback=False, timeout=10)
+    _, max_blocked = await _run_with_monitor(workflow, questions=["a", "b"])
+    assert max_blocked >= MAX_BLOCKING_SECONDS
@@ -0,0 +1,53 @@
+import logging
+from typing import List
+
+from fastapi import APIRouter, HTTPException
+
+from app.api.routers.models import FileUploadRequest
+from app.services.file import DocumentFile, FileService
+from app.services.ingestion import IngestionJob, JobStatus, get_ingestion_queue
+
+ingestion_router = r = APIRouter()
+
+logger = logging.getLogger("uvicorn")
+
+
+@r.post("/upload")
+def upload_file(request: FileUploadRequest) -> DocumentFile:
+    """
+    Store the file and queue its indexing, poll the job with the returned `job_id`.
+    """
+    try:
+        return FileService.process_private_file(
+            request.name, request.base64, request.params
+        )
+    except Exception as e:
+        logger.error(f"Error processing file: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error processing file")
+
+
+@r.get("/jobs")
+def list_jobs() -> List[IngestionJob]:
+    return get_ingestion_queue().list()
+
+
+@r.get("/jobs/{job_id}")
+def get_job(job_id: str) -> IngestionJob:
+    job = get_ingestion_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@r.delete("/jobs/{job_id}")
+def cancel_job(job_id: str) -> IngestionJob:
+    job = get_ingestion_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.finished and job.status != JobStatus.CANCELLED:
+        raise HTTPException(
+            status_code=409, detail=f"Job is already {job.status.value}"
+        )
+    if job.status == JobStatus.INDEXING:
+        raise HTTPException(status_code=409, detail="Job is already being indexed")
+    return job
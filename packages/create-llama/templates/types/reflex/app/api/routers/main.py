@@ -1,4 +1,7 @@
 from fastapi import APIRouter
 
+from app.api.routers.ingestion import ingestion_router
 
 api_router = APIRouter()
+
+api_router.include_router(ingestion_router, prefix="/api/ingestion")
@@ -63,3 +63,9 @@ class SourceNodes(BaseModel):
     @classmethod
     def from_source_nodes(cls, source_nodes: List[NodeWithScore]):
         return [cls.from_source_node(node) for node in source_nodes]
+
+
+class FileUploadRequest(BaseModel):
+    name: str
+    base64: str
+    params: Any = None
@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+from llama_index.core.async_utils import asyncio_run
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+from pydantic import Field, PrivateAttr
+
+logger = logging.getLogger("uvicorn")
+
+# Most inputs per request accepted by the embedding APIs
+PROVIDER_BATCH_SIZES = {
+    "OpenAIEmbedding": 2048,
+    "AzureOpenAIEmbedding": 2048,
+    "CohereEmbedding": 96,
+    "GeminiEmbedding": 100,
+}
+# Most tokens per request accepted by the embedding APIs
+PROVIDER_BATCH_TOKENS = {
+    "OpenAIEmbedding": 300_000,
+    "AzureOpenAIEmbedding": 300_000,
+}
+# Conservative number of characters per token to estimate the size of a batch
+CHARS_PER_TOKEN = 3
+
+
+def is_overloaded(error: BaseException) -> bool:
+    """
+    Whether the error is a rate limit (HTTP 429) or a timeout, i.e. the provider
+    asks to send fewer concurrent requests.
+    """
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    name = type(error).__name__
+    if "RateLimit" in name or "Timeout" in name:
+        return True
+    status_code = getattr(error, "status_code", None) or getattr(
+        getattr(error, "response", None), "status_code", None
+    )
+    return status_code == 429
+
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of concurrent requests with additive increase and multiplicative
+    decrease (AIMD): the limit grows by one after a limit's worth of successful requests
+    and is halved when the provider is overloaded.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self._active = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def __aexit__(self, *args) -> None:
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes = 0
+
+    def on_overload(self, cooldown: float = 1.0) -> None:
+        # The requests running concurrently fail together, only decrease once for them
+        now = time.monotonic()
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self._successes = 0
+        self.limit = max(self.minimum, self.limit // 2)
+        logger.warning(
+            f"Embedding provider overloaded, concurrency is now {self.limit}"
+        )
+
+
+class EmbeddingCheckpoint:
+    """
+    Append-only file of the finished embeddings by content hash, so an interrupted
+    ingestion doesn't embed the same content again.
+
+    Each line holds the embeddings of a batch. Only the offset of the line of each key is
+    kept in memory, the embeddings are read from the file when they're looked up.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, "rb+") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("Incomplete line")
+                        keys = json.loads(line)
+                    except ValueError:
+                        # The last line of an interrupted write, appending after it
+                        # would corrupt the next one
+                        f.truncate(offset)
+                        break
+                    self.offsets.update(dict.fromkeys(keys, offset))
+                    offset += len(line)
+            logger.info(f"Resuming with {len(self.offsets)} embeddings from {path}")
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        The checkpointed embeddings of the keys, reading each line once.
+        """
+        lines: Dict[int, List[str]] = defaultdict(list)
+        for key in keys:
+            if key in self.offsets:
+                lines[self.offsets[key]].append(key)
+        embeddings: Dict[str, List[float]] = {}
+        if not lines:
+            return embeddings
+        with open(self.path, "rb") as f:
+            for offset in sorted(lines):
+                f.seek(offset)
+                batch = json.loads(f.readline())
+                embeddings.update((key, batch[key]) for key in lines[offset])
+        return embeddings
+
+    def append(self, keys: List[str], embeddings: List[List[float]]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write((json.dumps(dict(zip(keys, embeddings))) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self.offsets.update(dict.fromkeys(keys, offset))
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ScheduledEmbedding(TransformComponent):
+    """
+    Embed the nodes with batches of the provider's batch size, sent concurrently.
+
+    The number of concurrent requests adapts to the provider (see `AdaptiveConcurrency`):
+    rate limited or timed out batches are retried with an exponential backoff. The nodes keep
+    their order and, with `checkpoint_path`, each finished batch is saved so a crashed
+    ingestion only embeds the remaining nodes.
+    """
+
+    embed_model: BaseEmbedding
+    batch_size: Optional[int] = Field(
+        default=None,
+        description="Most nodes per request, default is the provider's limit.",
+    )
+    max_batch_tokens: Optional[int] = Field(
+        default=None,
+        description="Most (estimated) tokens per request, default is the provider's limit.",
+    )
+    initial_concurrency: int = 2
+    max_concurrency: int = 16
+    timeout: float = Field(default=60, description="Timeout of a request in seconds.")
+    max_retries: int = 8
+    checkpoint_path: Optional[str] = None
+    # Loaded once, the pipeline calls the stage for each batch of documents
+    _checkpoint: Optional[EmbeddingCheckpoint] = PrivateAttr(default=None)
+
+    @property
+    def checkpoint(self) -> Optional[EmbeddingCheckpoint]:
+        if self._checkpoint is None and self.checkpoint_path:
+            self._checkpoint = EmbeddingCheckpoint(self.checkpoint_path)
+        return self._checkpoint
+
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs) -> Sequence[BaseNode]:
+        return asyncio_run(self.acall(nodes, **kwargs))
+
+    async def acall(self, nodes: Sequence[BaseNode], **kwargs) -> Sequence[BaseNode]:
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        keys = [self._key(text) for text in texts]
+        checkpoint = self.checkpoint
+        checkpointed = checkpoint.get_many(keys) if checkpoint else {}
+        embeddings: List[Optional[List[float]]] = [checkpointed.get(k) for k in keys]
+        todo = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        batches = self._batches(todo, texts)
+        if batches:
+            logger.info(
+                f"Embedding {len(todo)} nodes in {len(batches)} batches "
+                f"({len(nodes) - len(todo)} from the checkpoint)"
+            )
+        limiter = AdaptiveConcurrency(self.initial_concurrency, self.max_concurrency)
+        done = 0
+        start = time.perf_counter()
+
+        async def embed_batch(rows: List[int]) -> None:
+            nonlocal done
+            batch_texts = [texts[i] for i in rows]
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with limiter:
+                        result = await asyncio.wait_for(
+                            self.embed_model._aget_text_embeddings(batch_texts),
+                            timeout=self.timeout,
+                        )
+                    break
+                except Exception as e:
+                    if not is_overloaded(e) or attempt == self.max_retries:
+                        raise
+                    limiter.on_overload()
+                    await asyncio.sleep(min(60, 2**attempt) * random.uniform(0.5, 1.5))
+            limiter.on_success()
+            for i, embedding in zip(rows, result):
+                embeddings[i] = embedding
+            if checkpoint is not None:
+                checkpoint.append([keys[i] for i in rows], result)
+            done += len(rows)
+            logger.info(
+                f"Embedded {done}/{len(todo)} nodes "
+                f"({done / (time.perf_counter() - start):.0f} nodes/s, "
+                f"concurrency {limiter.limit})"
+            )
+
+        tasks = [asyncio.ensure_future(embed_batch(rows)) for rows in batches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Don't leave the other batches running, the finished ones are checkpointed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+        return nodes
+
+    def _key(self, text: str) -> str:
+        model_name = getattr(self.embed_model, "model_name", "")
+        return hashlib.sha256(
+            f"{type(self.embed_model).__name__}:{model_name}\0{text}".encode()
+        ).hexdigest()
+
+    def _batches(self, rows: List[int], texts: List[str]) -> List[List[int]]:
+        model_type = type(self.embed_model).__name__
+        batch_size = self.batch_size or PROVIDER_BATCH_SIZES.get(
+            model_type, self.embed_model.embed_batch_size
+        )
+        max_tokens = self.max_batch_tokens or PROVIDER_BATCH_TOKENS.get(model_type)
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        tokens = 0
+        for i in rows:
+            text_tokens = len(texts[i]) // CHARS_PER_TOKEN + 1
+            if batch and (
+                len(batch) >= batch_size
+                or (max_tokens is not None and tokens + text_tokens > max_tokens)
+            ):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(i)
+            tokens += text_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+
+def get_scheduled_embedding(
+    embed_model: BaseEmbedding, checkpoint_path: Optional[str] = None
+) -> ScheduledEmbedding:
+    """
+    Create the embedding stage, configured by the EMBED_BATCH_SIZE and
+    EMBED_MAX_CONCURRENCY environment variables.
+    """
+    batch_size = os.getenv("EMBED_BATCH_SIZE")
+    max_concurrency = os.getenv("EMBED_MAX_CONCURRENCY")
+    return ScheduledEmbedding(
+        embed_model=embed_model,
+        batch_size=int(batch_size) if batch_size else None,
+        max_concurrency=int(max_concurrency) if max_concurrency else 16,
+        checkpoint_path=checkpoint_path,
+    )
@@ -0,0 +1,210 @@
+"""
+Compare the default sequential embedding of the ingestion pipeline with the scheduled
+embedding against a local mock embedding server, without calling a provider:
+
+    python -m app.engine.embedding_benchmark --nodes 5000
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import httpx
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import TextNode
+from pydantic import PrivateAttr
+
+from app.engine.embedding import ScheduledEmbedding
+
+logging.basicConfig(level=logging.WARNING)
+
+DIM = 64
+
+
+def mock_embedding(text: str) -> List[float]:
+    digest = hashlib.sha256(text.encode()).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(DIM)]
+
+
+class MockEmbeddingServer(ThreadingHTTPServer):
+    """
+    OpenAI compatible `/v1/embeddings` endpoint with a latency per request and per input.
+    Requests beyond `max_concurrency` get a 429 response, like a rate limited provider.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        latency_per_input: float = 0.0005,
+        max_batch_size: int = 256,
+        max_concurrency: int = 8,
+    ):
+        super().__init__(("127.0.0.1", 0), MockEmbeddingHandler)
+        self.latency = latency
+        self.latency_per_input = latency_per_input
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def __enter__(self) -> "MockEmbeddingServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class MockEmbeddingHandler(BaseHTTPRequestHandler):
+    server: MockEmbeddingServer
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"]
+        with self.server.lock:
+            self.server.requests += 1
+            overloaded = self.server.active >= self.server.max_concurrency
+            if overloaded:
+                self.server.rate_limited += 1
+            else:
+                self.server.active += 1
+        if overloaded:
+            return self._respond(429, {"error": {"message": "Rate limit exceeded"}})
+        if len(inputs) > self.server.max_batch_size:
+            with self.server.lock:
+                self.server.active -= 1
+            return self._respond(400, {"error": {"message": "Too many inputs"}})
+        try:
+            time.sleep(
+                self.server.latency + self.server.latency_per_input * len(inputs)
+            )
+            data = [
+                {"object": "embedding", "index": i, "embedding": mock_embedding(text)}
+                for i, text in enumerate(inputs)
+            ]
+            self._respond(200, {"object": "list", "data": data})
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _respond(self, status: int, body: dict) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class MockServerEmbedding(BaseEmbedding):
+    """
+    Client of the mock server, one request per call like the provider integrations.
+    """
+
+    api_base: str
+    _client: httpx.Client = PrivateAttr()
+    _aclient: httpx.AsyncClient = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        limits = httpx.Limits(max_connections=64)
+        self._client = httpx.Client(timeout=60)
+        self._aclient = httpx.AsyncClient(timeout=60, limits=limits)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embeddings([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return (await self._aget_text_embeddings([query]))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        response = self._client.post(
+            f"{self.api_base}/embeddings", json={"input": texts}
+        )
+        response.raise_for_status()
+        return [item["embedding"] for item in response.json()["data"]]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        response = await self._aclient.post(
+            f"{self.api_base}/embeddings", json={"input": texts}
+        )
+        response.raise_for_status()
+        return [item["embedding"] for item in response.json()["data"]]
+
+
+def make_nodes(count: int) -> List[TextNode]:
+    return [
+        TextNode(text=f"Chunk {i} of a document. " * 40, id_=f"node-{i}")
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--server-concurrency", type=int, default=8)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    with MockEmbeddingServer(
+        latency=args.latency,
+        max_batch_size=args.batch_size,
+        max_concurrency=args.server_concurrency,
+    ) as server:
+        embed_model = MockServerEmbedding(api_base=server.url)
+        nodes = make_nodes(args.nodes)
+        expected = [mock_embedding(node.get_content()) for node in nodes]
+
+        # The ingestion pipeline embeds sequentially with the model's batch size
+        start = time.perf_counter()
+        embeddings = embed_model.get_text_embedding_batch(
+            [node.get_content() for node in nodes]
+        )
+        sequential = time.perf_counter() - start
+        assert embeddings == expected
+        print(
+            f"sequential: {sequential:.2f}s ({len(nodes) / sequential:.0f} nodes/s, "
+            f"{server.requests} requests, batch size {embed_model.embed_batch_size})"
+        )
+
+        server.requests = 0
+        scheduled = ScheduledEmbedding(
+            embed_model=embed_model,
+            batch_size=args.batch_size,
+            max_concurrency=args.max_concurrency,
+        )
+        start = time.perf_counter()
+        result = scheduled(make_nodes(args.nodes))
+        elapsed = time.perf_counter() - start
+        assert [node.embedding for node in result] == expected, "order not preserved"
+        print(
+            f"scheduled:  {elapsed:.2f}s ({len(nodes) / elapsed:.0f} nodes/s, "
+            f"{server.requests} requests, {server.rate_limited} rate limited, "
+            f"batch size {args.batch_size}), {sequential / elapsed:.1f}x faster"
+        )
+
+
+if __name__ == "__main__":
+    main()
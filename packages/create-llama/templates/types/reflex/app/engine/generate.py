@@ -3,8 +3,10 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import json
 import logging
 import os
+from typing import Any, Dict, Iterable, List, Optional
 
 from llama_index.core.ingestion import DocstoreStrategy, IngestionPipeline
 from llama_index.core.node_parser import SentenceSplitter
@@ -12,7 +14,10 @@ from llama_index.core.settings import Settings
 from llama_index.core.storage import StorageContext
 from llama_index.core.storage.docstore import SimpleDocumentStore
 
-from app.engine.loaders import get_documents
+from app.engine.embedding import get_scheduled_embedding
+from app.engine.ingestion_cache import with_cache
+from app.engine.loaders import is_incremental, iter_documents, load_configs
+from app.engine.loaders.db import commit_watermarks, reset_watermarks
 from app.engine.vectordb import get_vector_store
 from app.settings import init_settings
 
@@ -20,9 +25,24 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
 
 STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+# The embeddings of an interrupted run, removed once the storage is persisted
+EMBEDDING_CHECKPOINT = os.path.join(".cache", "embeddings.checkpoint.jsonl")
+# Number of loaded documents passed to the ingestion pipeline at once
+INGEST_BATCH_SIZE = 256
+# Ids of the stored documents of each loader, to delete the ones not loaded anymore
+LOADED_IDS_PATH = os.path.join(STORAGE_DIR, "loaded_ids.json")
 
 
 def get_doc_store():
+    # With DOCSTORE_TYPE=sqlite, the documents are read and written in a database
+    # instead of being loaded in memory. Only the local vector store provides it.
+    try:
+        from app.engine.sqlite_store import SQLiteDocumentStore, use_sqlite_docstore
+    except ImportError:
+        pass
+    else:
+        if use_sqlite_docstore():
+            return SQLiteDocumentStore.from_persist_dir(STORAGE_DIR)
     # If the storage directory is there, load the document store from it.
     # If not, set up an in-memory document store since we can't load from a directory that doesn't exist.
     if os.path.exists(STORAGE_DIR):
@@ -31,24 +51,98 @@ def get_doc_store():
         return SimpleDocumentStore()
 
 
-def run_pipeline(docstore, vector_store, documents):
+def run_pipeline(docstore, vector_store, documents: Iterable) -> int:
+    """
+    Ingest the documents by batches of INGEST_BATCH_SIZE as they are loaded and return
+    the number of ingested nodes. Only one batch is kept in memory at a time.
+    """
     pipeline = IngestionPipeline(
-        transformations=[
-            SentenceSplitter(
-                chunk_size=Settings.chunk_size,
-                chunk_overlap=Settings.chunk_overlap,
-            ),
-            Settings.embed_model,
-        ],
+        # Cache the chunks and embeddings on disk, unchanged content is skipped
+        transformations=with_cache(
+            [
+                SentenceSplitter(
+                    chunk_size=Settings.chunk_size,
+                    chunk_overlap=Settings.chunk_overlap,
+                ),
+                # Concurrent batches with adaptive concurrency and checkpoints
+                get_scheduled_embedding(
+                    Settings.embed_model, checkpoint_path=EMBEDDING_CHECKPOINT
+                ),
+            ]
+        ),
         docstore=docstore,
-        docstore_strategy=DocstoreStrategy.UPSERTS_AND_DELETE,  # type: ignore
+        # Deletions are handled once all batches are ingested, see delete_removed_documents
+        docstore_strategy=DocstoreStrategy.UPSERTS,
         vector_store=vector_store,
     )
 
     # Run the ingestion pipeline and store the results
-    nodes = pipeline.run(show_progress=True, documents=documents)
+    num_nodes = 0
+    batch: List = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= INGEST_BATCH_SIZE:
+            num_nodes += len(pipeline.run(show_progress=True, documents=batch))
+            batch = []
+    if batch:
+        num_nodes += len(pipeline.run(show_progress=True, documents=batch))
+
+    return num_nodes
+
+
+def delete_removed_documents(
+    docstore,
+    vector_store,
+    configs: Dict[str, Any],
+    loaded_ids: Dict[str, List[str]],
+) -> Dict[str, List[str]]:
+    """
+    Delete the stored documents that the loaders didn't load anymore, like the
+    UPSERTS_AND_DELETE strategy does, and return the ids of the stored documents by
+    loader. Incremental loaders only load the changed documents, their other documents
+    are kept.
+    """
+    previous = _load_loaded_ids()
+    stored_ids: Dict[str, List[str]] = {}
+    for loader_type, doc_ids in loaded_ids.items():
+        if is_incremental(loader_type, configs[loader_type]):
+            doc_ids = list(
+                dict.fromkeys((previous or {}).get(loader_type, []) + doc_ids)
+            )
+        stored_ids[loader_type] = doc_ids
+    kept = {doc_id for doc_ids in stored_ids.values() for doc_id in doc_ids}
+    if previous is not None:
+        # Including the documents of the loaders removed from the config
+        candidates = {doc_id for doc_ids in previous.values() for doc_id in doc_ids}
+    elif not any(
+        is_incremental(loader_type, config) for loader_type, config in configs.items()
+    ):
+        candidates = set(docstore.get_all_document_hashes().values())
+    else:
+        # Stored before the ids were recorded, the loader of a document is unknown
+        candidates = set()
+    removed = candidates - kept
+    for ref_doc_id in removed:
+        docstore.delete_document(ref_doc_id, raise_error=False)
+        vector_store.delete(ref_doc_id)
+    if removed:
+        logger.info(f"Deleted {len(removed)} documents that weren't loaded anymore")
+    return stored_ids
+
+
+def _load_loaded_ids() -> Optional[Dict[str, List[str]]]:
+    try:
+        with open(LOADED_IDS_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
 
-    return nodes
+
+def _save_loaded_ids(stored_ids: Dict[str, List[str]]) -> None:
+    tmp_path = f"{LOADED_IDS_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stored_ids, f)
+    os.replace(tmp_path, LOADED_IDS_PATH)
 
 
 def persist_storage(docstore, vector_store):
@@ -57,22 +151,40 @@ def persist_storage(docstore, vector_store):
         vector_store=vector_store,
     )
     storage_context.persist(STORAGE_DIR)
+    if os.path.exists(EMBEDDING_CHECKPOINT):
+        os.remove(EMBEDDING_CHECKPOINT)
 
 
 def generate_datasource():
     init_settings()
     logger.info("Generate index for the provided data")
 
-    # Get the stores and documents or create new ones
-    documents = get_documents()
+    if not os.path.exists(STORAGE_DIR):
+        # Load all rows of the databases for a new index
+        reset_watermarks()
+    configs = load_configs()
+
+    # Get the stores or create new ones
     docstore = get_doc_store()
     vector_store = get_vector_store()
 
-    # Run the ingestion pipeline
-    _ = run_pipeline(docstore, vector_store, documents)
+    # Run the loaders concurrently and ingest their documents as they arrive
+    loaded_ids: Dict[str, List[str]] = {loader_type: [] for loader_type in configs}
+
+    def documents():
+        for loader_type, document in iter_documents(configs):
+            loaded_ids.setdefault(loader_type, []).append(document.doc_id)
+            yield document
+
+    num_nodes = run_pipeline(docstore, vector_store, documents())
+    logger.info(f"Ingested {num_nodes} new or changed nodes")
+    stored_ids = delete_removed_documents(docstore, vector_store, configs, loaded_ids)
 
     # Build the index and persist storage
     persist_storage(docstore, vector_store)
+    _save_loaded_ids(stored_ids)
+    # The loaded rows are stored, the next run only loads the rows changed since
+    commit_watermarks()
 
     logger.info("Finished generating the index")
 
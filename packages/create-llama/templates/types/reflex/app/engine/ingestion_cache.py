@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from llama_index.core.async_utils import asyncio_run
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+from pydantic import Field, PrivateAttr
+
+logger = logging.getLogger("uvicorn")
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "ingestion.sqlite")
+DEFAULT_MAX_SIZE = 1024 * 2**20
+# Largest number of variables of a SQLite statement in old SQLite versions
+SQLITE_MAX_VARIABLES = 900
+
+
+class SQLiteCache:
+    """
+    On-disk key-value store with a size limit: when it's exceeded, the least recently used
+    entries are evicted down to 90% of the limit.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+            )
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        now = time.time()
+        with self._lock, self._connection:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                chunk = keys[start : start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+                self._connection.execute(
+                    f"UPDATE entries SET accessed = ? WHERE key IN ({placeholders})",
+                    [now, *chunk],
+                )
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, value, len(value), now) for key, value in items],
+            )
+            self._evict()
+
+    def size(self) -> int:
+        with self._lock:
+            (size,) = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return size
+
+    def _evict(self) -> None:
+        (size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if size <= self.max_size:
+            return
+        target = size - int(self.max_size * 0.9)
+        evicted = 0
+        keys = []
+        for key, entry_size in self._connection.execute(
+            "SELECT key, size FROM entries ORDER BY accessed"
+        ):
+            keys.append((key,))
+            evicted += entry_size
+            if evicted >= target:
+                break
+        self._connection.executemany("DELETE FROM entries WHERE key = ?", keys)
+        logger.info(f"Evicted {len(keys)} entries from the ingestion cache")
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def transformation_key(transformation: TransformComponent) -> str:
+    """
+    Hash of the config of the transformation, its outputs are cached per config.
+    """
+    embed_model = (
+        transformation
+        if isinstance(transformation, BaseEmbedding)
+        else getattr(transformation, "embed_model", None)
+    )
+    if isinstance(embed_model, BaseEmbedding):
+        # The embeddings only depend on the model, not on how the requests are sent
+        config: Dict[str, Any] = {
+            "class_name": type(embed_model).__name__,
+            "model_name": embed_model.model_name,
+            "dimensions": getattr(embed_model, "dimensions", None),
+        }
+    else:
+        config = transformation.to_dict()
+    return hashlib.sha256(
+        json.dumps(config, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class CachedTransformation(TransformComponent):
+    """
+    Caches the outputs of a transformation per input node in a `SQLiteCache`.
+
+    Only the nodes that aren't cached are passed to the transformation, so ingesting
+    unchanged content again skips it. The outputs are keyed by the config of the
+    transformation and the id and hash (content and metadata) of the input node. The
+    embeddings of an embedding transformation are keyed by the embedded content only,
+    so re-split but unchanged chunks aren't embedded again.
+    """
+
+    transformation: TransformComponent
+    cache_path: str = DEFAULT_CACHE_PATH
+    max_size: int = Field(
+        default=DEFAULT_MAX_SIZE, description="Size limit of the cache in bytes."
+    )
+    _cache: Optional[SQLiteCache] = PrivateAttr(default=None)
+
+    @property
+    def cache(self) -> SQLiteCache:
+        if self._cache is None:
+            self._cache = SQLiteCache(self.cache_path, self.max_size)
+        return self._cache
+
+    @property
+    def _is_embedding(self) -> bool:
+        return isinstance(self.transformation, BaseEmbedding) or isinstance(
+            getattr(self.transformation, "embed_model", None), BaseEmbedding
+        )
+
+    def _keys(self, nodes: Sequence[BaseNode]) -> List[str]:
+        prefix = transformation_key(self.transformation)
+        if self._is_embedding:
+            contents = [
+                node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes
+            ]
+        else:
+            contents = [f"{node.node_id}\0{node.hash}" for node in nodes]
+        return [
+            hashlib.sha256(f"{prefix}\0{content}".encode()).hexdigest()
+            for content in contents
+        ]
+
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any) -> Sequence[BaseNode]:
+        return asyncio_run(self.acall(nodes, **kwargs))
+
+    async def acall(
+        self, nodes: Sequence[BaseNode], **kwargs: Any
+    ) -> Sequence[BaseNode]:
+        keys = self._keys(nodes)
+        cached = self.cache.get_many(keys)
+        misses = [i for i, key in enumerate(keys) if key not in cached]
+        logger.info(
+            f"{type(self.transformation).__name__}: {len(nodes) - len(misses)} of "
+            f"{len(nodes)} nodes cached"
+        )
+        if self._is_embedding:
+            return await self._embed(nodes, keys, cached, misses, **kwargs)
+        return await self._transform(nodes, keys, cached, misses, **kwargs)
+
+    async def _embed(self, nodes, keys, cached, misses, **kwargs) -> Sequence[BaseNode]:
+        for i, node in enumerate(nodes):
+            if keys[i] in cached:
+                node.embedding = json.loads(cached[keys[i]])
+        if misses:
+            embedded = await self.transformation.acall(
+                [nodes[i] for i in misses], **kwargs
+            )
+            self.cache.put_many(
+                (keys[i], json.dumps(node.embedding).encode())
+                for i, node in zip(misses, embedded)
+            )
+        return nodes
+
+    async def _transform(
+        self, nodes, keys, cached, misses, **kwargs
+    ) -> Sequence[BaseNode]:
+        outputs: Dict[int, List[BaseNode]] = {
+            i: [json_to_doc(doc) for doc in json.loads(cached[key])]
+            for i, key in enumerate(keys)
+            if key in cached
+        }
+        if misses:
+            # Transform one input node at a time to know which outputs it produced
+            new_outputs = []
+            for i in misses:
+                result = await self.transformation.acall([nodes[i]], **kwargs)
+                outputs[i] = list(result)
+                new_outputs.append(
+                    (keys[i], json.dumps([doc_to_json(n) for n in result]).encode())
+                )
+            self.cache.put_many(new_outputs)
+        return [node for i in range(len(nodes)) for node in outputs[i]]
+
+
+def with_cache(transformations: List[TransformComponent]) -> List[TransformComponent]:
+    """
+    Cache the outputs of the transformations in INGESTION_CACHE_DIR (default .cache),
+    unless it's set to an empty value. INGESTION_CACHE_MAX_MB sets the size limit.
+    """
+    cache_dir = os.getenv("INGESTION_CACHE_DIR", os.path.dirname(DEFAULT_CACHE_PATH))
+    if not cache_dir:
+        return transformations
+    max_size_mb = os.getenv("INGESTION_CACHE_MAX_MB")
+    return [
+        CachedTransformation(
+            transformation=transformation,
+            cache_path=os.path.join(cache_dir, os.path.basename(DEFAULT_CACHE_PATH)),
+            max_size=int(max_size_mb) * 2**20 if max_size_mb else DEFAULT_MAX_SIZE,
+        )
+        for transformation in transformations
+    ]
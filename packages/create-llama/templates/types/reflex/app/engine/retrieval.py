@@ -0,0 +1,81 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.indices.vector_store.retrievers import VectorIndexRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, QueryType
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+
+# Most queries of a batch embedded concurrently
+MAX_QUERY_EMBEDDING_CONCURRENCY = 8
+
+
+async def aretrieve(retriever: BaseRetriever, query: QueryType) -> List[NodeWithScore]:
+    """
+    Retrieve the nodes of the query without blocking the event loop.
+
+    `aretrieve` of a retriever is only non-blocking if its store supports async queries,
+    otherwise the query runs in the event loop (e.g. the default `aquery` of a vector store
+    calls `query`). In that case, the retrieval runs in a worker thread instead.
+    """
+    if has_async_retrieval(retriever):
+        return await retriever.aretrieve(query)
+    return await asyncio.to_thread(retriever.retrieve, query)
+
+
+def has_async_retrieval(retriever: BaseRetriever) -> bool:
+    vector_store = getattr(retriever, "_vector_store", None)
+    if isinstance(vector_store, BasePydanticVectorStore):
+        return type(vector_store).aquery is not BasePydanticVectorStore.aquery
+    # Other retrievers (e.g. LlamaCloud) are async if they implement `_aretrieve`
+    return type(retriever)._aretrieve is not BaseRetriever._aretrieve
+
+
+async def aretrieve_batch(
+    retriever: BaseRetriever, queries: List[str]
+) -> List[List[NodeWithScore]]:
+    """
+    Retrieve the nodes of several queries at once.
+
+    For a vector index retriever, the queries are embedded in one worker thread (see
+    `embed_queries`) and, if the vector store has a `query_batch` method, searched with
+    one vectorized top-k. Otherwise the queries are retrieved concurrently.
+    """
+    if not queries:
+        return []
+    if (
+        not isinstance(retriever, VectorIndexRetriever)
+        or not retriever._vector_store.is_embedding_query
+    ):
+        return list(await asyncio.gather(*[aretrieve(retriever, q) for q in queries]))
+    embeddings = await asyncio.to_thread(embed_queries, retriever._embed_model, queries)
+    bundles = [
+        QueryBundle(query_str=query, embedding=embedding)
+        for query, embedding in zip(queries, embeddings)
+    ]
+    vector_store = retriever._vector_store
+    if not hasattr(vector_store, "query_batch"):
+        return list(await asyncio.gather(*[aretrieve(retriever, b) for b in bundles]))
+    results = await asyncio.to_thread(
+        vector_store.query_batch,
+        [retriever._build_vector_store_query(bundle) for bundle in bundles],
+        **retriever._kwargs,
+    )
+    return [retriever._build_node_list_from_query_result(result) for result in results]
+
+
+def embed_queries(embed_model: BaseEmbedding, queries: List[str]) -> List[Embedding]:
+    """
+    Embed the queries as queries, some models embed queries and documents differently.
+
+    The embedding models have no batch of queries, and the async query embedding of local
+    models computes it in the event loop. The queries are embedded by at most
+    MAX_QUERY_EMBEDDING_CONCURRENCY threads instead, call it from a worker thread.
+    """
+    max_workers = min(len(queries), MAX_QUERY_EMBEDDING_CONCURRENCY)
+    if max_workers <= 1:
+        return [embed_model.get_query_embedding(query) for query in queries]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(embed_model.get_query_embedding, queries))
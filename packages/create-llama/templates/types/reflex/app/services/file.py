@@ -8,8 +8,6 @@ from io import BytesIO
 from pathlib import Path
 from typing import List, Optional, Tuple
 
-from llama_index.core import VectorStoreIndex
-from llama_index.core.ingestion import IngestionPipeline
 from llama_index.core.readers.file.base import (
     _try_loading_included_file_formats as get_file_loaders_map,
 )
@@ -39,6 +37,9 @@ class DocumentFile(BaseModel):
     refs: Optional[List[str]] = Field(
         None, description="The document ids in the index."
     )
+    job_id: Optional[str] = Field(
+        None, description="The background ingestion job indexing the file."
+    )
 
 
 class FileService:
@@ -52,21 +53,19 @@ class FileService:
         file_name: str,
         base64_content: str,
         params: Optional[dict] = None,
+        wait: bool = False,
     ) -> DocumentFile:
         """
-        Store the uploaded file and index it if necessary.
-        """
-        try:
-            from app.engine.index import IndexConfig, get_index
-        except ImportError as e:
-            raise ValueError("IndexConfig or get_index is not found") from e
+        Store the uploaded file and queue a background job to index it if necessary.
+        The job id is set in the returned file metadata, its document ids once indexed.
 
-        if params is None:
-            params = {}
-
-        # Add the nodes to the index and persist it
-        index_config = IndexConfig(**params)
-        index = get_index(index_config)
+        Args:
+            file_name: The original name of the file.
+            base64_content: The content of the file as a data URL.
+            params: Unused, the files are indexed by the shared ingestion queue.
+            wait: Wait until the file is indexed, raises an error if indexing failed.
+        """
+        from app.services.ingestion import JobStatus, get_ingestion_queue
 
         # Preprocess and store the file
         file_data, extension = cls._preprocess_base64_file(base64_content)
@@ -80,19 +79,14 @@ class FileService:
         # Don't index csv files (they are handled by tools)
         if extension == "csv":
             return document_file
-        else:
-            # Insert the file into the index and update document ids to the file metadata
-            if isinstance(index, LlamaCloudIndex):
-                doc_id = cls._add_file_to_llama_cloud_index(
-                    index, document_file.name, file_data
-                )
-                # Add document ids to the file metadata
-                document_file.refs = [doc_id]
-            else:
-                documents = cls._load_file_to_documents(document_file)
-                cls._add_documents_to_vector_store_index(documents, index)
-                # Add document ids to the file metadata
-                document_file.refs = [doc.doc_id for doc in documents]
+
+        # Parsing and embedding large files takes longer than a request should
+        job = get_ingestion_queue().submit(document_file)
+        document_file.job_id = job.id
+        if wait:
+            job.wait()
+            if job.status != JobStatus.DONE:
+                raise ValueError(f"Failed to index {file_name}: {job.error}")
 
         # Return the file metadata
         return document_file
@@ -208,25 +202,6 @@ class FileService:
             doc.metadata["private"] = "true"
         return documents
 
-    @staticmethod
-    def _add_documents_to_vector_store_index(
-        documents: List[Document], index: VectorStoreIndex
-    ) -> None:
-        """
-        Add the documents to the vector store index
-        """
-        pipeline = IngestionPipeline()
-        nodes = pipeline.run(documents=documents)
-
-        # Add the nodes to the index and persist it
-        if index is None:
-            index = VectorStoreIndex(nodes=nodes)
-        else:
-            index.insert_nodes(nodes=nodes)
-        index.storage_context.persist(
-            persist_dir=os.environ.get("STORAGE_DIR", "storage")
-        )
-
     @staticmethod
     def _add_file_to_llama_cloud_index(
         index: LlamaCloudIndex,
@@ -0,0 +1,318 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from enum import Enum
+from typing import List, Optional
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import BaseNode
+from llama_index.core.settings import Settings
+from pydantic import BaseModel, Field, PrivateAttr
+
+from app.engine.embedding import get_scheduled_embedding
+from app.services.file import DocumentFile, FileService
+
+logger = logging.getLogger(__name__)
+
+# Number of nodes embedded between two progress updates (and cancellation checks)
+EMBED_CHUNK_SIZE = 256
+# Finished jobs kept for the status endpoint
+MAX_FINISHED_JOBS = 1000
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    PARSING = "parsing"
+    EMBEDDING = "embedding"
+    INDEXING = "indexing"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = {JobStatus.DONE, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+class IngestionJob(BaseModel):
+    id: str
+    file: DocumentFile
+    status: JobStatus = JobStatus.QUEUED
+    progress: float = Field(default=0, description="Progress from 0 to 1.")
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    created_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
+    _finished: threading.Event = PrivateAttr(default_factory=threading.Event)
+    _nodes: Optional[List[BaseNode]] = PrivateAttr(default=None)
+    # Serializes the cancellation with the status changes of the workers
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def update(self, status: JobStatus, progress: Optional[float] = None) -> None:
+        self.status = status
+        if progress is not None:
+            self.progress = progress
+        self.updated_at = time.time()
+        if self.finished:
+            self._nodes = None
+            self._finished.set()
+
+    def advance(self, status: JobStatus, progress: float) -> bool:
+        """
+        Move the job to the next step, unless its cancellation was requested.
+        """
+        with self._lock:
+            if self.cancel_requested:
+                return False
+            self.update(status, progress)
+            return True
+
+    def request_cancel(self) -> bool:
+        """
+        Request the cancellation of the job, unless it's finished or being inserted.
+        """
+        with self._lock:
+            if self.finished or self.status == JobStatus.INDEXING:
+                return False
+            self.cancel_requested = True
+            return True
+
+    def wait(self, timeout: Optional[float] = None) -> "IngestionJob":
+        """
+        Wait until the job is finished.
+        """
+        self._finished.wait(timeout)
+        return self
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class IngestionQueue:
+    """
+    Index the uploaded files in the background.
+
+    `num_workers` threads parse, split and embed the files of the queued jobs. The nodes
+    are then inserted into the index by a single writer thread, which persists the index
+    once for all the jobs it inserted within `persist_interval` seconds, so concurrent
+    uploads don't race on the storage and don't persist it once per file.
+    With the local vector store, the nodes are appended to the `StorageLog` of the storage
+    instead, which is only compacted into a full persist once it's large.
+    """
+
+    def __init__(self, num_workers: int = 2, persist_interval: float = 2.0):
+        self.num_workers = num_workers
+        self.persist_interval = persist_interval
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._pending: "queue.Queue[IngestionJob]" = queue.Queue()
+        self._parsed: "queue.Queue[IngestionJob]" = queue.Queue()
+        self._started = False
+
+    def submit(self, file: DocumentFile) -> IngestionJob:
+        job = IngestionJob(id=str(uuid.uuid4()), file=file)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            self._prune()
+            if not self._started:
+                self._start()
+        self._pending.put(job)
+        logger.info(f"Queued ingestion job {job.id} for {file.name}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        with self._jobs_lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Cancel a job which isn't inserted into the index yet, a queued job is cancelled
+        right away, a running one at its next step.
+        """
+        job = self.get(job_id)
+        if job is None or not job.request_cancel():
+            return job
+        if job.status == JobStatus.QUEUED:
+            self._finish_cancelled(job)
+        return job
+
+    def _start(self) -> None:
+        for i in range(self.num_workers):
+            threading.Thread(
+                target=self._work, name=f"ingestion-worker-{i}", daemon=True
+            ).start()
+        threading.Thread(
+            target=self._write, name="ingestion-writer", daemon=True
+        ).start()
+        self._started = True
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _get_index(self) -> Optional[VectorStoreIndex]:
+        # Not kept by the queue, get_index returns the index shared with the chat,
+        # which is reloaded when the storage changes, e.g. after generating it again
+        from app.engine.index import get_index
+
+        return get_index()
+
+    def _work(self) -> None:
+        while True:
+            job = self._pending.get()
+            if job.finished:
+                continue
+            try:
+                self._process(job)
+            except JobCancelled:
+                self._finish_cancelled(job)
+            except Exception as e:
+                logger.exception(f"Failed to ingest {job.file.name}")
+                job.error = str(e)
+                job.update(JobStatus.FAILED)
+
+    def _advance(self, job: IngestionJob, status: JobStatus, progress: float) -> None:
+        if not job.advance(status, progress):
+            raise JobCancelled()
+
+    def _process(self, job: IngestionJob) -> None:
+        from llama_index.indices.managed.llama_cloud.base import LlamaCloudIndex
+
+        self._advance(job, JobStatus.PARSING, 0.05)
+        index = self._get_index()
+        if isinstance(index, LlamaCloudIndex):
+            # LlamaCloud parses and indexes the file itself, it can't be cancelled then
+            self._advance(job, JobStatus.INDEXING, 0.1)
+            with open(job.file.path, "rb") as f:  # type: ignore
+                doc_id = FileService._add_file_to_llama_cloud_index(
+                    index, job.file.name, f.read()
+                )
+            job.file.refs = [doc_id]
+            job.update(JobStatus.DONE, 1)
+            return
+
+        documents = FileService._load_file_to_documents(job.file)
+        nodes = run_transformations(documents, Settings.transformations)
+        self._advance(job, JobStatus.EMBEDDING, 0.2)
+        embedding = get_scheduled_embedding(Settings.embed_model)
+        for start in range(0, len(nodes), EMBED_CHUNK_SIZE):
+            embedding(nodes[start : start + EMBED_CHUNK_SIZE])
+            done = min(len(nodes), start + EMBED_CHUNK_SIZE)
+            self._advance(job, JobStatus.EMBEDDING, 0.2 + 0.7 * done / len(nodes))
+        job.file.refs = [doc.doc_id for doc in documents]
+        job._nodes = nodes
+        self._parsed.put(job)
+
+    def _write(self) -> None:
+        while True:
+            jobs = [self._parsed.get()]
+            deadline = time.monotonic() + self.persist_interval
+            # Insert the jobs parsed in the meantime before persisting once
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or self._idle():
+                    break
+                try:
+                    jobs.append(self._parsed.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._insert(jobs)
+            except Exception as e:
+                logger.exception("Failed to insert the uploaded files into the index")
+                for job in jobs:
+                    if not job.finished:
+                        job.error = str(e)
+                        job.update(JobStatus.FAILED)
+
+    def _idle(self) -> bool:
+        """
+        Whether no other job is being parsed, so there's nothing to wait for.
+        """
+        return self._parsed.empty() and not any(
+            job.status in (JobStatus.QUEUED, JobStatus.PARSING, JobStatus.EMBEDDING)
+            for job in self.list()
+        )
+
+    def _insert(self, jobs: List[IngestionJob]) -> None:
+        persist_dir = os.environ.get("STORAGE_DIR", "storage")
+        storage_log = _get_storage_log(persist_dir)
+        index = self._get_index()
+        inserted = []
+        for job in jobs:
+            if not job.advance(JobStatus.INDEXING, 0.95):
+                self._finish_cancelled(job)
+                continue
+            if index is None:
+                index = VectorStoreIndex(nodes=job._nodes)
+                # There's no persisted storage yet to append to
+                storage_log = None
+            else:
+                index.insert_nodes(nodes=job._nodes)
+            if storage_log is not None:
+                storage_log.append_nodes(job._nodes)  # type: ignore
+            inserted.append(job)
+        if not inserted:
+            return
+        if storage_log is None:
+            index.storage_context.persist(persist_dir=persist_dir)  # type: ignore
+        elif storage_log.should_compact():
+            storage_log.compact(index)  # type: ignore
+        logger.info(f"Indexed {len(inserted)} uploaded files")
+        for job in inserted:
+            job.update(JobStatus.DONE, 1)
+
+    def _finish_cancelled(self, job: IngestionJob) -> None:
+        # Both the cancel request of a queued job and its worker may finish it
+        with job._lock:
+            if job.finished:
+                return
+            job.update(JobStatus.CANCELLED)
+        if job.file.path and os.path.exists(job.file.path):
+            os.remove(job.file.path)
+        logger.info(f"Cancelled ingestion job {job.id} for {job.file.name}")
+
+
+def _get_storage_log(persist_dir: str):
+    """
+    The append-only log of the storage, only the local vector store supports it.
+    """
+    try:
+        from app.engine.storage_log import get_storage_log
+    except ImportError:
+        return None
+    if not os.path.exists(persist_dir):
+        return None
+    return get_storage_log(persist_dir)
+
+
+_ingestion_queue: Optional[IngestionQueue] = None
+_ingestion_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue() -> IngestionQueue:
+    """
+    The shared ingestion queue, configured by the INGESTION_WORKERS and
+    INGESTION_PERSIST_INTERVAL environment variables.
+    """
+    global _ingestion_queue
+    with _ingestion_queue_lock:
+        if _ingestion_queue is None:
+            _ingestion_queue = IngestionQueue(
+                num_workers=int(os.getenv("INGESTION_WORKERS", "2")),
+                persist_interval=float(os.getenv("INGESTION_PERSIST_INTERVAL", "2")),
+            )
+        return _ingestion_queue
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+from typing import List
+
+import pytest
+
+from app.engine.loaders import db
+from app.engine.loaders.db import (
+    DBLoaderConfig,
+    commit_watermarks,
+    get_db_documents,
+    reset_watermarks,
+)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch) -> DBLoaderConfig:
+    monkeypatch.setattr(db, "WATERMARKS_PATH", str(tmp_path / "db_watermarks.json"))
+    reset_watermarks()
+    path = tmp_path / "items.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, updated_at INTEGER)"
+        )
+        connection.executemany(
+            "INSERT INTO items VALUES (?, ?, ?)",
+            [(i, f"item {i}", i) for i in range(1, 6)],
+        )
+    return DBLoaderConfig(
+        uri=f"sqlite:///{path}",
+        queries=["SELECT * FROM items"],
+        batch_size=2,
+        id_column="id",
+        watermark_column="updated_at",
+    )
+
+
+def _add_item(config: DBLoaderConfig, item_id: int) -> None:
+    with sqlite3.connect(config.uri.removeprefix("sqlite:///")) as connection:
+        connection.execute(
+            "INSERT INTO items VALUES (?, ?, ?)", (item_id, f"item {item_id}", item_id)
+        )
+
+
+def _load_ids(config: DBLoaderConfig) -> List[str]:
+    return [doc.doc_id.split(":")[-1] for doc in get_db_documents([config])]
+
+
+def test_watermarks_are_saved_on_commit(config: DBLoaderConfig):
+    assert _load_ids(config) == ["1", "2", "3", "4", "5"]
+    assert not os.path.exists(db.WATERMARKS_PATH)
+    commit_watermarks()
+    assert os.path.exists(db.WATERMARKS_PATH)
+
+    _add_item(config, 6)
+    assert _load_ids(config) == ["6"]
+
+
+def test_uncommitted_rows_are_loaded_again(config: DBLoaderConfig):
+    assert len(_load_ids(config)) == 5
+    commit_watermarks()
+    _add_item(config, 6)
+    _add_item(config, 7)
+    assert _load_ids(config) == ["6", "7"]
+    # The run failed before the documents were stored, a new run starts without them
+    db._pending_watermarks.clear()
+    assert _load_ids(config) == ["6", "7"]
+
+
+def test_reset_watermarks(config: DBLoaderConfig):
+    _load_ids(config)
+    commit_watermarks()
+    _load_ids(config)
+    reset_watermarks()
+    commit_watermarks()
+    assert not os.path.exists(db.WATERMARKS_PATH)
+    assert len(_load_ids(config)) == 5
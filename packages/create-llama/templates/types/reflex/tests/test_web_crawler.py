@@ -0,0 +1,107 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List
+
+import pytest
+
+from app.engine.loaders.web import CrawlUrl, WebLoaderConfig, get_web_documents
+
+# The pages of the test site: the home page links to the docs, which link deeper
+PAGES = {
+    "/robots.txt": "User-agent: *\nDisallow: /docs/private\n",
+    "/": '<p>Home page</p><a href="/docs/a">A</a><a href="/blog/post">Post</a>',
+    "/docs/a": (
+        '<p>Page A</p><a href="/docs/b">B</a><a href="/docs/private">Private</a>'
+    ),
+    "/docs/b": '<p>Page B</p><a href="/docs/c">C</a>',
+    "/docs/c": "<p>Page C</p>",
+    "/docs/private": "<p>Private page</p>",
+    "/blog/post": "<p>Blog post</p>",
+}
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    # Paths of the full responses, the 304 responses aren't counted
+    downloads: List[str] = []
+
+    def do_GET(self) -> None:
+        body = PAGES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{hash(body)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.downloads.append(self.path)
+        content = body.encode()
+        self.send_response(200)
+        content_type = "text/plain" if self.path.endswith(".txt") else "text/html"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def site() -> Iterator[str]:
+    SiteHandler.downloads = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _crawl(site: str, cache_dir: str, max_depth: int, **kwargs) -> Dict[str, str]:
+    config = WebLoaderConfig(
+        urls=[
+            CrawlUrl(base_url=f"{site}/", prefix=f"{site}/docs", max_depth=max_depth)
+        ],
+        browser_fallback=False,
+        cache_dir=cache_dir,
+        **kwargs,
+    )
+    documents = get_web_documents(config)
+    return {doc.doc_id.removeprefix(site): doc.text for doc in documents}
+
+
+def test_max_depth(site: str, tmp_path):
+    assert set(_crawl(site, str(tmp_path), max_depth=0)) == {"/"}
+    assert set(_crawl(site, str(tmp_path), max_depth=2)) == {"/", "/docs/a", "/docs/b"}
+
+
+def test_prefix_and_robots_txt(site: str, tmp_path):
+    pages = _crawl(site, str(tmp_path), max_depth=5)
+    # The blog doesn't start with the prefix and the private page is disallowed
+    assert pages == {
+        "/": "Home page\nAPost",
+        "/docs/a": "Page A\nBPrivate",
+        "/docs/b": "Page B\nC",
+        "/docs/c": "Page C",
+    }
+    assert "/blog/post" not in SiteHandler.downloads
+    assert "/docs/private" not in SiteHandler.downloads
+
+    pages = _crawl(site, str(tmp_path), max_depth=5, respect_robots_txt=False)
+    assert pages["/docs/private"] == "Private page"
+
+
+def test_unchanged_pages_are_reused_on_recrawl(site: str, tmp_path):
+    first = _crawl(site, str(tmp_path), max_depth=5)
+    SiteHandler.downloads = []
+    PAGES["/docs/c"], original = "<p>Page C, updated</p>", PAGES["/docs/c"]
+    try:
+        second = _crawl(site, str(tmp_path), max_depth=5)
+    finally:
+        PAGES["/docs/c"] = original
+    # Only the changed page and robots.txt, which isn't cached, are downloaded again
+    assert sorted(SiteHandler.downloads) == ["/docs/c", "/robots.txt"]
+    assert second == {**first, "/docs/c": "Page C, updated"}
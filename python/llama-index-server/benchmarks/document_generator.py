@@ -0,0 +1,108 @@
+"""
+Benchmark the rendering throughput of the DocumentGenerator.
+
+Compares rendering reports sequentially in the calling process (the previous behavior),
+concurrently in the rendering process pool, and regenerating unchanged reports from the cache.
+It also reports the longest event loop stall while the documents are rendered.
+
+Usage:
+    uv run python benchmarks/document_generator.py --documents 16 --sections 50 --type pdf
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Awaitable, Callable, List
+
+from llama_index.server.tools.document_generator import DocumentGenerator
+
+
+def _make_report(index: int, sections: int) -> str:
+    parts = [f"# Report {index}"]
+    for section in range(sections):
+        parts.append(f"## Section {section}")
+        parts.append("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 10)
+        parts.append("| Quarter | Revenue | Cost |\n|---|---|---|")
+        parts.extend(f"| Q{q} | {q * 100 + index} | {q * 70} |" for q in range(1, 5))
+        parts.append("```python\nprint('hello world')\n```")
+    return "\n\n".join(parts)
+
+
+async def _measure(
+    name: str, documents: int, fn: Callable[[], Awaitable[None]]
+) -> None:
+    max_stall = 0.0
+    running = True
+
+    async def monitor() -> None:
+        # Measure how late the event loop wakes up a sleeping task
+        nonlocal max_stall
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_stall = max(max_stall, time.perf_counter() - start - 0.01)
+
+    monitor_task = asyncio.create_task(monitor())
+    # Let the monitor start sleeping before the measured function runs
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await fn()
+    elapsed = time.perf_counter() - start
+    running = False
+    await monitor_task
+    print(
+        f"{name:<28} {documents / elapsed:8.2f} docs/s  "
+        f"total={elapsed:7.2f}s  max loop stall={max_stall * 1000:8.1f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=16)
+    parser.add_argument("--sections", type=int, default=50)
+    parser.add_argument("--type", choices=["pdf", "html"], default="pdf")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    reports: List[str] = [_make_report(i, args.sections) for i in range(args.documents)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        uncached = DocumentGenerator(
+            "/api/files", max_workers=args.workers, use_cache=False
+        )
+        cached = DocumentGenerator("/api/files", max_workers=args.workers)
+
+        async def sequential() -> None:
+            for i, report in enumerate(reports):
+                uncached.generate_document(report, args.type, f"sequential_{i}")
+
+        async def pooled() -> None:
+            await asyncio.gather(
+                *(
+                    cached.agenerate_document(report, args.type, f"pooled_{i}")
+                    for i, report in enumerate(reports)
+                )
+            )
+
+        async def from_cache() -> None:
+            await asyncio.gather(
+                *(
+                    cached.agenerate_document(report, args.type, f"cached_{i}")
+                    for i, report in enumerate(reports)
+                )
+            )
+
+        # Start the worker processes before measuring
+        await cached.agenerate_document("# Warm up", args.type, "warm_up")
+
+        await _measure("sequential (in process)", args.documents, sequential)
+        await _measure("process pool", args.documents, pooled)
+        await _measure("cache hit", args.documents, from_cache)
+        DocumentGenerator.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Benchmark the sandbox pool of the code interpreter with the local subprocess backend.
+
+Compares creating a new sandbox for every execution (and re-uploading every file)
+with reusing pre-warmed sandboxes from a pool and syncing files incrementally.
+
+Usage:
+    uv run python benchmarks/interpreter_pool.py --runs 20 --files 5 --file-size 1000000
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+from llama_index.server.tools.interpreter.local import LocalSandboxBackend
+from llama_index.server.tools.interpreter.pool import SandboxPool
+
+CODE = "import json\nsum(range(1000))"
+
+
+def _create_files(directory: str, count: int, size: int) -> List[Tuple[str, str]]:
+    files = []
+    for i in range(count):
+        local_path = os.path.join(directory, f"file_{i}.bin")
+        with open(local_path, "wb") as f:
+            f.write(os.urandom(size))
+        files.append((local_path, f"data/file_{i}.bin"))
+    return files
+
+
+def _measure(fn: Callable[[], None], runs: int) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(name: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:<32} p50={p50:8.2f}ms  p99={p99:8.2f}ms  total={sum(timings):9.2f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--file-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    backend = LocalSandboxBackend()
+    with tempfile.TemporaryDirectory() as directory:
+        files = _create_files(directory, args.files, args.file_size)
+
+        def cold() -> None:
+            # Previous behavior: new sandbox, upload everything, kill after use
+            sandbox = backend.create_sandbox()
+            for local_path, sandbox_path in files:
+                with open(local_path, "rb") as f:
+                    sandbox.write_file(sandbox_path, f.read())
+            sandbox.run_code(CODE)
+            sandbox.kill()
+
+        pool = SandboxPool(backend, min_size=2, max_size=4)
+        pool.warm_up()
+
+        def pooled() -> None:
+            sandbox = pool.acquire()
+            pool.upload_files(sandbox, files)
+            sandbox.run_code(CODE)
+            pool.release(sandbox)
+
+        _report("cold sandbox + full upload", _measure(cold, args.runs))
+        _report("pooled sandbox + incremental", _measure(pooled, args.runs))
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
+import asyncio
+import hashlib
 import logging
+import multiprocessing
 import os
 import re
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 from io import BytesIO
+from typing import Any, BinaryIO, List, Optional, Tuple
 
 from llama_index.core.tools.function_tool import FunctionTool
 
 OUTPUT_DIR = "output/tools"
+CACHE_DIR = os.path.join(OUTPUT_DIR, ".cache")
+# Limits of the render cache, the least recently used documents are evicted first
+DEFAULT_MAX_CACHE_ENTRIES = 1000
+DEFAULT_MAX_CACHE_BYTES = 256 * 2**20
 
 
 class DocumentType(Enum):
@@ -98,11 +109,82 @@ HTML_TEMPLATE = """
 """
 
 
+def _render_documents_to_files(
+    original_content: str, targets: List[Tuple[str, str]]
+) -> None:
+    """
+    Render the markdown content to several (document type, file path) targets. Runs in a worker process.
+    """
+    DocumentGenerator._render_to_files(
+        original_content,
+        [
+            (DocumentType(document_type), file_path)
+            for document_type, file_path in targets
+        ],
+    )
+
+
+def _render_document(original_content: str, document_type: str) -> bytes:
+    """
+    Render the markdown content to a document. Runs in a worker process.
+    """
+    doc_type = DocumentType(document_type)
+    html_content = DocumentGenerator._generate_html_content(original_content)
+    if doc_type == DocumentType.PDF:
+        return DocumentGenerator._generate_pdf(html_content).getvalue()
+    return DocumentGenerator._generate_html(html_content).encode("utf-8")
+
+
 class DocumentGenerator:
-    def __init__(self, file_server_url_prefix: str):
+    # Process pool for rendering, shared by all instances
+    _executor: Optional[ProcessPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    def __init__(
+        self,
+        file_server_url_prefix: str,
+        max_workers: Optional[int] = None,
+        use_cache: bool = True,
+        max_cache_entries: int = DEFAULT_MAX_CACHE_ENTRIES,
+        max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+    ):
+        """
+        Args:
+            file_server_url_prefix: The URL prefix of the file server.
+            max_workers: The maximum number of processes for rendering documents.
+                Default is the number of CPUs (at most 4). Only used by the first instance that creates the pool.
+            use_cache: Whether to reuse previously rendered documents with the same content. Default is True.
+            max_cache_entries: The maximum number of cached documents. Default is 1000.
+            max_cache_bytes: The maximum total size of the cached documents. Default is 256 MB.
+        """
         if not file_server_url_prefix:
             raise ValueError("file_server_url_prefix is required")
         self.file_server_url_prefix = file_server_url_prefix
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.use_cache = use_cache
+        self.max_cache_entries = max_cache_entries
+        self.max_cache_bytes = max_cache_bytes
+
+    @classmethod
+    def _get_executor(cls, max_workers: int) -> ProcessPoolExecutor:
+        with cls._executor_lock:
+            if cls._executor is None:
+                # Spawn instead of fork, forking a multi-threaded server is unsafe
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return cls._executor
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Shut down the rendering process pool.
+        """
+        with cls._executor_lock:
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
 
     @classmethod
     def _generate_html_content(cls, original_content: str) -> str:
@@ -131,23 +213,59 @@ class DocumentGenerator:
                 "Failed to import required modules. Please install xhtml2pdf."
             )
 
+        buffer = BytesIO()
+        cls._write_pdf(pisa, html_content, buffer)
+        buffer.seek(0)
+        return buffer
+
+    @staticmethod
+    def _write_pdf(pisa: Any, html_content: str, dest: BinaryIO) -> None:
+        """
+        Render the HTML content as PDF directly into the destination.
+        """
         pdf_html = HTML_TEMPLATE.format(
             common_styles=COMMON_STYLES,
             specific_styles=PDF_SPECIFIC_STYLES,
             content=html_content,
         )
 
-        buffer = BytesIO()
         pdf = pisa.pisaDocument(
-            BytesIO(pdf_html.encode("UTF-8")), buffer, encoding="UTF-8"
+            BytesIO(pdf_html.encode("UTF-8")), dest, encoding="UTF-8"
         )
 
         if pdf.err:
             logging.error(f"PDF generation failed: {pdf.err}")
             raise ValueError("PDF generation failed")
 
-        buffer.seek(0)
-        return buffer
+    @classmethod
+    def _render_to_files(
+        cls, original_content: str, targets: List[Tuple[DocumentType, str]]
+    ) -> None:
+        """
+        Convert the markdown content once and render it to each (document type, file path) target.
+        The documents are streamed to a temporary file next to the target, which then replaces
+        the target, so a failed rendering never leaves a partial document.
+        """
+        html_content = cls._generate_html_content(original_content)
+        for doc_type, file_path in targets:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as file:
+                    if doc_type == DocumentType.PDF:
+                        try:
+                            from xhtml2pdf import pisa
+                        except ImportError:
+                            raise ImportError(
+                                "Failed to import required modules. Please install xhtml2pdf."
+                            )
+                        cls._write_pdf(pisa, html_content, file)
+                    else:
+                        file.write(cls._generate_html(html_content).encode("utf-8"))
+                os.replace(tmp_path, file_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
 
     @classmethod
     def _generate_html(cls, html_content: str) -> str:
@@ -172,33 +290,254 @@ class DocumentGenerator:
         Returns:
             str (URL to the document file): A file URL ready to serve.
         """
+        doc_type = self._get_document_type(document_type)
+        file_name = self._validate_file_name(file_name)
+        file_path = os.path.join(OUTPUT_DIR, f"{file_name}.{doc_type.value}")
+        cache_key = self._get_cache_key(original_content, doc_type)
+
+        if not self._restore_from_cache(cache_key, doc_type, file_path):
+            # Always generate html content first
+            html_content = self._generate_html_content(original_content)
+
+            # Based on the type of document, generate the corresponding file
+            if doc_type == DocumentType.PDF:
+                content = self._generate_pdf(html_content)
+            elif doc_type == DocumentType.HTML:
+                content = BytesIO(self._generate_html(html_content).encode("utf-8"))
+            else:
+                raise ValueError(f"Unexpected document type: {document_type}")
+
+            self._write_to_file(content, file_path)
+            self._save_to_cache(cache_key, doc_type, file_path)
+
+        return self._get_file_url(file_name, doc_type)
+
+    async def agenerate_document(
+        self, original_content: str, document_type: str, file_name: str
+    ) -> str:
+        """
+        To generate document as PDF or HTML file.
+        Parameters:
+            original_content: str (markdown style)
+            document_type: str (pdf or html) specify the type of the file format based on the use case
+            file_name: str (name of the document file) must be a valid file name, no extensions needed
+        Returns:
+            str (URL to the document file): A file URL ready to serve.
+        """
+        doc_type = self._get_document_type(document_type)
+        file_name = self._validate_file_name(file_name)
+        file_path = os.path.join(OUTPUT_DIR, f"{file_name}.{doc_type.value}")
+        cache_key = self._get_cache_key(original_content, doc_type)
+
+        if not await asyncio.to_thread(
+            self._restore_from_cache, cache_key, doc_type, file_path
+        ):
+            # Rendering is CPU-bound, run it in a worker process to not block the event loop
+            loop = asyncio.get_running_loop()
+            content = await loop.run_in_executor(
+                self._get_executor(self.max_workers),
+                _render_document,
+                original_content,
+                doc_type.value,
+            )
+            await asyncio.to_thread(self._write_to_file, BytesIO(content), file_path)
+            await asyncio.to_thread(self._save_to_cache, cache_key, doc_type, file_path)
+
+        return self._get_file_url(file_name, doc_type)
+
+    def generate_documents(
+        self, original_content: str, document_types: List[str], file_name: str
+    ) -> List[str]:
+        """
+        To generate the same document in several formats at once, e.g. both PDF and HTML.
+        Parameters:
+            original_content: str (markdown style)
+            document_types: List[str] (pdf and/or html) the file formats to generate
+            file_name: str (name of the document files) must be a valid file name, no extensions needed
+        Returns:
+            List[str] (URLs to the document files): One file URL per document type, in the same order.
+        """
+        file_name, targets = self._prepare_targets(
+            original_content, document_types, file_name
+        )
+        missing = [
+            (doc_type, file_path)
+            for doc_type, file_path, cache_key in targets
+            if not self._restore_from_cache(cache_key, doc_type, file_path)
+        ]
+        if missing:
+            self._render_to_files(original_content, missing)
+            for doc_type, file_path, cache_key in targets:
+                if (doc_type, file_path) in missing:
+                    self._save_to_cache(cache_key, doc_type, file_path)
+        return [self._get_file_url(file_name, doc_type) for doc_type, _, _ in targets]
+
+    async def agenerate_documents(
+        self, original_content: str, document_types: List[str], file_name: str
+    ) -> List[str]:
+        """
+        To generate the same document in several formats at once, e.g. both PDF and HTML.
+        Parameters:
+            original_content: str (markdown style)
+            document_types: List[str] (pdf and/or html) the file formats to generate
+            file_name: str (name of the document files) must be a valid file name, no extensions needed
+        Returns:
+            List[str] (URLs to the document files): One file URL per document type, in the same order.
+        """
+        file_name, targets = self._prepare_targets(
+            original_content, document_types, file_name
+        )
+        missing = []
+        for doc_type, file_path, cache_key in targets:
+            if not await asyncio.to_thread(
+                self._restore_from_cache, cache_key, doc_type, file_path
+            ):
+                missing.append((doc_type, file_path))
+        if missing:
+            # The worker process writes the files itself, so the documents are not sent back
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self._get_executor(self.max_workers),
+                _render_documents_to_files,
+                original_content,
+                [(doc_type.value, file_path) for doc_type, file_path in missing],
+            )
+            for doc_type, file_path, cache_key in targets:
+                if (doc_type, file_path) in missing:
+                    await asyncio.to_thread(
+                        self._save_to_cache, cache_key, doc_type, file_path
+                    )
+        return [self._get_file_url(file_name, doc_type) for doc_type, _, _ in targets]
+
+    def _prepare_targets(
+        self, original_content: str, document_types: List[str], file_name: str
+    ) -> Tuple[str, List[Tuple[DocumentType, str, str]]]:
+        """
+        Validate the input and get the (document type, file path, cache key) of each document.
+        """
+        if not document_types:
+            raise ValueError("At least one document type is required.")
+        doc_types: List[DocumentType] = []
+        for document_type in document_types:
+            doc_type = self._get_document_type(document_type)
+            if doc_type not in doc_types:
+                doc_types.append(doc_type)
+        file_name = self._validate_file_name(file_name)
+        return file_name, [
+            (
+                doc_type,
+                os.path.join(OUTPUT_DIR, f"{file_name}.{doc_type.value}"),
+                self._get_cache_key(original_content, doc_type),
+            )
+            for doc_type in doc_types
+        ]
+
+    def _get_file_url(self, file_name: str, doc_type: DocumentType) -> str:
+        return (
+            f"{self.file_server_url_prefix}/{OUTPUT_DIR}/{file_name}.{doc_type.value}"
+        )
+
+    @staticmethod
+    def _get_document_type(document_type: str) -> DocumentType:
         try:
-            doc_type = DocumentType(document_type.lower())
+            return DocumentType(document_type.lower())
         except ValueError:
             raise ValueError(
                 f"Invalid document type: {document_type}. Must be 'pdf' or 'html'."
             )
-        # Always generate html content first
-        html_content = self._generate_html_content(original_content)
-
-        # Based on the type of document, generate the corresponding file
-        if doc_type == DocumentType.PDF:
-            content = self._generate_pdf(html_content)
-            file_extension = "pdf"
-        elif doc_type == DocumentType.HTML:
-            content = BytesIO(self._generate_html(html_content).encode("utf-8"))
-            file_extension = "html"
-        else:
-            raise ValueError(f"Unexpected document type: {document_type}")
 
-        file_name = self._validate_file_name(file_name)
-        file_path = os.path.join(OUTPUT_DIR, f"{file_name}.{file_extension}")
+    @staticmethod
+    def _get_cache_key(original_content: str, doc_type: DocumentType) -> str:
+        """
+        Hash of everything that affects the rendered document: content, type and styles.
+        """
+        specific_styles = (
+            PDF_SPECIFIC_STYLES
+            if doc_type == DocumentType.PDF
+            else HTML_SPECIFIC_STYLES
+        )
+        hasher = hashlib.sha256()
+        for part in (
+            doc_type.value,
+            HTML_TEMPLATE,
+            COMMON_STYLES,
+            specific_styles,
+            original_content,
+        ):
+            hasher.update(part.encode("utf-8"))
+            hasher.update(b"\0")
+        return hasher.hexdigest()
 
-        self._write_to_file(content, file_path)
+    def _get_cache_path(self, cache_key: str, doc_type: DocumentType) -> str:
+        return os.path.join(CACHE_DIR, f"{cache_key}.{doc_type.value}")
 
-        return (
-            f"{self.file_server_url_prefix}/{OUTPUT_DIR}/{file_name}.{file_extension}"
-        )
+    def _restore_from_cache(
+        self, cache_key: str, doc_type: DocumentType, file_path: str
+    ) -> bool:
+        """
+        Copy a previously rendered document with the same cache key to the file path.
+        Returns False if there is no cached document.
+        """
+        if not self.use_cache:
+            return False
+        cache_path = self._get_cache_path(cache_key, doc_type)
+        if not os.path.exists(cache_path):
+            return False
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            shutil.copyfile(cache_path, file_path)
+            # The modification time orders the documents for eviction
+            os.utime(cache_path)
+        except OSError as e:
+            logging.warning(f"Failed to restore cached document {cache_path}: {e}")
+            return False
+        return True
+
+    def _save_to_cache(
+        self, cache_key: str, doc_type: DocumentType, file_path: str
+    ) -> None:
+        if not self.use_cache or not os.path.exists(file_path):
+            return
+        cache_path = self._get_cache_path(cache_key, doc_type)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial document
+            tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Failed to cache document {file_path}: {e}")
+            return
+        self._evict_from_cache()
+
+    def _evict_from_cache(self) -> None:
+        """
+        Remove the least recently used documents until the cache is within its limits.
+        """
+        entries = []
+        try:
+            with os.scandir(CACHE_DIR) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+        count = len(entries)
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if count <= self.max_cache_entries and total_bytes <= self.max_cache_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Evicted by another thread or process
+                pass
+            except OSError as e:
+                logging.warning(f"Failed to evict cached document {path}: {e}")
+                continue
+            count -= 1
+            total_bytes -= size
 
     @staticmethod
     def _write_to_file(content: BytesIO, file_path: str) -> None:
@@ -208,7 +547,8 @@ class DocumentGenerator:
         try:
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             with open(file_path, "wb") as file:
-                file.write(content.getvalue())
+                # Write the underlying buffer without copying it
+                file.write(content.getbuffer())
         except Exception:
             raise
 
@@ -237,6 +577,17 @@ class DocumentGenerator:
                 "using `pip install markdown xhtml2pdf`"
             )
 
-    def to_tool(self) -> FunctionTool:
+    def to_tool(self, multi_format: bool = False) -> FunctionTool:
+        """
+        Args:
+            multi_format: Whether the tool generates several formats in one call
+                and returns all URLs. Default is False.
+        """
         self._validate_packages()
-        return FunctionTool.from_defaults(self.generate_document)
+        if multi_format:
+            return FunctionTool.from_defaults(
+                fn=self.generate_documents, async_fn=self.agenerate_documents
+            )
+        return FunctionTool.from_defaults(
+            fn=self.generate_document, async_fn=self.agenerate_document
+        )
@@ -1,4 +1,13 @@
+from .cache import QueryCache
 from .citation import CitationSynthesizer, NodeCitationProcessor
 from .query import get_query_engine_tool
+from .utils import IndexCache, index_cache
 
-__all__ = ["get_query_engine_tool", "NodeCitationProcessor", "CitationSynthesizer"]
+__all__ = [
+    "get_query_engine_tool",
+    "NodeCitationProcessor",
+    "CitationSynthesizer",
+    "QueryCache",
+    "IndexCache",
+    "index_cache",
+]
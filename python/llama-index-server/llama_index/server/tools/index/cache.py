@@ -0,0 +1,320 @@
+import functools
+import inspect
+import itertools
+import json
+import logging
+import re
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from cachetools import TTLCache  # type: ignore
+
+from llama_index.core import QueryBundle
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.base.response.schema import RESPONSE_TYPE, Response
+from llama_index.core.indices.base import BaseIndex
+from llama_index.core.query_engine.retriever_query_engine import RetrieverQueryEngine
+from llama_index.core.schema import NodeWithScore
+
+logger = logging.getLogger(__name__)
+
+# Index methods that modify the index and invalidate the cached results
+INDEX_MODIFYING_METHODS = [
+    "insert",
+    "insert_nodes",
+    "delete",
+    "delete_nodes",
+    "delete_ref_doc",
+    "update",
+    "update_ref_doc",
+    "refresh",
+    "refresh_ref_docs",
+    "ainsert",
+    "ainsert_nodes",
+    "adelete_nodes",
+    "adelete_ref_doc",
+    "aupdate_ref_doc",
+    "arefresh_ref_docs",
+]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so near-identical queries share a cache entry:
+    case-insensitive, collapsed whitespace and no trailing punctuation.
+    """
+    query = re.sub(r"\s+", " ", query.casefold()).strip()
+    return query.rstrip("?!. ")
+
+
+def _params_key(params: Dict[str, Any]) -> str:
+    """
+    A stable key for the query engine parameters (e.g. filters, similarity_top_k).
+    """
+
+    def default(value: Any) -> Any:
+        if hasattr(value, "model_dump"):
+            try:
+                return value.model_dump(mode="json")
+            except Exception:
+                pass
+        return repr(value)
+
+    return json.dumps(params, sort_keys=True, default=default)
+
+
+class QueryCache:
+    """
+    Cache retrieval results and synthesized answers of query engine tools.
+
+    Entries are keyed by the normalized query, the query engine parameters (filters, top_k, ...)
+    and the version of the index, so modifying a watched index invalidates its entries.
+    Both caches evict the least recently used entries and expire entries after `ttl` seconds.
+    The cache is thread-safe and can be shared by the tools of all requests.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 3600,
+        cache_responses: bool = True,
+    ):
+        """
+        Args:
+            maxsize: The maximum number of entries of each cache. Default is 1024.
+            ttl: The time to live of an entry in seconds. Default is 3600.
+            cache_responses: Whether to cache synthesized answers in addition to retrieval results.
+                Default is True.
+        """
+        self.cache_responses = cache_responses
+        self._retrievals: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._responses: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._index_versions: "weakref.WeakKeyDictionary[BaseIndex, int]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # A unique id per index, so that indexes sharing the cache don't share entries
+        self._index_ids: "weakref.WeakKeyDictionary[BaseIndex, int]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._next_index_id = itertools.count()
+        self._stats = {
+            "retrieval": {"hits": 0, "misses": 0},
+            "response": {"hits": 0, "misses": 0},
+        }
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        The number of hits and misses of the retrieval and response caches.
+        """
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def invalidate(self) -> None:
+        """
+        Remove all cached entries.
+        """
+        with self._lock:
+            self._retrievals.clear()
+            self._responses.clear()
+
+    def watch(self, index: BaseIndex) -> None:
+        """
+        Invalidate the cached results of the index when it is modified through its methods
+        (e.g. `insert_nodes`, `delete_ref_doc`).
+        """
+        with self._lock:
+            if index in self._index_versions:
+                return
+            self._index_versions[index] = 0
+            self._get_index_id(index)
+        for name in INDEX_MODIFYING_METHODS:
+            method = getattr(index, name, None)
+            if method is not None:
+                setattr(index, name, self._wrap_modifying_method(index, method))
+
+    def index_version(self, index: BaseIndex) -> Tuple[int, int, int]:
+        """
+        The version of the index: its id in the cache, the number of watched modifications
+        and the number of nodes.
+        """
+        with self._lock:
+            index_id = self._get_index_id(index)
+            version = self._index_versions.get(index, 0)
+        index_struct = getattr(index, "_index_struct", None)
+        nodes_dict = getattr(index_struct, "nodes_dict", None)
+        return index_id, version, len(nodes_dict) if nodes_dict is not None else -1
+
+    def _get_index_id(self, index: BaseIndex) -> int:
+        # Called with the lock held
+        index_id = self._index_ids.get(index)
+        if index_id is None:
+            index_id = self._index_ids[index] = next(self._next_index_id)
+        return index_id
+
+    def wrap_query_engine(
+        self,
+        query_engine: BaseQueryEngine,
+        index: BaseIndex,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> BaseQueryEngine:
+        """
+        Wrap a query engine of the index to use the cache.
+        Only retriever query engines are supported, other query engines are returned as is.
+        """
+        if not isinstance(query_engine, RetrieverQueryEngine):
+            logger.warning(
+                f"Query cache is not supported for {type(query_engine).__name__}, skipping."
+            )
+            return query_engine
+        self.watch(index)
+        params_key = _params_key(params or {})
+        return CachedRetrieverQueryEngine(
+            retriever=CachedRetriever(
+                retriever=query_engine.retriever,
+                cache=self,
+                index=index,
+                params_key=params_key,
+            ),
+            response_synthesizer=query_engine._response_synthesizer,
+            node_postprocessors=query_engine._node_postprocessors,
+            callback_manager=query_engine.callback_manager,
+            cache=self,
+            index=index,
+            params_key=params_key,
+        )
+
+    def get(self, kind: str, key: Hashable) -> Optional[Any]:
+        cache = self._retrievals if kind == "retrieval" else self._responses
+        with self._lock:
+            value = cache.get(key)
+            self._stats[kind]["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, kind: str, key: Hashable, value: Any) -> None:
+        cache = self._retrievals if kind == "retrieval" else self._responses
+        with self._lock:
+            cache[key] = value
+
+    def _wrap_modifying_method(
+        self, index: BaseIndex, method: Callable[..., Any]
+    ) -> Callable[..., Any]:
+        def bump_version() -> None:
+            with self._lock:
+                self._index_versions[index] = self._index_versions.get(index, 0) + 1
+
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    bump_version()
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return method(*args, **kwargs)
+            finally:
+                bump_version()
+
+        return wrapper
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever that caches the retrieved nodes of the wrapped retriever.
+    """
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        cache: QueryCache,
+        index: BaseIndex,
+        params_key: str,
+    ):
+        super().__init__(callback_manager=retriever.callback_manager)
+        self._retriever = retriever
+        self._cache = cache
+        self._index = index
+        self._params_key = params_key
+
+    def _key(self, query_bundle: QueryBundle) -> Hashable:
+        return (
+            normalize_query(query_bundle.query_str),
+            self._params_key,
+            self._cache.index_version(self._index),
+        )
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        key = self._key(query_bundle)
+        nodes = self._cache.get("retrieval", key)
+        if nodes is None:
+            nodes = self._retriever.retrieve(query_bundle)
+            self._cache.set("retrieval", key, nodes)
+        return list(nodes)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        key = self._key(query_bundle)
+        nodes = self._cache.get("retrieval", key)
+        if nodes is None:
+            nodes = await self._retriever.aretrieve(query_bundle)
+            self._cache.set("retrieval", key, nodes)
+        return list(nodes)
+
+
+class CachedRetrieverQueryEngine(RetrieverQueryEngine):
+    """
+    Retriever query engine that caches synthesized answers.
+    Streaming responses are not cached.
+    """
+
+    def __init__(
+        self,
+        cache: QueryCache,
+        index: BaseIndex,
+        params_key: str,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self._cache = cache
+        self._index = index
+        self._params_key = params_key
+
+    def _key(self, query_bundle: QueryBundle) -> Hashable:
+        # The response synthesizer and postprocessors can be changed after creation (e.g. for citations)
+        return (
+            normalize_query(query_bundle.query_str),
+            self._params_key,
+            self._cache.index_version(self._index),
+            type(self._response_synthesizer).__name__,
+            tuple(type(p).__name__ for p in self._node_postprocessors),
+        )
+
+    def _query(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        if not self._cache.cache_responses:
+            return super()._query(query_bundle)
+        key = self._key(query_bundle)
+        response = self._cache.get("response", key)
+        if response is None:
+            response = super()._query(query_bundle)
+            if isinstance(response, Response):
+                self._cache.set("response", key, response)
+        return response
+
+    async def _aquery(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        if not self._cache.cache_responses:
+            return await super()._aquery(query_bundle)
+        key = self._key(query_bundle)
+        response = self._cache.get("response", key)
+        if response is None:
+            response = await super()._aquery(query_bundle)
+            if isinstance(response, Response):
+                self._cache.set("response", key, response)
+        return response
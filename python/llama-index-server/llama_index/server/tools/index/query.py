@@ -5,29 +5,37 @@ from typing import Any, Optional
 from llama_index.core.base.base_query_engine import BaseQueryEngine
 from llama_index.core.indices.base import BaseIndex
 from llama_index.core.tools.query_engine import QueryEngineTool
+from llama_index.server.tools.index.cache import QueryCache
 
 logger = logging.getLogger(__name__)
 
 
-def create_query_engine(index: BaseIndex, **kwargs: Any) -> BaseQueryEngine:
+def create_query_engine(
+    index: BaseIndex, cache: Optional[QueryCache] = None, **kwargs: Any
+) -> BaseQueryEngine:
     """
     Create a query engine for the given index.
 
     Args:
         index: The index to create a query engine for.
+        cache (optional): Cache the retrieval results and answers of the query engine.
         params (optional): Additional parameters for the query engine, e.g: similarity_top_k
     """
     top_k = int(os.getenv("TOP_K", 0))
     if top_k != 0 and kwargs.get("filters") is None:
         kwargs["similarity_top_k"] = top_k
 
-    return index.as_query_engine(**kwargs)
+    query_engine = index.as_query_engine(**kwargs)
+    if cache is not None:
+        query_engine = cache.wrap_query_engine(query_engine, index, params=kwargs)
+    return query_engine
 
 
 def get_query_engine_tool(
     index: BaseIndex,
     name: Optional[str] = None,
     description: Optional[str] = None,
+    cache: Optional[QueryCache] = None,
     **kwargs: Any,
 ) -> QueryEngineTool:
     """
@@ -37,12 +45,13 @@ def get_query_engine_tool(
         index: The index to create a query engine for.
         name (optional): The name of the tool.
         description (optional): The description of the tool.
+        cache (optional): Cache the retrieval results and answers of the tool, see `QueryCache`.
     """
     if name is None:
         name = "query_index"
     if description is None:
         description = "Use this tool to retrieve information from a knowledge base. Provide a specific query and can call the tool multiple times if necessary."
-    query_engine = create_query_engine(index, **kwargs)
+    query_engine = create_query_engine(index, cache=cache, **kwargs)
     tool = QueryEngineTool.from_defaults(
         query_engine=query_engine,
         name=name,
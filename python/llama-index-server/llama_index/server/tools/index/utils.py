@@ -1,13 +1,165 @@
-from datetime import timedelta
-
-from cachetools import TTLCache, cached  # type: ignore
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
 
+from llama_index.core.indices import load_index_from_storage
+from llama_index.core.indices.base import BaseIndex
 from llama_index.core.storage import StorageContext
 
+logger = logging.getLogger("uvicorn")
+
+# (file name, modification time, size) of the files in a persist directory
+Manifest = Tuple[Tuple[str, int, int], ...]
+
+
+def get_manifest(persist_dir: str) -> Optional[Manifest]:
+    """
+    Get the manifest of the persist directory, None if it doesn't exist.
+    """
+    try:
+        entries = [
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in os.scandir(persist_dir)
+            if entry.is_file()
+        ]
+    except FileNotFoundError:
+        return None
+    return tuple(sorted(entries))
+
+
+@dataclass
+class IndexHandle:
+    storage_context: StorageContext
+    manifest: Manifest
+    index: Optional[BaseIndex] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class IndexCache:
+    """
+    Cache of the storage contexts and indexes loaded from persist directories.
+
+    Entries are keyed by the persist directory and invalidated when the files of the directory
+    change (modification time or size). A changed directory is reloaded in a background thread,
+    requests keep using the previously loaded index until the reload has finished.
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        """
+        Args:
+            check_interval: Minimum number of seconds between two checks of a directory for changes.
+        """
+        self.check_interval = check_interval
+        self._handles: Dict[str, IndexHandle] = {}
+        self._last_checks: Dict[str, float] = {}
+        self._reloading: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def get_storage_context(self, persist_dir: str) -> StorageContext:
+        """
+        Get the storage context of the persist directory.
+        """
+        return self._get_handle(persist_dir).storage_context
+
+    def get_index(self, persist_dir: str, **kwargs: Any) -> Optional[BaseIndex]:
+        """
+        Get the index of the persist directory, None if the directory doesn't exist.
+        The loaded index is shared by all callers. If keyword arguments for `load_index_from_storage`
+        are given (e.g. `callback_manager`), a new index is created from the cached storage context.
+        """
+        if not os.path.exists(persist_dir):
+            return None
+        handle = self._get_handle(persist_dir)
+        if kwargs:
+            return load_index_from_storage(handle.storage_context, **kwargs)
+        with handle.lock:
+            if handle.index is None:
+                handle.index = load_index_from_storage(handle.storage_context)
+            return handle.index
+
+    def invalidate(self, persist_dir: Optional[str] = None) -> None:
+        """
+        Remove the cached entry of the persist directory, or all entries.
+        """
+        with self._lock:
+            if persist_dir is None:
+                self._handles.clear()
+                self._last_checks.clear()
+            else:
+                key = os.path.abspath(persist_dir)
+                self._handles.pop(key, None)
+                self._last_checks.pop(key, None)
+
+    def wait_for_reload(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait until the running background reloads have finished.
+        """
+        with self._lock:
+            threads = list(self._reloading.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def _get_handle(self, persist_dir: str) -> IndexHandle:
+        key = os.path.abspath(persist_dir)
+        with self._lock:
+            handle = self._handles.get(key)
+            now = time.monotonic()
+            if handle is not None and (
+                now - self._last_checks.get(key, 0) < self.check_interval
+                or key in self._reloading
+            ):
+                return handle
+            self._last_checks[key] = now
+        manifest = get_manifest(key)
+        if handle is None:
+            # Nothing to serve yet, load in the calling thread
+            handle = self._load(key, manifest)
+            with self._lock:
+                self._handles[key] = handle
+            return handle
+        if manifest != handle.manifest:
+            self._start_reload(key, manifest)
+        return handle
+
+    def _load(self, persist_dir: str, manifest: Optional[Manifest]) -> IndexHandle:
+        logger.info(f"Loading storage context from {persist_dir}...")
+        storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+        return IndexHandle(storage_context=storage_context, manifest=manifest or ())
+
+    def _start_reload(self, persist_dir: str, manifest: Optional[Manifest]) -> None:
+        def reload() -> None:
+            try:
+                handle = self._load(persist_dir, manifest)
+                # Load the index as well, so requests don't wait for it after the swap
+                handle.index = load_index_from_storage(handle.storage_context)
+                with self._lock:
+                    self._handles[persist_dir] = handle
+                logger.info(f"Reloaded index from {persist_dir}")
+            except Exception as e:
+                # E.g. the directory is being written, retry on the next check
+                logger.warning(f"Failed to reload index from {persist_dir}: {e}")
+            finally:
+                with self._lock:
+                    self._reloading.pop(persist_dir, None)
+
+        with self._lock:
+            if persist_dir in self._reloading:
+                return
+            thread = threading.Thread(target=reload, daemon=True)
+            self._reloading[persist_dir] = thread
+        thread.start()
+
+
+# Shared by the chat router and the tools, so an index is loaded only once per process
+index_cache = IndexCache()
+
 
-@cached(
-    TTLCache(maxsize=10, ttl=timedelta(minutes=5).total_seconds()),
-    key=lambda *args, **kwargs: "global_storage_context",
-)
 def get_storage_context(persist_dir: str) -> StorageContext:
-    return StorageContext.from_defaults(persist_dir=persist_dir)
+    return index_cache.get_storage_context(persist_dir)
+
+
+def get_index(persist_dir: str, **kwargs: Any) -> Optional[BaseIndex]:
+    return index_cache.get_index(persist_dir, **kwargs)
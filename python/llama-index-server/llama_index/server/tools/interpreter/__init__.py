@@ -0,0 +1,18 @@
+from .base import BaseCodeInterpreter, E2BToolOutput, InterpreterExtraResult
+from .e2b import E2BCodeInterpreter, E2BSandboxBackend
+from .local import LocalCodeInterpreter, LocalSandboxBackend, LocalToolOutput
+from .pool import PooledSandbox, SandboxBackend, SandboxPool
+
+__all__ = [
+    "BaseCodeInterpreter",
+    "E2BCodeInterpreter",
+    "E2BSandboxBackend",
+    "E2BToolOutput",
+    "InterpreterExtraResult",
+    "LocalCodeInterpreter",
+    "LocalSandboxBackend",
+    "LocalToolOutput",
+    "PooledSandbox",
+    "SandboxBackend",
+    "SandboxPool",
+]
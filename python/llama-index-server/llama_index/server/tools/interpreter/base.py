@@ -1,7 +1,9 @@
+import asyncio
 import base64
 import logging
 import os
 import uuid
+from abc import ABC, abstractmethod
 from typing import Any, List, Optional
 
 from pydantic import BaseModel
@@ -9,6 +11,7 @@ from pydantic import BaseModel
 from llama_index.core.tools import FunctionTool
 from llama_index.server.models.file import ServerFile
 from llama_index.server.services.file import FileService
+from llama_index.server.tools.interpreter.pool import PooledSandbox, SandboxPool
 
 logger = logging.getLogger("uvicorn")
 
@@ -28,72 +31,98 @@ class E2BToolOutput(BaseModel):
     retry_count: int = 0
 
 
-class E2BCodeInterpreter:
+class BaseCodeInterpreter(ABC):
+    """
+    A code interpreter tool that runs code in sandboxes from a SandboxPool.
+    Subclasses provide the pool and build the tool output.
+    """
+
     output_dir = "output/tools"
     uploaded_files_dir = "output/uploaded"
-    interpreter: Optional["Sandbox"] = None  # type: ignore # noqa: F821
+    interpreter: Optional[PooledSandbox] = None
+    # Prefix for the names of the files created from the execution results
+    output_file_prefix = "interpreter_file"
 
     def __init__(
         self,
-        api_key: str,
+        pool: SandboxPool,
+        owns_pool: bool,
         output_dir: Optional[str] = None,
         uploaded_files_dir: Optional[str] = None,
     ):
         """
         Args:
-            api_key: The API key for the E2B Code Interpreter.
+            pool: The pool to get sandboxes from.
+            owns_pool: Whether the pool is private to this interpreter. The sandbox of a private pool
+                is killed when the interpreter is closed instead of being given back.
             output_dir: The directory for the output files. Default is `output/tools`.
             uploaded_files_dir: The directory for the files to be uploaded to the sandbox. Default is `output/uploaded`.
         """
-        self._validate_package()
-        if not api_key:
-            raise ValueError(
-                "api_key is required to run code interpreter. Get it here: https://e2b.dev/docs/getting-started/api-key"
-            )
-        self.api_key = api_key
+        self.pool = pool
+        self._owns_pool = owns_pool
         self.output_dir = output_dir or "output/tools"
         self.uploaded_files_dir = uploaded_files_dir or "output/uploaded"
 
+    @abstractmethod
+    def _create_output(self, **kwargs: Any) -> E2BToolOutput:
+        """
+        Create the tool output, `logs` is None if there are no execution logs.
+        """
+
     @classmethod
     def _validate_package(cls) -> None:
-        try:
-            from e2b_code_interpreter import Sandbox  # noqa: F401
-            from e2b_code_interpreter.models import Logs  # noqa: F401
-        except ImportError:
-            raise ImportError(
-                "e2b_code_interpreter is not installed. Please install it using `pip install e2b-code-interpreter`."
-            )
+        pass
 
     def __del__(self) -> None:
         """
-        Kill the interpreter when the tool is no longer in use.
+        Give the sandbox back to the pool when the tool is no longer in use.
+        """
+        self.close()
+
+    def close(self) -> None:
+        """
+        Release the sandbox of this interpreter so it can be reused by others.
+        The sandbox is killed if the pool is not shared.
         """
         if self.interpreter is not None:
-            self.interpreter.kill()
+            interpreter, self.interpreter = self.interpreter, None
+            try:
+                if self._owns_pool:
+                    self.pool.discard(interpreter)
+                else:
+                    self.pool.release(interpreter)
+            except Exception as e:
+                logger.warning(f"Failed to release sandbox: {e}")
 
     def _init_interpreter(self, sandbox_files: List[str] = []) -> None:
         """
-        Lazily initialize the interpreter.
+        Acquire a sandbox from the pool (once) and upload the files that are not there yet.
         """
-        from e2b_code_interpreter import Sandbox
-
-        logger.info(f"Initializing interpreter with {len(sandbox_files)} files")
-        self.interpreter = Sandbox(api_key=self.api_key)
+        if self.interpreter is not None and not self.interpreter.is_alive():
+            self.pool.discard(self.interpreter)
+            self.interpreter = None
+        if self.interpreter is None:
+            logger.info("Acquiring sandbox for interpreter")
+            self.interpreter = self.pool.acquire()
         if len(sandbox_files) > 0:
-            for file_path in sandbox_files:
-                file_name = os.path.basename(file_path)
-                local_file_path = os.path.join(self.uploaded_files_dir, file_name)
-                with open(local_file_path, "rb") as f:
-                    content = f.read()
-                    if self.interpreter and self.interpreter.files:
-                        self.interpreter.files.write(file_path, content)
-            logger.info(f"Uploaded {len(sandbox_files)} files to sandbox")
+            self.pool.upload_files(
+                self.interpreter,
+                [
+                    (
+                        os.path.join(
+                            self.uploaded_files_dir, os.path.basename(file_path)
+                        ),
+                        file_path,
+                    )
+                    for file_path in sandbox_files
+                ],
+            )
 
     def _save_to_disk(self, base64_data: str, ext: str) -> ServerFile:
         buffer = base64.b64decode(base64_data)
 
-        # Output from e2b doesn't have a name. Create a random name for it.
-        filename = f"e2b_file_{uuid.uuid4()}.{ext}"
+        # Output from the interpreter doesn't have a name. Create a random name for it.
+        filename = f"{self.output_file_prefix}_{uuid.uuid4()}.{ext}"
 
         return FileService.save_file(
             buffer, file_name=filename, save_dir=self.output_dir
@@ -137,7 +166,7 @@ class E2BCodeInterpreter:
                     )
         except Exception as error:
             logger.exception(error, exc_info=True)
-            logger.error("Error when parsing output from E2b interpreter tool", error)
+            logger.error("Error when parsing output from interpreter tool", error)
 
         return output
 
@@ -157,23 +186,15 @@ class E2BCodeInterpreter:
             sandbox_files (List[str]): List of local file paths to be used by the code. The tool will throw an error if a file is not found.
             retry_count (int): Number of times the tool has been retried.
         """
-        from e2b_code_interpreter.models import Logs
-
         if retry_count > 2:
-            return E2BToolOutput(
+            return self._create_output(
                 is_error=True,
-                logs=Logs(
-                    stdout="",
-                    stderr="",
-                    display_data="",
-                    error="",
-                ),
+                logs=None,
                 error_message="Failed to execute the code after 3 retries. Explain the error to the user and suggest a fix.",
                 retry_count=retry_count,
             )
 
-        if self.interpreter is None:
-            self._init_interpreter(sandbox_files)
+        self._init_interpreter(sandbox_files)
 
         if self.interpreter:
             logger.info(
@@ -184,14 +205,12 @@ class E2BCodeInterpreter:
             if exec.error:
                 error_message = f"The code failed to execute successfully. Error: {exec.error}. Try to fix the code and run again."
                 logger.error(error_message)
-                # Calling the generated code caused an error. Kill the interpreter and return the error to the LLM so it can try to fix the error
-                try:
-                    self.interpreter.kill()  # type: ignore
-                except Exception:
-                    pass
-                finally:
+                # Calling the generated code caused an error. Reset the kernel (keeping the sandbox
+                # and its files) and return the error to the LLM so it can try to fix the error.
+                # If the reset fails, the pool discards the sandbox and a new one is acquired on the next call.
+                if not self.pool.reset(self.interpreter):
                     self.interpreter = None
-                output = E2BToolOutput(
+                output = self._create_output(
                     is_error=True,
                     logs=exec.logs,
                     results=[],
@@ -200,10 +219,12 @@ class E2BCodeInterpreter:
                 )
             else:
                 if len(exec.results) == 0:
-                    output = E2BToolOutput(is_error=False, logs=exec.logs, results=[])
+                    output = self._create_output(
+                        is_error=False, logs=exec.logs, results=[]
+                    )
                 else:
                     results = self._parse_result(exec.results[0])
-                    output = E2BToolOutput(
+                    output = self._create_output(
                         is_error=False,
                         logs=exec.logs,
                         results=results,
@@ -213,6 +234,25 @@ class E2BCodeInterpreter:
         else:
             raise ValueError("Interpreter is not initialized.")
 
+    async def ainterpret(
+        self,
+        code: str,
+        sandbox_files: List[str] = [],
+        retry_count: int = 0,
+    ) -> E2BToolOutput:
+        """
+        Execute Python code in a Jupyter notebook cell. The tool will return the result, stdout, stderr, display_data, and error.
+        If the code needs to use a file, ALWAYS pass the file path in the sandbox_files argument.
+        You have a maximum of 3 retries to get the code to run successfully.
+
+        Parameters:
+            code (str): The Python code to be executed in a single cell.
+            sandbox_files (List[str]): List of local file paths to be used by the code. The tool will throw an error if a file is not found.
+            retry_count (int): Number of times the tool has been retried.
+        """
+        # The sandbox calls are blocking, run them in a worker thread to not block the event loop
+        return await asyncio.to_thread(self.interpret, code, sandbox_files, retry_count)
+
     def to_tool(self) -> FunctionTool:
         self._validate_package()
-        return FunctionTool.from_defaults(self.interpret)
+        return FunctionTool.from_defaults(fn=self.interpret, async_fn=self.ainterpret)
@@ -0,0 +1,141 @@
+import logging
+import time
+from typing import Any, Optional
+
+from llama_index.server.tools.interpreter.base import (
+    BaseCodeInterpreter,
+    E2BToolOutput,
+    InterpreterExtraResult,  # noqa: F401
+)
+from llama_index.server.tools.interpreter.pool import (
+    PooledSandbox,
+    SandboxBackend,
+    SandboxPool,
+)
+
+logger = logging.getLogger("uvicorn")
+
+
+class E2BSandbox(PooledSandbox):
+    """
+    Wrap an E2B sandbox so it can be managed by a SandboxPool.
+    """
+
+    def __init__(self, sandbox: "Sandbox", timeout: int):  # type: ignore # noqa: F821
+        super().__init__()
+        self.sandbox = sandbox
+        # E2B kills the sandbox after `timeout` seconds, keep a margin to finish the last execution
+        self.expires_at = time.monotonic() + timeout - 30
+        # The code context to run the code in, None means the default context
+        self.context: Optional[Any] = None
+
+    def run_code(self, code: str) -> Any:
+        if self.context is None:
+            return self.sandbox.run_code(code)
+        return self.sandbox.run_code(code, context=self.context)
+
+    def write_file(self, path: str, content: bytes) -> None:
+        self.sandbox.files.write(path, content)
+
+    def reset(self) -> None:
+        # A fresh kernel in the same sandbox is much faster than creating a new sandbox.
+        # The sandbox keeps one code context, the previous kernel is never left running.
+        if self.context is None:
+            self.context = self.sandbox.create_code_context()
+            return
+        restart = getattr(self.sandbox, "restart_code_context", None)
+        if restart is not None:
+            restart(self.context)
+            return
+        remove = getattr(self.sandbox, "remove_code_context", None)
+        if remove is not None:
+            remove(self.context)
+            self.context = self.sandbox.create_code_context()
+            return
+        # Older SDKs can't stop a context, clear the state of its kernel instead
+        execution = self.run_code("%reset -f")
+        if getattr(execution, "error", None):
+            raise RuntimeError(f"Failed to reset the code context: {execution.error}")
+
+    def kill(self) -> None:
+        self.sandbox.kill()
+
+    def is_alive(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class E2BSandboxBackend(SandboxBackend):
+    """
+    Create sandboxes using the E2B Code Interpreter service.
+    """
+
+    def __init__(self, api_key: str, timeout: int = 300):
+        """
+        Args:
+            api_key: The API key for the E2B Code Interpreter.
+            timeout: The lifetime of a sandbox in seconds. Default is 300.
+        """
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def create_sandbox(self) -> E2BSandbox:
+        from e2b_code_interpreter import Sandbox
+
+        return E2BSandbox(
+            Sandbox(api_key=self.api_key, timeout=self.timeout), timeout=self.timeout
+        )
+
+
+class E2BCodeInterpreter(BaseCodeInterpreter):
+    output_file_prefix = "e2b_file"
+
+    def __init__(
+        self,
+        api_key: str,
+        output_dir: Optional[str] = None,
+        uploaded_files_dir: Optional[str] = None,
+        pool: Optional[SandboxPool] = None,
+    ):
+        """
+        Args:
+            api_key: The API key for the E2B Code Interpreter.
+            output_dir: The directory for the output files. Default is `output/tools`.
+            uploaded_files_dir: The directory for the files to be uploaded to the sandbox. Default is `output/uploaded`.
+            pool: The pool to get sandboxes from. Share a pool between interpreters to reuse pre-warmed sandboxes.
+                Default is a private pool that creates a sandbox on the first call.
+        """
+        self._validate_package()
+        if not api_key:
+            raise ValueError(
+                "api_key is required to run code interpreter. Get it here: https://e2b.dev/docs/getting-started/api-key"
+            )
+        self.api_key = api_key
+        super().__init__(
+            pool=pool
+            or SandboxPool(E2BSandboxBackend(api_key), min_size=0, max_size=1),
+            owns_pool=pool is None,
+            output_dir=output_dir,
+            uploaded_files_dir=uploaded_files_dir,
+        )
+
+    @classmethod
+    def _validate_package(cls) -> None:
+        try:
+            from e2b_code_interpreter import Sandbox  # noqa: F401
+            from e2b_code_interpreter.models import Logs  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "e2b_code_interpreter is not installed. Please install it using `pip install e2b-code-interpreter`."
+            )
+
+    def _create_output(self, **kwargs: Any) -> E2BToolOutput:
+        from e2b_code_interpreter.models import Logs
+
+        if kwargs.get("logs") is None:
+            kwargs["logs"] = Logs(
+                stdout="",
+                stderr="",
+                display_data="",
+                error="",
+            )
+        return E2BToolOutput(**kwargs)
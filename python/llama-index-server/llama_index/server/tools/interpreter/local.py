@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+from llama_index.server.tools.interpreter.base import (
+    BaseCodeInterpreter,
+    E2BToolOutput,
+)
+from llama_index.server.tools.interpreter.pool import (
+    PooledSandbox,
+    SandboxBackend,
+    SandboxPool,
+)
+
+logger = logging.getLogger("uvicorn")
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+
+
+class ExecutionLogs(BaseModel):
+    stdout: List[str] = []
+    stderr: List[str] = []
+
+
+class ExecutionError(BaseModel):
+    name: str
+    value: str
+    traceback: str = ""
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.value}"
+
+
+class ExecutionResult:
+    """
+    A result of a code execution with one entry per format, e.g. `text` or `png` (base64 encoded).
+    Mirrors the `formats()` and item access of the E2B result.
+    """
+
+    def __init__(self, data: Dict[str, str]):
+        self.data = data
+
+    def formats(self) -> List[str]:
+        return list(self.data.keys())
+
+    def __getitem__(self, key: str) -> str:
+        return self.data[key]
+
+
+class Execution(BaseModel):
+    results: List[ExecutionResult] = []
+    logs: ExecutionLogs = ExecutionLogs()
+    error: Optional[ExecutionError] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+
+class LocalSandbox(PooledSandbox):
+    """
+    A sandbox that runs code in a persistent Python subprocess on the local machine.
+    Files are written to a working directory that is used as the current directory of the process.
+
+    Note: the subprocess is not isolated from the host, only use it for trusted code.
+    """
+
+    def __init__(
+        self,
+        python_executable: Optional[str] = None,
+        workdir: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cpu_time_limit: Optional[float] = None,
+        memory_limit_mb: Optional[int] = None,
+        preload_modules: Optional[List[str]] = None,
+        startup_timeout: float = 60,
+    ):
+        super().__init__()
+        self.timeout = timeout
+        self._owns_workdir = workdir is None
+        self.workdir = os.path.abspath(
+            workdir or tempfile.mkdtemp(prefix="llama_sandbox_")
+        )
+        os.makedirs(self.workdir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._responses: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        command = [python_executable or sys.executable, "-u", WORKER_PATH]
+        if cpu_time_limit is not None:
+            command += ["--cpu-time-limit", str(cpu_time_limit)]
+        if memory_limit_mb is not None:
+            command += ["--memory-limit-mb", str(memory_limit_mb)]
+        if preload_modules:
+            command += ["--preload", ",".join(preload_modules)]
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=self.workdir,
+            # Render matplotlib figures without a display
+            env={**os.environ, "MPLBACKEND": "Agg"},
+            text=True,
+            encoding="utf-8",
+        )
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+        self._wait_for_response(startup_timeout)
+
+    def is_alive(self) -> bool:
+        return self._process.poll() is None
+
+    def run_code(self, code: str) -> Execution:
+        try:
+            response = self._request({"op": "run", "code": code}, self.timeout)
+        except TimeoutError:
+            # The process is stuck, the only way to stop it is to kill it
+            self.kill()
+            return Execution(
+                error=ExecutionError(
+                    name="TimeoutError",
+                    value=f"Execution timed out after {self.timeout} seconds",
+                )
+            )
+        return Execution(
+            results=[ExecutionResult(result) for result in response["results"]],
+            logs=ExecutionLogs(stdout=response["stdout"], stderr=response["stderr"]),
+            error=(ExecutionError(**response["error"]) if response["error"] else None),
+        )
+
+    def write_file(self, path: str, content: bytes) -> None:
+        file_path = self.resolve_path(path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(content)
+
+    def resolve_path(self, path: str) -> str:
+        """
+        Map a sandbox path to a local path inside the working directory.
+        """
+        file_path = os.path.normpath(os.path.join(self.workdir, path.lstrip("/\\")))
+        if os.path.commonpath([self.workdir, file_path]) != self.workdir:
+            raise ValueError(f"Path {path} is outside of the sandbox")
+        return file_path
+
+    def reset(self) -> None:
+        self._request({"op": "reset"}, self.timeout)
+
+    def kill(self) -> None:
+        if self.is_alive():
+            self._process.kill()
+            self._process.wait()
+        if self._owns_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _request(
+        self, payload: Dict[str, Any], timeout: Optional[float]
+    ) -> Dict[str, Any]:
+        with self._lock:
+            if not self.is_alive() or self._process.stdin is None:
+                raise RuntimeError("Sandbox process is not running")
+            self._process.stdin.write(json.dumps(payload) + "\n")
+            self._process.stdin.flush()
+            return self._wait_for_response(timeout)
+
+    def _wait_for_response(self, timeout: Optional[float]) -> Dict[str, Any]:
+        try:
+            response = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for the sandbox process")
+        if response is None:
+            raise RuntimeError("Sandbox process exited unexpectedly")
+        return response
+
+    def _read_responses(self) -> None:
+        assert self._process.stdout is not None
+        for line in self._process.stdout:
+            self._responses.put(json.loads(line))
+        # Unblock any waiting request when the process exits
+        self._responses.put(None)
+
+
+class LocalSandboxBackend(SandboxBackend):
+    """
+    Create sandboxes that run code in local Python subprocesses.
+    Useful for testing and benchmarking without network access.
+    """
+
+    def __init__(
+        self,
+        python_executable: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cpu_time_limit: Optional[float] = None,
+        memory_limit_mb: Optional[int] = None,
+        preload_modules: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            python_executable: The Python interpreter for the worker processes. Default is the current one.
+            timeout: The maximum wall-clock time in seconds for a single code execution.
+                The worker is killed when it's exceeded. Default is no limit.
+            cpu_time_limit: The maximum CPU time in seconds for a single code execution (POSIX only). Default is no limit.
+            memory_limit_mb: The maximum address space of a worker process in MB (POSIX only). Default is no limit.
+            preload_modules: Modules to import when a worker starts, e.g. `["pandas"]`. Default is none.
+        """
+        self.python_executable = python_executable
+        self.timeout = timeout
+        self.cpu_time_limit = cpu_time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.preload_modules = preload_modules
+
+    @property
+    def config_key(self) -> Tuple[Any, ...]:
+        """
+        A key that identifies the configuration of the created sandboxes.
+        """
+        return (
+            self.python_executable,
+            self.timeout,
+            self.cpu_time_limit,
+            self.memory_limit_mb,
+            tuple(self.preload_modules or []),
+        )
+
+    def create_sandbox(self) -> LocalSandbox:
+        return LocalSandbox(
+            python_executable=self.python_executable,
+            timeout=self.timeout,
+            cpu_time_limit=self.cpu_time_limit,
+            memory_limit_mb=self.memory_limit_mb,
+            preload_modules=self.preload_modules,
+        )
+
+
+# Pools shared by all local interpreters with the same configuration
+_shared_pools: Dict[Tuple[Any, ...], SandboxPool] = {}
+_shared_pools_lock = threading.Lock()
+
+
+def get_shared_pool(
+    backend: LocalSandboxBackend, min_size: int = 1, max_size: int = 4
+) -> SandboxPool:
+    """
+    Get the process-wide pool for the configuration of the backend, creating it if needed.
+    """
+    with _shared_pools_lock:
+        pool = _shared_pools.get(backend.config_key)
+        if pool is None:
+            pool = SandboxPool(backend, min_size=min_size, max_size=max_size)
+            _shared_pools[backend.config_key] = pool
+        return pool
+
+
+class LocalToolOutput(E2BToolOutput):
+    logs: ExecutionLogs
+
+
+class LocalCodeInterpreter(BaseCodeInterpreter):
+    """
+    A code interpreter that runs code in persistent Python worker processes on the local machine,
+    without network access. It returns the same output as the E2BCodeInterpreter.
+
+    Each interpreter keeps its worker (and the variables) between calls. Workers come from a pool
+    shared by all interpreters with the same configuration, so a new interpreter gets a warm
+    worker instead of starting a new Python process.
+
+    Note: the code runs with the permissions of the server process, only use it for trusted deployments.
+    """
+
+    output_file_prefix = "interpreter_file"
+
+    def __init__(
+        self,
+        output_dir: Optional[str] = None,
+        uploaded_files_dir: Optional[str] = None,
+        pool: Optional[SandboxPool] = None,
+        timeout: Optional[float] = 120,
+        cpu_time_limit: Optional[float] = 60,
+        memory_limit_mb: Optional[int] = None,
+        preload_modules: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            output_dir: The directory for the output files. Default is `output/tools`.
+            uploaded_files_dir: The directory for the files to be uploaded to the sandbox. Default is `output/uploaded`.
+            pool: The pool to get workers from. Default is the shared pool for the given limits.
+            timeout: The maximum wall-clock time in seconds for a single code execution. Default is 120.
+            cpu_time_limit: The maximum CPU time in seconds for a single code execution. Default is 60.
+            memory_limit_mb: The maximum memory of a worker process in MB. Default is no limit.
+            preload_modules: Modules to import when a worker starts, e.g. `["pandas", "matplotlib.pyplot"]`.
+        """
+        if pool is None:
+            pool = get_shared_pool(
+                LocalSandboxBackend(
+                    timeout=timeout,
+                    cpu_time_limit=cpu_time_limit,
+                    memory_limit_mb=memory_limit_mb,
+                    preload_modules=preload_modules,
+                )
+            )
+        super().__init__(
+            pool=pool,
+            owns_pool=False,
+            output_dir=output_dir,
+            uploaded_files_dir=uploaded_files_dir,
+        )
+
+    def _create_output(self, **kwargs: Any) -> E2BToolOutput:
+        if kwargs.get("logs") is None:
+            kwargs["logs"] = ExecutionLogs()
+        return LocalToolOutput(**kwargs)
@@ -0,0 +1,307 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("uvicorn")
+
+
+class PooledSandbox(ABC):
+    """
+    A code execution sandbox that can be managed by a SandboxPool.
+    """
+
+    def __init__(self) -> None:
+        # Digest of every file synced to the sandbox, keyed by sandbox path
+        self.synced_files: Dict[str, str] = {}
+
+    @abstractmethod
+    def run_code(self, code: str) -> Any:
+        """
+        Run the code and return an execution object with `error`, `logs` and `results`.
+        """
+
+    @abstractmethod
+    def write_file(self, path: str, content: bytes) -> None:
+        """
+        Write a file to the sandbox file system.
+        """
+
+    @abstractmethod
+    def reset(self) -> None:
+        """
+        Reset the interpreter state (variables, imports) but keep the sandbox alive.
+        Files written to the sandbox are kept.
+        """
+
+    @abstractmethod
+    def kill(self) -> None:
+        """
+        Shut the sandbox down.
+        """
+
+    def is_alive(self) -> bool:
+        return True
+
+
+class SandboxBackend(ABC):
+    """
+    Creates sandboxes for a SandboxPool.
+    """
+
+    @abstractmethod
+    def create_sandbox(self) -> PooledSandbox:
+        """
+        Create and start a new sandbox.
+        """
+
+
+class FileDigestCache:
+    """
+    Cache the SHA-256 digest of local files keyed by (path, mtime, size),
+    so unchanged files are not re-read to decide whether they need to be synced.
+    """
+
+    def __init__(self) -> None:
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def digest(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        with self._lock:
+            cached = self._digests.get(file_path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._digests[file_path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+
+class SandboxPool:
+    """
+    A thread-safe pool of pre-warmed sandboxes.
+
+    Sandboxes are created by the given backend, handed out with `acquire` and given back
+    with `release`. Released sandboxes are reset (not killed) so they can be reused by the
+    next caller. The blocking calls have async variants that run in a worker thread.
+    """
+
+    def __init__(
+        self,
+        backend: SandboxBackend,
+        min_size: int = 1,
+        max_size: int = 4,
+        prewarm: bool = True,
+    ):
+        """
+        Args:
+            backend: The backend used to create sandboxes.
+            min_size: The number of idle sandboxes to keep warm. Default is 1.
+            max_size: The maximum number of sandboxes (idle and in use). Default is 4.
+            prewarm: Whether to start creating `min_size` sandboxes in the background right away.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(
+                "Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1"
+            )
+        self.backend = backend
+        self.min_size = min_size
+        self.max_size = max_size
+        self._idle: Deque[PooledSandbox] = deque()
+        # Number of sandboxes that are idle, in use or being created
+        self._total = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self.digest_cache = FileDigestCache()
+        if prewarm and min_size > 0:
+            self._warm_up_in_background()
+
+    @property
+    def idle_count(self) -> int:
+        with self._condition:
+            return len(self._idle)
+
+    @property
+    def size(self) -> int:
+        with self._condition:
+            return self._total
+
+    def warm_up(self) -> None:
+        """
+        Create sandboxes until there are at least `min_size` idle ones.
+        """
+        while True:
+            with self._condition:
+                if (
+                    self._closed
+                    or len(self._idle) >= self.min_size
+                    or self._total >= self.max_size
+                ):
+                    return
+                self._total += 1
+            sandbox = self._create()
+            if sandbox is None:
+                return
+            self._put_idle(sandbox)
+
+    async def awarm_up(self) -> None:
+        await asyncio.to_thread(self.warm_up)
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledSandbox:
+        """
+        Get a sandbox from the pool, creating a new one if none is idle and the pool is not full.
+        Blocks until a sandbox is available or the timeout expires.
+        """
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Sandbox pool is closed")
+                while self._idle:
+                    sandbox = self._idle.popleft()
+                    if sandbox.is_alive():
+                        self._warm_up_in_background()
+                        return sandbox
+                    # The sandbox died while idle (e.g. timed out), drop it
+                    self._total -= 1
+                if self._total < self.max_size:
+                    self._total += 1
+                    break
+                if not self._condition.wait(timeout=timeout):
+                    raise TimeoutError("Timed out waiting for a sandbox")
+        created = self._create()
+        if created is None:
+            raise RuntimeError("Failed to create a sandbox")
+        return created
+
+    async def aacquire(self, timeout: Optional[float] = None) -> PooledSandbox:
+        return await asyncio.to_thread(self.acquire, timeout)
+
+    def release(self, sandbox: PooledSandbox, reset: bool = True) -> None:
+        """
+        Give a sandbox back to the pool.
+
+        Args:
+            sandbox: The sandbox to release.
+            reset: Whether to reset the interpreter state before the sandbox is reused.
+        """
+        if reset and not self._reset(sandbox):
+            return
+        with self._condition:
+            closed = self._closed
+        if closed or not sandbox.is_alive():
+            self.discard(sandbox)
+            return
+        self._put_idle(sandbox)
+
+    async def arelease(self, sandbox: PooledSandbox, reset: bool = True) -> None:
+        await asyncio.to_thread(self.release, sandbox, reset)
+
+    def discard(self, sandbox: PooledSandbox) -> None:
+        """
+        Kill a sandbox and remove it from the pool.
+        """
+        try:
+            sandbox.kill()
+        except Exception as e:
+            logger.warning(f"Failed to kill sandbox: {e}")
+        with self._condition:
+            self._total -= 1
+            self._condition.notify()
+
+    def reset(self, sandbox: PooledSandbox) -> bool:
+        """
+        Reset the interpreter state of an acquired sandbox.
+        If the reset fails the sandbox is discarded and False is returned.
+        """
+        return self._reset(sandbox)
+
+    async def areset(self, sandbox: PooledSandbox) -> bool:
+        return await asyncio.to_thread(self.reset, sandbox)
+
+    def upload_files(self, sandbox: PooledSandbox, files: List[Tuple[str, str]]) -> int:
+        """
+        Upload local files to the sandbox, skipping files whose content is already there.
+
+        Args:
+            sandbox: The target sandbox.
+            files: A list of (local path, sandbox path) pairs.
+        Returns:
+            The number of files that were uploaded.
+        """
+        uploaded = 0
+        for local_path, sandbox_path in files:
+            digest = self.digest_cache.digest(local_path)
+            if sandbox.synced_files.get(sandbox_path) == digest:
+                continue
+            with open(local_path, "rb") as f:
+                sandbox.write_file(sandbox_path, f.read())
+            sandbox.synced_files[sandbox_path] = digest
+            uploaded += 1
+        if uploaded > 0:
+            logger.info(f"Uploaded {uploaded} of {len(files)} files to sandbox")
+        return uploaded
+
+    async def aupload_files(
+        self, sandbox: PooledSandbox, files: List[Tuple[str, str]]
+    ) -> int:
+        return await asyncio.to_thread(self.upload_files, sandbox, files)
+
+    def close(self) -> None:
+        """
+        Kill all idle sandboxes. Sandboxes that are in use are killed when they are released.
+        """
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+        for sandbox in idle:
+            self.discard(sandbox)
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.close)
+
+    def _create(self) -> Optional[PooledSandbox]:
+        """
+        Create a sandbox for a slot that has already been counted in `_total`.
+        """
+        try:
+            return self.backend.create_sandbox()
+        except Exception as e:
+            logger.error(f"Failed to create sandbox: {e}")
+            with self._condition:
+                self._total -= 1
+                self._condition.notify()
+            return None
+
+    def _reset(self, sandbox: PooledSandbox) -> bool:
+        try:
+            sandbox.reset()
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to reset sandbox, discarding it: {e}")
+            self.discard(sandbox)
+            return False
+
+    def _put_idle(self, sandbox: PooledSandbox) -> None:
+        with self._condition:
+            if not self._closed:
+                self._idle.append(sandbox)
+                self._condition.notify()
+                return
+        self.discard(sandbox)
+
+    def _warm_up_in_background(self) -> None:
+        with self._condition:
+            if self._closed or len(self._idle) >= self.min_size:
+                return
+        threading.Thread(target=self.warm_up, daemon=True).start()
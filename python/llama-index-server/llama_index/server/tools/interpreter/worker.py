@@ -0,0 +1,213 @@
+"""
+A persistent Python worker used by the local sandbox backend.
+
+The worker reads one JSON request per line from stdin and writes one JSON response per
+line to stdout. It keeps a single namespace between requests, like a notebook kernel.
+This file runs in a separate interpreter and must only depend on the standard library.
+"""
+
+import argparse
+import ast
+import base64
+import builtins
+import contextlib
+import importlib
+import io
+import json
+import os
+import signal
+import sys
+import traceback
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+# Rich representations to collect from the value of the last expression
+REPR_METHODS = [
+    ("png", "_repr_png_"),
+    ("jpeg", "_repr_jpeg_"),
+    ("svg", "_repr_svg_"),
+    ("html", "_repr_html_"),
+    ("markdown", "_repr_markdown_"),
+    ("latex", "_repr_latex_"),
+]
+# Formats that are saved as files, they are sent base64 encoded
+BINARY_FORMATS = {"png", "jpeg", "svg", "pdf"}
+
+
+class CPUTimeLimitExceeded(Exception):
+    pass
+
+
+def _on_cpu_time_limit(signum: int, frame: Any) -> None:
+    raise CPUTimeLimitExceeded("CPU time limit exceeded")
+
+
+def _new_namespace() -> Dict[str, Any]:
+    return {"__name__": "__main__", "__builtins__": builtins}
+
+
+def _encode(fmt: str, data: Any) -> str:
+    if fmt in BINARY_FORMATS:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return base64.b64encode(data).decode("ascii")
+    return str(data)
+
+
+def _format_value(value: Any) -> Dict[str, str]:
+    data = {"text": repr(value)}
+    for fmt, method_name in REPR_METHODS:
+        method = getattr(value, method_name, None)
+        if not callable(method):
+            continue
+        try:
+            output = method()
+        except Exception:
+            continue
+        # Some objects return a (data, metadata) tuple
+        if isinstance(output, tuple):
+            output = output[0]
+        if output is not None:
+            data[fmt] = _encode(fmt, output)
+    return data
+
+
+def _collect_figures() -> List[Dict[str, str]]:
+    """
+    Render the open matplotlib figures (e.g. from `plt.show()`) and close them.
+    """
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is None:
+        return []
+    results = []
+    for number in pyplot.get_fignums():
+        figure = pyplot.figure(number)
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format="png", bbox_inches="tight")
+        results.append({"text": repr(figure), "png": _encode("png", buffer.getvalue())})
+    pyplot.close("all")
+    return results
+
+
+@contextlib.contextmanager
+def _cpu_time_limit(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Limit the CPU time of the code that runs in the context.
+    The soft limit is relative to the CPU time already used by this (persistent) process.
+    """
+    if seconds is None or resource is None:
+        yield
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(used + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def _run(
+    code: str, namespace: Dict[str, Any], cpu_time_limit: Optional[float]
+) -> Dict[str, Any]:
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    results: List[Dict[str, str]] = []
+    error: Optional[Dict[str, str]] = None
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            with _cpu_time_limit(cpu_time_limit):
+                tree = ast.parse(code, mode="exec")
+                # Evaluate the last expression separately to return its value, like a notebook cell
+                last_expr = None
+                if tree.body and isinstance(tree.body[-1], ast.Expr):
+                    last = tree.body.pop()
+                    assert isinstance(last, ast.Expr)
+                    last_expr = ast.Expression(body=last.value)
+                exec(compile(tree, "<cell>", "exec"), namespace)
+                value = None
+                if last_expr is not None:
+                    value = eval(compile(last_expr, "<cell>", "eval"), namespace)
+                results.extend(_collect_figures())
+                if value is not None:
+                    results.append(_format_value(value))
+        except BaseException as e:
+            error = {
+                "name": type(e).__name__,
+                "value": str(e),
+                "traceback": traceback.format_exc(),
+            }
+    return {
+        "stdout": stdout.getvalue().splitlines(keepends=True),
+        "stderr": stderr.getvalue().splitlines(keepends=True),
+        "results": results,
+        "error": error,
+    }
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--memory-limit-mb", type=int, default=None)
+    parser.add_argument("--cpu-time-limit", type=float, default=None)
+    parser.add_argument("--preload", default="")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+
+    # Keep the original stdin/stdout for the protocol so the executed code can't read
+    # requests or corrupt responses. Other output written to the stdout file descriptor
+    # (e.g. by subprocesses) goes to stderr instead.
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_cpu_time_limit)
+        if args.memory_limit_mb:
+            limit = args.memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    # Import heavy modules once, so the executed code doesn't pay for it
+    preload: List[str] = [name for name in args.preload.split(",") if name]
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+    namespace = _new_namespace()
+    protocol.write(json.dumps({"status": "ready"}) + "\n")
+    protocol.flush()
+
+    for line in requests:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        op = request.get("op")
+        if op == "run":
+            response = _run(request["code"], namespace, args.cpu_time_limit)
+        elif op == "reset":
+            # Imported modules stay in sys.modules, so they are fast to import again
+            namespace = _new_namespace()
+            response = {"status": "ok"}
+        else:
+            response = {"status": "error", "message": f"Unknown operation: {op}"}
+        protocol.write(json.dumps(response) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
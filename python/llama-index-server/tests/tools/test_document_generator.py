@@ -1,9 +1,11 @@
+import os
 from io import BytesIO
 from unittest.mock import MagicMock, patch
 
 import pytest
 from llama_index.server.tools.document_generator import (
     OUTPUT_DIR,
+    DocumentType,
     DocumentGenerator,
 )
 
@@ -87,3 +89,138 @@ class TestDocumentGenerator:
             DocumentGenerator("/api/files").generate_document(
                 "# Test", "invalid", "test-doc"
             )
+
+
+class TestDocumentGeneratorRendering:
+    @pytest.fixture(autouse=True)
+    def output_dir(self, tmp_path, monkeypatch):  # type: ignore
+        # Documents are written relative to the working directory
+        monkeypatch.chdir(tmp_path)
+        return tmp_path / OUTPUT_DIR
+
+    def test_generate_document_uses_cache(self, output_dir) -> None:  # type: ignore
+        generator = DocumentGenerator("/api/files")
+        generator.generate_document("# Report", "html", "first")
+
+        with patch.object(
+            DocumentGenerator, "_generate_html_content"
+        ) as mock_generate_html_content:
+            url = generator.generate_document("# Report", "html", "second")
+
+        mock_generate_html_content.assert_not_called()
+        assert url == f"/api/files/{OUTPUT_DIR}/second.html"
+        assert (output_dir / "second.html").read_bytes() == (
+            output_dir / "first.html"
+        ).read_bytes()
+
+    def test_cache_evicts_least_recently_used(self, output_dir) -> None:  # type: ignore
+        generator = DocumentGenerator("/api/files", max_cache_entries=2)
+        cache_dir = output_dir / ".cache"
+        generator.generate_document("# First", "html", "first")
+        generator.generate_document("# Second", "html", "second")
+        first_key = DocumentGenerator._get_cache_key("# First", DocumentType.HTML)
+        # Make the first document the least recently used, then use it again
+        os.utime(cache_dir / f"{first_key}.html", (0, 0))
+        generator.generate_document("# First", "html", "first-again")
+        generator.generate_document("# Third", "html", "third")
+
+        cached = sorted(path.name for path in cache_dir.iterdir())
+        assert len(cached) == 2
+        assert f"{first_key}.html" in cached
+
+    def test_cache_size_limit(self, output_dir) -> None:  # type: ignore
+        generator = DocumentGenerator("/api/files", max_cache_bytes=1)
+        generator.generate_document("# Report", "html", "report")
+
+        assert list((output_dir / ".cache").iterdir()) == []
+
+    def test_cache_key(self) -> None:
+        key = DocumentGenerator._get_cache_key("# Report", DocumentType.HTML)
+        assert key == DocumentGenerator._get_cache_key("# Report", DocumentType.HTML)
+        assert key != DocumentGenerator._get_cache_key("# Other", DocumentType.HTML)
+        assert key != DocumentGenerator._get_cache_key("# Report", DocumentType.PDF)
+
+    def test_generate_document_without_cache(self, output_dir) -> None:  # type: ignore
+        generator = DocumentGenerator("/api/files", use_cache=False)
+        generator.generate_document("# Report", "html", "report")
+
+        with patch.object(
+            DocumentGenerator,
+            "_generate_html_content",
+            return_value="<h1>Changed</h1>",
+        ):
+            generator.generate_document("# Report", "html", "report")
+
+        assert "Changed" in (output_dir / "report.html").read_text()
+
+    @pytest.mark.asyncio()
+    async def test_agenerate_document(self, output_dir) -> None:  # type: ignore
+        generator = DocumentGenerator("/api/files", max_workers=1)
+        try:
+            url = await generator.agenerate_document("# Report", "html", "report")
+        finally:
+            DocumentGenerator.shutdown()
+
+        assert url == f"/api/files/{OUTPUT_DIR}/report.html"
+        assert "<h1>Report</h1>" in (output_dir / "report.html").read_text()
+
+        # The second call is served from the cache
+        with patch(
+            "llama_index.server.tools.document_generator._render_document"
+        ) as mock_render:
+            await generator.agenerate_document("# Report", "html", "copy")
+        mock_render.assert_not_called()
+        assert (output_dir / "copy.html").exists()
+
+    def test_generate_documents_single_pass(self, output_dir) -> None:  # type: ignore
+        generator = DocumentGenerator("/api/files")
+
+        with patch.object(
+            DocumentGenerator,
+            "_generate_html_content",
+            wraps=DocumentGenerator._generate_html_content,
+        ) as spy:
+            urls = generator.generate_documents("# Report", ["html", "pdf"], "report")
+
+        spy.assert_called_once()
+        assert urls == [
+            f"/api/files/{OUTPUT_DIR}/report.html",
+            f"/api/files/{OUTPUT_DIR}/report.pdf",
+        ]
+        assert "<h1>Report</h1>" in (output_dir / "report.html").read_text()
+        assert (output_dir / "report.pdf").read_bytes().startswith(b"%PDF")
+        # No temporary files are left behind
+        assert sorted(p.name for p in output_dir.iterdir() if p.is_file()) == [
+            "report.html",
+            "report.pdf",
+        ]
+
+    def test_generate_documents_invalid_type(self) -> None:
+        generator = DocumentGenerator("/api/files")
+        with pytest.raises(ValueError):
+            generator.generate_documents("# Report", ["html", "docx"], "report")
+        with pytest.raises(ValueError):
+            generator.generate_documents("# Report", [], "report")
+
+    @pytest.mark.asyncio()
+    async def test_agenerate_documents(self, output_dir) -> None:  # type: ignore
+        generator = DocumentGenerator("/api/files", max_workers=1)
+        try:
+            urls = await generator.agenerate_documents(
+                "# Report", ["pdf", "html", "pdf"], "report"
+            )
+        finally:
+            DocumentGenerator.shutdown()
+
+        assert urls == [
+            f"/api/files/{OUTPUT_DIR}/report.pdf",
+            f"/api/files/{OUTPUT_DIR}/report.html",
+        ]
+        assert (output_dir / "report.pdf").read_bytes().startswith(b"%PDF")
+        assert (output_dir / "report.html").exists()
+
+    def test_to_multi_format_tool(self) -> None:
+        generator = DocumentGenerator("/api/files")
+        tool = generator.to_tool(multi_format=True)
+        assert tool.fn == generator.generate_documents
+        assert tool.async_fn == generator.agenerate_documents
@@ -0,0 +1,103 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+from llama_index.core import Document, VectorStoreIndex
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.settings import Settings
+from llama_index.server.tools.index.utils import IndexCache, get_manifest
+
+
+def _persist(path: Path, texts: list) -> None:
+    index = VectorStoreIndex.from_documents(
+        [Document(text=text) for text in texts], embed_model=MockEmbedding(embed_dim=8)
+    )
+    index.storage_context.persist(persist_dir=str(path))
+
+
+@pytest.fixture(autouse=True)
+def embed_model():  # type: ignore
+    previous = Settings._embed_model
+    Settings.embed_model = MockEmbedding(embed_dim=8)
+    yield
+    Settings._embed_model = previous
+
+
+class TestIndexCache:
+    def test_missing_directory(self, tmp_path: Path) -> None:
+        assert IndexCache().get_index(str(tmp_path / "missing")) is None
+        assert get_manifest(str(tmp_path / "missing")) is None
+
+    def test_index_is_shared(self, tmp_path: Path) -> None:
+        _persist(tmp_path, ["a", "b"])
+        cache = IndexCache()
+
+        first = cache.get_index(str(tmp_path))
+        second = cache.get_index(str(tmp_path))
+
+        assert first is not None
+        assert second is first
+        assert cache.get_storage_context(str(tmp_path)) is first.storage_context
+
+    def test_keyed_by_persist_dir(self, tmp_path: Path) -> None:
+        _persist(tmp_path / "one", ["a"])
+        _persist(tmp_path / "two", ["a", "b"])
+        cache = IndexCache()
+
+        one = cache.get_index(str(tmp_path / "one"))
+        two = cache.get_index(str(tmp_path / "two"))
+
+        assert one is not two
+        assert len(one.docstore.docs) == 1  # type: ignore
+        assert len(two.docstore.docs) == 2  # type: ignore
+
+    def test_custom_arguments_reuse_storage_context(self, tmp_path: Path) -> None:
+        _persist(tmp_path, ["a"])
+        cache = IndexCache()
+        shared = cache.get_index(str(tmp_path))
+
+        index = cache.get_index(str(tmp_path), callback_manager=CallbackManager())
+
+        assert index is not shared
+        assert index.storage_context is shared.storage_context  # type: ignore
+
+    def test_reload_on_change(self, tmp_path: Path) -> None:
+        _persist(tmp_path, ["a"])
+        cache = IndexCache(check_interval=0)
+        old = cache.get_index(str(tmp_path))
+
+        _persist(tmp_path, ["a", "b", "c"])
+        # Make sure the modification is visible even on coarse file system timestamps
+        for entry in os.scandir(tmp_path):
+            os.utime(entry.path, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+        # The previous index is served while the directory is reloaded in the background
+        assert cache.get_index(str(tmp_path)) is old
+        cache.wait_for_reload()
+        new = cache.get_index(str(tmp_path))
+
+        assert new is not old
+        assert len(new.docstore.docs) == 3  # type: ignore
+
+    def test_check_interval(self, tmp_path: Path) -> None:
+        _persist(tmp_path, ["a"])
+        cache = IndexCache(check_interval=3600)
+        old = cache.get_index(str(tmp_path))
+
+        _persist(tmp_path, ["a", "b"])
+        cache.wait_for_reload()
+
+        assert cache.get_index(str(tmp_path)) is old
+
+    def test_failed_reload_keeps_index(self, tmp_path: Path) -> None:
+        _persist(tmp_path, ["a"])
+        cache = IndexCache(check_interval=0)
+        old = cache.get_index(str(tmp_path))
+
+        (tmp_path / "docstore.json").write_text("{not json")
+        cache.get_index(str(tmp_path))
+        cache.wait_for_reload()
+
+        assert cache.get_index(str(tmp_path)) is old
@@ -2,7 +2,13 @@ from unittest.mock import MagicMock
 
 import pytest
 from e2b_code_interpreter.models import Execution, Logs
-from llama_index.server.tools.interpreter import E2BCodeInterpreter
+from llama_index.server.tools.interpreter import (
+    E2BCodeInterpreter,
+    E2BToolOutput,
+    LocalCodeInterpreter,
+    LocalSandboxBackend,
+    SandboxPool,
+)
 
 
 class TestE2BCodeInterpreter:
@@ -54,12 +60,177 @@ class TestE2BCodeInterpreter:
         # Run the code
         result = code_interpreter.interpret("bad code")
 
-        # Verify
+        # Verify the kernel is reset but the sandbox is kept for the next call
         assert result.is_error is True
         assert "Error: Test error" in result.error_message
+        sandbox.reset.assert_called_once()
+        sandbox.kill.assert_not_called()
+        assert code_interpreter.interpreter is sandbox
+
+    def test_interpret_reset_failure(self, code_interpreter, sandbox) -> None:  # type: ignore
+        """Test that the sandbox is discarded if the kernel can't be reset."""
+        mock_execution = Execution()
+        mock_execution.error = "Test error"
+        mock_execution.logs = Logs(
+            stdout="", stderr="error", display_data="", error="Test error"
+        )
+        sandbox.run_code.return_value = mock_execution
+        sandbox.reset.side_effect = RuntimeError("reset failed")
+
+        result = code_interpreter.interpret("bad code")
+
+        assert result.is_error is True
         sandbox.kill.assert_called_once()
+        assert code_interpreter.interpreter is None
+
+    def test_sandbox_files_uploaded_once(  # type: ignore
+        self, code_interpreter, sandbox, tmp_path
+    ) -> None:
+        """Test that unchanged files are not uploaded again."""
+        code_interpreter.uploaded_files_dir = str(tmp_path)
+        (tmp_path / "data.csv").write_text("a,b\n1,2\n")
+        sandbox.synced_files = {}
+        mock_execution = Execution()
+        mock_execution.error = None
+        mock_execution.results = []
+        mock_execution.logs = Logs(stdout="", stderr="", display_data="", error="")
+        sandbox.run_code.return_value = mock_execution
+
+        code_interpreter.interpret("print(1)", sandbox_files=["/tmp/data.csv"])
+        code_interpreter.interpret("print(2)", sandbox_files=["/tmp/data.csv"])
+
+        sandbox.write_file.assert_called_once_with("/tmp/data.csv", b"a,b\n1,2\n")
+
+    def test_sandbox_reset_reuses_context(self) -> None:
+        """Test that resetting a sandbox doesn't leave the previous kernel running."""
+        from llama_index.server.tools.interpreter.e2b import E2BSandbox
+
+        raw = MagicMock(spec=["create_code_context", "remove_code_context", "run_code"])
+        sandbox = E2BSandbox(raw, timeout=300)
+        sandbox.reset()
+        first = sandbox.context
+        sandbox.reset()
+        raw.remove_code_context.assert_called_once_with(first)
+        assert raw.create_code_context.call_count == 2
+
+        # Without context management, the kernel of the context is cleared in place
+        raw = MagicMock(spec=["create_code_context", "run_code"])
+        raw.run_code.return_value.error = None
+        sandbox = E2BSandbox(raw, timeout=300)
+        sandbox.reset()
+        sandbox.reset()
+        raw.create_code_context.assert_called_once()
+        raw.run_code.assert_called_once_with("%reset -f", context=sandbox.context)
 
     def test_to_tool(self, code_interpreter) -> None:  # type: ignore
         """Test tool conversion."""
         tool = code_interpreter.to_tool()
         assert tool.fn == code_interpreter.interpret
+        assert tool.async_fn == code_interpreter.ainterpret
+
+    @pytest.mark.asyncio()
+    async def test_ainterpret(self, code_interpreter, sandbox) -> None:  # type: ignore
+        """Test that the async version runs the code."""
+        mock_execution = Execution()
+        mock_execution.error = None
+        mock_execution.results = []
+        mock_execution.logs = Logs(
+            stdout="stdout", stderr="", display_data="", error=""
+        )
+        sandbox.run_code.return_value = mock_execution
+
+        result = await code_interpreter.ainterpret("print('hello')")
+
+        sandbox.run_code.assert_called_once_with("print('hello')")
+        assert result.is_error is False
+
+
+class TestLocalCodeInterpreter:
+    @pytest.fixture()
+    def pool(self):  # type: ignore
+        pool = SandboxPool(
+            LocalSandboxBackend(timeout=10, cpu_time_limit=1), min_size=0, max_size=1
+        )
+        yield pool
+        pool.close()
+
+    @pytest.fixture()
+    def code_interpreter(self, pool, tmp_path):  # type: ignore
+        interpreter = LocalCodeInterpreter(
+            output_dir=str(tmp_path / "output"),
+            uploaded_files_dir=str(tmp_path / "uploaded"),
+            pool=pool,
+        )
+        yield interpreter
+        interpreter.close()
+
+    def test_interpret_success(self, code_interpreter) -> None:  # type: ignore
+        code_interpreter.interpret("x = [1, 2, 3]")
+        result = code_interpreter.interpret("print('hello')\nsum(x)")
+
+        assert isinstance(result, E2BToolOutput)
+        assert result.is_error is False
+        assert result.logs.stdout == ["hello\n"]
+        assert result.results[0].type == "text"
+        assert result.results[0].content == "6"
+
+    def test_interpret_rich_output(self, code_interpreter, tmp_path) -> None:  # type: ignore
+        code = (
+            "class Chart:\n"
+            "    def _repr_svg_(self):\n"
+            "        return '<svg xmlns=\"http://www.w3.org/2000/svg\"></svg>'\n"
+            "Chart()"
+        )
+        result = code_interpreter.interpret(code)
+
+        svg = next(r for r in result.results if r.type == "svg")
+        assert svg.url is not None
+        saved_file = tmp_path / "output" / svg.filename
+        assert saved_file.read_text().startswith("<svg")
+
+    def test_interpret_error_keeps_worker(self, code_interpreter) -> None:  # type: ignore
+        code_interpreter.interpret("x = 1")
+        worker = code_interpreter.interpreter
+        result = code_interpreter.interpret("1 / 0")
+
+        assert result.is_error is True
+        assert "ZeroDivisionError" in result.error_message
+        assert result.retry_count == 1
+        assert code_interpreter.interpreter is worker
+
+    def test_cpu_time_limit(self, code_interpreter) -> None:  # type: ignore
+        result = code_interpreter.interpret("while True:\n    pass")
+
+        assert result.is_error is True
+        assert "CPU time limit exceeded" in result.error_message
+        assert code_interpreter.interpret("1 + 1").results[0].content == "2"
+
+    def test_sandbox_files(self, code_interpreter, tmp_path) -> None:  # type: ignore
+        (tmp_path / "uploaded").mkdir()
+        (tmp_path / "uploaded" / "data.csv").write_text("a,b\n1,2\n")
+
+        result = code_interpreter.interpret(
+            "open('data/data.csv').read()", sandbox_files=["data/data.csv"]
+        )
+
+        assert result.is_error is False
+        assert "1,2" in result.results[0].content
+
+    def test_worker_reused_between_interpreters(self, pool, tmp_path) -> None:  # type: ignore
+        first = LocalCodeInterpreter(output_dir=str(tmp_path), pool=pool)
+        first.interpret("x = 1")
+        worker = first.interpreter
+        first.close()
+
+        second = LocalCodeInterpreter(output_dir=str(tmp_path), pool=pool)
+        result = second.interpret("'x' in globals()")
+        # Same warm worker, but the state of the previous session is cleared
+        assert second.interpreter is worker
+        assert result.results[0].content == "False"
+        second.close()
+
+    def test_retry_limit(self, code_interpreter) -> None:  # type: ignore
+        result = code_interpreter.interpret("1 + 1", retry_count=3)
+
+        assert result.is_error is True
+        assert result.logs.stdout == []
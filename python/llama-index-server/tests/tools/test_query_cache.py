@@ -0,0 +1,132 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from llama_index.core import Document, QueryBundle, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.vector_stores import MetadataFilter, MetadataFilters
+from llama_index.server.tools.index import QueryCache, get_query_engine_tool
+from llama_index.server.tools.index.cache import normalize_query
+from llama_index.server.tools.index.query import create_query_engine
+
+
+@pytest.fixture()
+def index() -> VectorStoreIndex:
+    return VectorStoreIndex.from_documents(
+        [Document(text="The sky is blue."), Document(text="The grass is green.")],
+        embed_model=MockEmbedding(embed_dim=8),
+    )
+
+
+class TestQueryCache:
+    def test_normalize_query(self) -> None:
+        assert normalize_query("  What is   the SKY?") == "what is the sky"
+        assert normalize_query("what is the sky") == "what is the sky"
+
+    def test_retrieval_and_response_hits(self, index: VectorStoreIndex) -> None:
+        cache = QueryCache()
+        query_engine = create_query_engine(index, cache=cache, llm=MockLLM())
+
+        with patch.object(
+            VectorIndexRetriever, "_retrieve", autospec=True, side_effect=lambda *a: []
+        ) as mock_retrieve:
+            first = query_engine.query("What color is the sky?")
+            second = query_engine.query("what color is the sky")
+
+        assert mock_retrieve.call_count == 1
+        assert second is first
+        assert cache.stats == {
+            "retrieval": {"hits": 0, "misses": 1},
+            "response": {"hits": 1, "misses": 1},
+        }
+
+    def test_retrieval_shared_when_answers_not_cached(
+        self, index: VectorStoreIndex
+    ) -> None:
+        cache = QueryCache(cache_responses=False)
+        query_engine = create_query_engine(index, cache=cache, llm=MockLLM())
+
+        query_engine.query("sky")
+        query_engine.query("Sky?")
+
+        assert cache.stats["retrieval"] == {"hits": 1, "misses": 1}
+        assert cache.stats["response"] == {"hits": 0, "misses": 0}
+
+    def test_parameters_are_part_of_the_key(self, index: VectorStoreIndex) -> None:
+        cache = QueryCache()
+        filters = MetadataFilters(filters=[MetadataFilter(key="a", value="b")])
+        create_query_engine(index, cache=cache, llm=MockLLM()).query("sky")
+        create_query_engine(
+            index, cache=cache, llm=MockLLM(), similarity_top_k=1
+        ).query("sky")
+        create_query_engine(index, cache=cache, llm=MockLLM(), filters=filters).query(
+            "sky"
+        )
+
+        assert cache.stats["response"] == {"hits": 0, "misses": 3}
+
+    def test_index_modification_invalidates(self, index: VectorStoreIndex) -> None:
+        cache = QueryCache()
+        query_engine = create_query_engine(index, cache=cache, llm=MockLLM())
+
+        query_engine.query("sky")
+        index.insert(Document(text="The sea is blue."))
+        query_engine.query("sky")
+
+        assert cache.stats["response"] == {"hits": 0, "misses": 2}
+        assert cache.stats["retrieval"] == {"hits": 0, "misses": 2}
+
+    def test_indexes_sharing_the_cache(self) -> None:
+        cache = QueryCache(cache_responses=False)
+        apples, bananas = (
+            VectorStoreIndex.from_documents(
+                [Document(text=text)], embed_model=MockEmbedding(embed_dim=8)
+            )
+            for text in ("Apples are red.", "Bananas are yellow.")
+        )
+        first = create_query_engine(apples, cache=cache, llm=MockLLM())
+        second = create_query_engine(bananas, cache=cache, llm=MockLLM())
+
+        first_nodes = first.retrieve(QueryBundle("fruit color"))
+        second_nodes = second.retrieve(QueryBundle("fruit color"))
+
+        assert first_nodes[0].get_content() == "Apples are red."
+        assert second_nodes[0].get_content() == "Bananas are yellow."
+        assert cache.stats["retrieval"] == {"hits": 0, "misses": 2}
+
+    def test_ttl_expiration(self, index: VectorStoreIndex) -> None:
+        cache = QueryCache(ttl=0.05)
+        query_engine = create_query_engine(index, cache=cache, llm=MockLLM())
+
+        query_engine.query("sky")
+        time.sleep(0.1)
+        query_engine.query("sky")
+
+        assert cache.stats["response"] == {"hits": 0, "misses": 2}
+
+    def test_lru_eviction(self, index: VectorStoreIndex) -> None:
+        cache = QueryCache(maxsize=1)
+        query_engine = create_query_engine(index, cache=cache, llm=MockLLM())
+
+        query_engine.query("sky")
+        query_engine.query("grass")
+        query_engine.query("sky")
+
+        assert cache.stats["response"] == {"hits": 0, "misses": 3}
+
+    @pytest.mark.asyncio()
+    async def test_tool_async_query(self, index: VectorStoreIndex) -> None:
+        cache = QueryCache()
+        tool = get_query_engine_tool(index, cache=cache, llm=MockLLM())
+
+        first = await tool.acall(input="What color is the sky?")
+        second = await tool.acall(input="what color is the sky")
+
+        assert str(second) == str(first)
+        assert cache.stats["response"] == {"hits": 1, "misses": 1}
+
+    def test_without_cache(self, index: VectorStoreIndex) -> None:
+        tool = get_query_engine_tool(index, llm=MockLLM())
+        assert type(tool.query_engine).__name__ == "RetrieverQueryEngine"
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from llama_index.server.tools.interpreter.local import LocalSandboxBackend
+from llama_index.server.tools.interpreter.pool import SandboxPool
+
+
+class TestSandboxPool:
+    @pytest.fixture()
+    def pool(self):  # type: ignore
+        pool = SandboxPool(LocalSandboxBackend(timeout=10), min_size=1, max_size=2)
+        yield pool
+        pool.close()
+
+    def _wait_for_idle(self, pool: SandboxPool, count: int) -> None:
+        deadline = time.monotonic() + 10
+        while pool.idle_count < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def test_prewarm(self, pool) -> None:  # type: ignore
+        self._wait_for_idle(pool, 1)
+        assert pool.idle_count == 1
+        assert pool.size == 1
+
+    def test_run_code_keeps_state(self, pool) -> None:  # type: ignore
+        sandbox = pool.acquire()
+        sandbox.run_code("x = 40")
+        execution = sandbox.run_code("print('hello')\nx + 2")
+        assert execution.error is None
+        assert execution.logs.stdout == ["hello\n"]
+        assert execution.results[0]["text"] == "42"
+        pool.release(sandbox)
+
+    def test_reuse_after_error(self, pool) -> None:  # type: ignore
+        sandbox = pool.acquire()
+        sandbox.run_code("x = 1")
+        execution = sandbox.run_code("1 / 0")
+        assert execution.error is not None
+        assert execution.error.name == "ZeroDivisionError"
+
+        # Resetting keeps the process but clears the state
+        assert pool.reset(sandbox) is True
+        assert sandbox.is_alive()
+        execution = sandbox.run_code("x")
+        assert execution.error is not None
+        assert execution.error.name == "NameError"
+        pool.release(sandbox)
+
+    def test_release_returns_sandbox(self) -> None:
+        pool = SandboxPool(LocalSandboxBackend(), min_size=0, max_size=1)
+        sandbox = pool.acquire()
+        pool.release(sandbox)
+        assert pool.size == 1
+        assert pool.acquire() is sandbox
+        pool.close()
+
+    def test_max_size(self, pool) -> None:  # type: ignore
+        first = pool.acquire()
+        second = pool.acquire()
+        with pytest.raises(TimeoutError):
+            pool.acquire(timeout=0.1)
+        pool.release(first)
+        pool.release(second)
+
+    def test_timeout_kills_sandbox(self) -> None:
+        pool = SandboxPool(LocalSandboxBackend(timeout=0.5), min_size=0, max_size=1)
+        sandbox = pool.acquire()
+        execution = sandbox.run_code("while True: pass")
+        assert execution.error is not None
+        assert execution.error.name == "TimeoutError"
+        assert not sandbox.is_alive()
+        # A dead sandbox is discarded instead of being reused
+        pool.release(sandbox, reset=False)
+        assert pool.size == 0
+        pool.close()
+
+    def test_incremental_file_upload(self, pool, tmp_path) -> None:  # type: ignore
+        data_file = tmp_path / "data.csv"
+        data_file.write_text("a,b\n1,2\n")
+        files = [(str(data_file), "/data/data.csv")]
+        sandbox = pool.acquire()
+
+        assert pool.upload_files(sandbox, files) == 1
+        # Unchanged files are skipped, also after a reset
+        pool.reset(sandbox)
+        assert pool.upload_files(sandbox, files) == 0
+
+        data_file.write_text("a,b\n3,4\n")
+        assert pool.upload_files(sandbox, files) == 1
+        execution = sandbox.run_code("open('data/data.csv').read()")
+        assert "3,4" in execution.results[0]["text"]
+        pool.release(sandbox)
+
+    @pytest.mark.asyncio()
+    async def test_async_acquire(self, pool) -> None:  # type: ignore
+        sandbox = await pool.aacquire()
+        execution = sandbox.run_code("1 + 1")
+        assert execution.results[0]["text"] == "2"
+        await pool.arelease(sandbox)